@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+    Compare serial and parallel scan of large dataset
+
+    python benchmarks/bench_parallel.py --rows 1000000 --workers 4
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+from evalidate import base_eval_model
+
+from sashimi.config import Config
+from sashimi.dataset import Dataset
+from sashimi.api.params import SearchQuery
+
+queries = [
+    dict(expr='price > 500 and category == "c3"', discard=True),
+    dict(expr='price < 900 and stock > 10', sort='price', limit=20),
+    dict(expr='True', aggregate=['sum:price', 'avg:rating'], group_by='category', discard=True),
+    dict(expr='"7" in title and rating > 2.5', limit=20),
+]
+
+
+def make_data(n: int):
+    rnd = random.Random(1)
+    return [
+        {
+            'id': i,
+            'title': f'product {i}',
+            'price': rnd.randint(1, 1000),
+            'rating': round(rnd.uniform(0, 5), 2),
+            'stock': rnd.randint(0, 100),
+            'category': f'c{rnd.randint(0, 20)}',
+            'brand': f'brand{rnd.randint(0, 500)}'
+        }
+        for i in range(n)
+    ]
+
+
+def make_ds(data: list, config: str):
+    pdir = tempfile.mkdtemp()
+    with open(f'{pdir}/_bench.yaml', 'w') as fh:
+        fh.write(config)
+    project = SimpleNamespace(path=pdir, config=Config(role="project"))
+    ds = Dataset(name='bench', project=project, model=base_eval_model)
+    ds.set_dataset(data)
+    return ds
+
+
+def bench(ds: Dataset, q: dict, repeat: int):
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        r = ds.search(SearchQuery(**q))
+        times.append(time.perf_counter() - start)
+    return min(times), r
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serial vs parallel scan benchmark')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--workers', type=int, default=None, help='default: number of CPUs')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_data(args.rows)
+    # no caches: repeated query must scan again
+    config = 'limit: 20\nresult_cache: 0\nrow_cache: 0\n'
+    serial = make_ds(data, config)
+    par = make_ds(data, config + f'parallel:\n  workers: {args.workers or 0}\n  threshold: 0\n')
+
+    print(f"{args.rows} rows, {par._parallel.workers} workers")
+    # fork pool before measuring
+    par.search(SearchQuery(expr='False'))
+
+    for q in queries:
+        t_serial, r_serial = bench(serial, q, args.repeat)
+        t_par, r_par = bench(par, q, args.repeat)
+        assert r_serial['matches'] == r_par['matches']
+        print(f"{q['expr']!r:50} serial: {t_serial:.3f}s parallel: {t_par:.3f}s speed-up: {t_serial / t_par:.1f}x")
+
+    par._parallel.close()
+
+
+if __name__ == '__main__':
+    main()
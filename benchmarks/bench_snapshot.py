@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+    Compare dataset startup from JSON and from binary snapshot.
+    Each load runs in new process to measure its time and peak RSS.
+
+    python benchmarks/bench_snapshot.py --rows 1000000
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import subprocess
+
+loader = """
+import sys, time, resource
+from types import SimpleNamespace
+from evalidate import base_eval_model
+from sashimi.config import Config
+from sashimi.dataset import Dataset
+
+path, snapshot = sys.argv[1], sys.argv[2] == 'snapshot'
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+with open(path.replace('bench.json', '_bench.yaml'), 'w') as fh:
+    fh.write(f'snapshot: {snapshot}\\n')
+project = SimpleNamespace(path=path.rsplit('/', 1)[0], config=Config(role="project"))
+start = time.time()
+ds = Dataset(name='bench', project=project, model=base_eval_model, path=path)
+print(len(ds), ds.load_stats['time'], round(time.time() - start, 3), rss_before, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def make_data(n: int):
+    rnd = random.Random(1)
+    return [
+        {
+            'id': i,
+            'title': f'product {i}',
+            'price': rnd.randint(1, 1000),
+            'rating': round(rnd.uniform(0, 5), 2),
+            'category': f'c{rnd.randint(0, 20)}',
+            'tags': ['a', 'b'],
+        }
+        for i in range(n)
+    ]
+
+
+def run(path: str, mode: str):
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    out = subprocess.run([sys.executable, '-c', loader, path, mode], env=env, check=True,
+                         capture_output=True, text=True).stdout
+    records, load_time, total_time, rss_before, rss_after = out.strip().splitlines()[-1].split()
+    print(f"{mode:10} {records} records, load: {load_time}s, total (with indexes, size...): {total_time}s, peak RSS: {int(rss_before) // 1024}M -> {int(rss_after) // 1024}M")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON vs snapshot startup benchmark')
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    pdir = tempfile.mkdtemp()
+    path = os.path.join(pdir, 'bench.json')
+    with open(path, 'w') as fh:
+        json.dump(make_data(args.rows), fh)
+    print(f"{path}: {os.path.getsize(path) // 2**20}M")
+
+    run(path, 'json')
+    # first snapshot-enabled load writes snapshot
+    run(path, 'snapshot')
+    run(path, 'snapshot')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+    Aggregation functions (``aggregate``, ``group_by`` in SearchQuery).
+
+    Records are folded into accumulators one by one while dataset is scanned,
+    so list of matching records is not needed to aggregate.
+"""
+
+from typing import List, Dict
+
+from fastapi import HTTPException
+
+
+class Accumulator():
+    def __init__(self, field: str):
+        self.field = field
+        self.n = 0
+
+    def add(self, value):
+        self.n += 1
+
+    def merge(self, other: "Accumulator"):
+        """ add partial result (from other part of dataset, which goes after this) """
+        self.n += other.n
+
+    def result(self):
+        return None
+
+
+class Sum(Accumulator):
+    def __init__(self, field):
+        super().__init__(field)
+        self.total = 0
+
+    def add(self, value):
+        self.n += 1
+        self.total = self.total + value
+
+    def merge(self, other):
+        if other.n:
+            self.total = self.total + other.total
+            self.n += other.n
+
+    def result(self):
+        return self.total if self.n else None
+
+
+class Avg(Sum):
+    def result(self):
+        return self.total / self.n if self.n else None
+
+
+class Max(Accumulator):
+    def __init__(self, field):
+        super().__init__(field)
+        self.value = None
+
+    def add(self, value):
+        # same as max(): first of equal values wins
+        if not self.n or value > self.value:
+            self.value = value
+        self.n += 1
+
+    def merge(self, other):
+        if other.n:
+            self.add(other.value)
+            self.n += other.n - 1
+
+    def result(self):
+        return self.value
+
+
+class Min(Max):
+    def add(self, value):
+        if not self.n or value < self.value:
+            self.value = value
+        self.n += 1
+
+
+class Distinct(Accumulator):
+    def __init__(self, field):
+        super().__init__(field)
+        self.values = set()
+
+    def add(self, value):
+        self.n += 1
+        self.values.add(value)
+
+    def merge(self, other):
+        self.n += other.n
+        self.values |= other.values
+
+    def result(self):
+        return sorted(self.values) if self.n else None
+
+
+class Count(Accumulator):
+    """ number of not-null values """
+    def add(self, value):
+        if value is not None:
+            self.n += 1
+
+    def result(self):
+        return self.n
+
+
+class Aggregator():
+    """ all aggregations from one query: list of 'method:field' """
+
+    methods = {
+        'sum': Sum,
+        'min': Min,
+        'max': Max,
+        'avg': Avg,
+        'distinct': Distinct,
+        'count': Count
+    }
+
+    def __init__(self, specs: List[str]):
+        self.specs = list()
+        for agg in specs:
+            try:
+                method, field = agg.split(':')
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f'Can not parse aggregation statement {agg!r} must be in form AGG:FIELD e.g. min:price')
+
+            if method not in self.methods:
+                raise HTTPException(status_code=400, detail=f'Unknown aggregation method {method!r} must be one of {"/".join(self.methods)}, e.g. min:price')
+
+            self.specs.append((agg, method, field))
+
+        self.accumulators = self.new()
+
+    def new(self) -> List[Accumulator]:
+        return [ self.methods[method](field) for _, method, field in self.specs ]
+
+    @staticmethod
+    def fold(accumulators: List[Accumulator], item: dict):
+        try:
+            for acc in accumulators:
+                acc.add(item[acc.field])
+
+        except KeyError as e:
+            field = e.args[0]
+            raise HTTPException(status_code=400, detail=f'Key exception {field!r} during aggregation')
+
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f'Exception during aggregation: {e!r}')
+
+    def add(self, item: dict):
+        self.fold(self.accumulators, item)
+
+    @staticmethod
+    def merge_into(accumulators: List[Accumulator], other: List[Accumulator]):
+        try:
+            for acc, partial in zip(accumulators, other):
+                acc.merge(partial)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f'Exception during aggregation: {e!r}')
+
+    def merge(self, other: "Aggregator"):
+        self.merge_into(self.accumulators, other.accumulators)
+
+    def results(self, accumulators: List[Accumulator] = None) -> Dict:
+        accumulators = self.accumulators if accumulators is None else accumulators
+        try:
+            return { spec[0]: acc.result() for spec, acc in zip(self.specs, accumulators) }
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f'Exception during aggregation: {e!r}')
+
+
+class GroupBy():
+    """ same aggregations for each distinct value of field (hash grouping) """
+
+    def __init__(self, field: str, aggregator: Aggregator):
+        self.field = field
+        self.aggregator = aggregator
+        # key -> [count, accumulators]
+        self.groups = dict()
+
+    def add(self, item: dict):
+        try:
+            key = item[self.field]
+            group = self.groups.get(key)
+        except KeyError as e:
+            raise HTTPException(status_code=400, detail=f'Key exception {e.args[0]!r} during grouping')
+        except TypeError as e:
+            raise HTTPException(status_code=400, detail=f'Can not group by {self.field!r}: {e}')
+
+        if group is None:
+            group = self.groups[key] = [0, self.aggregator.new()]
+
+        group[0] += 1
+        self.aggregator.fold(group[1], item)
+
+    def merge(self, other: "GroupBy"):
+        for key, (count, accumulators) in other.groups.items():
+            group = self.groups.get(key)
+            if group is None:
+                self.groups[key] = [count, accumulators]
+            else:
+                group[0] += count
+                self.aggregator.merge_into(group[1], accumulators)
+
+    def results(self) -> List[Dict]:
+        return [
+            {
+                'group': key,
+                'count': count,
+                'aggregation': self.aggregator.results(accumulators)
+            }
+            for key, (count, accumulators) in self.groups.items()
+        ]
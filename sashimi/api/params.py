@@ -1,6 +1,6 @@
 
 import string
-from typing import Optional, Union, List, Dict
+from typing import Optional, Union, List, Dict, Literal
 from typing_extensions import Annotated
 from pydantic import BaseModel, StrictInt, StrictFloat, StrictStr, validator, Field
 
@@ -43,7 +43,14 @@ class SearchQuery(BaseModel):
     offset: int = 0
     fields: list[str] = None
     aggregate: list[str] = None
+    group_by: str = None
     discard: bool = False
+
+    # exact: count all matches, estimate/none: stop scan when limit is reached
+    count: Literal['exact', 'estimate', 'none'] = 'exact'
+
+    # NDJSON response: records, then summary
+    stream: bool = False
     
     # JSON-encoded data for INSERT
     data: str = None
@@ -3,17 +3,20 @@ import datetime
 import os
 import json
 import yaml
+import tempfile
 
 from fastapi import APIRouter, Request, HTTPException, Depends
 from fastapi.security.http import HTTPBearer, HTTPBasicCredentials
-from fastapi.responses import PlainTextResponse, FileResponse
+from fastapi.responses import PlainTextResponse, FileResponse, StreamingResponse, Response
 
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, validator, ValidationError
+from starlette.concurrency import run_in_threadpool
 
 from ..prettyjson import PrettyJSONResponse
 from ..project import Project, projects
-from ..dataset import Dataset
+from ..dataset import Dataset, tmp_path_for
 from ..config import Config
+from .. import ingest
 from .params import DatasetDeleteParameter, DatasetPutParameter, SearchQuery
 from .utils import make_expr, get_project, get_project_ds, check_token, check_permission, client_ip
 from ..exception import ProjectExistsException
@@ -50,7 +53,7 @@ def project_op(project_name: str, request: Request, op: ProjectOp,
 
 
 @router.get('/{project_name}')
-def ds_project_info(project_name:str, request: Request, authorization: HTTPBasicCredentials = Depends(auth)):
+def ds_project_info(project_name:str, request: Request, exact_size: bool = False, authorization: HTTPBasicCredentials = Depends(auth)):
 
     project = get_project(project_name)
 
@@ -67,15 +70,45 @@ def ds_project_info(project_name:str, request: Request, authorization: HTTPBasic
 
     data['datasets'] = dict()
     for dsname, ds in project._d.items():
+        if ds._data is None:
+            # not loaded yet (lazy/background loading)
+            data['datasets'][dsname] = {
+                "status": ds.status,
+                "local": ds.is_local()
+            }
+            continue
+
+        if exact_size and not ds.size_exact:
+            ds.update_size()
+
         data['datasets'][dsname] = {
             "items": len(ds._data),
             "size": ds.size,
+            "size_exact": ds.size_exact,
             "status": ds.status,
             "local": ds.is_local(),
             "update IP": ds.update_ip,            
-            "loaded": datetime.datetime.fromtimestamp(ds.loaded, timestamp=datetime.UTC).strftime('%Y-%m-%d %H:%M:%S')
+            "loaded": datetime.datetime.fromtimestamp(ds.loaded, tz=datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
         }
 
+        if ds.load_stats:
+            data['datasets'][dsname]['load'] = ds.load_stats
+
+        if ds._result_cache is not None:
+            data['datasets'][dsname]['result_cache'] = ds._result_cache.stats()
+        if ds._row_cache is not None:
+            data['datasets'][dsname]['row_cache'] = ds._row_cache.stats()
+        if ds._interner is not None:
+            data['datasets'][dsname]['intern'] = ds._interner.stats()
+        if ds.named_search:
+            data['datasets'][dsname]['named_search'] = { name: ns.stats(ds) for name, ns in ds.named_search.items() }
+
+        if ds._sync_job is not None:
+            data['datasets'][dsname]['sync'] = dict(ds.sync_stats or {}, error=ds._sync_job.last_error)
+
+        if ds._refresh_job is not None:
+            data['datasets'][dsname]['refresh'] = dict(ds.refresh_stats or {}, error=ds._refresh_job.last_error)
+
         if project.is_sandbox():
             data['datasets'][dsname]['secret'] = bool(ds.secret)
     
@@ -121,6 +154,7 @@ async def project_post_config(project_name: str, request: Request, authorization
         fh.write(rawconfig)
 
     project.read_config()
+    project.changed()
 
     return PlainTextResponse(f'Saved config for {project_name}')
 
@@ -162,54 +196,56 @@ async def ds_post_config(project_name: str, ds_name: str, request: Request, auth
         fh.write(rawconfig)
 
     ds.read_config()
+    project.changed()
 
     return PlainTextResponse(f'Saved config for {project_name} / {ds_name}')
 
 
 @router.post('/{project_name}/{ds_name}')
-async def ds_post(project_name: str, ds_name: str, request: Request, sq: SearchQuery):
+async def ds_post(project_name: str, ds_name: str, request: Request, sq: SearchQuery, pretty: bool = False):
     """
         search for record(s) in project/dataset
+        (?pretty=1 for indented JSON, for humans)
     """
 
     _, ds = get_project_ds(project_name=project_name, ds_name=ds_name)
 
+    if ds._data is None:
+        # dataset is loaded (lazy/background), other requests must not wait for it
+        await run_in_threadpool(ds.ensure_loaded)
+
     if sq.filter:
         sq.expr = make_expr(sq.expr, sq.filter)
 
     if not sq.expr:
         sq.expr = 'True'
 
+    if sq.stream or 'application/x-ndjson' in request.headers.get('accept', ''):
+        return StreamingResponse(ds.search_stream(sq), media_type='application/x-ndjson')
+
     start = time.time()
 
     r = ds.search(sq)
 
     r['time'] = round(time.time() - start, 3)
-    return r
+    if pretty:
+        return PrettyJSONResponse(r)
+    return Response(ds.dumps_result(r, sq), media_type='application/json')
 
 
 
 @router.get('/{project}/{dataset}/{search_name}')
-def ds_named_search(project:str, dataset: str, search_name: str):
+def ds_named_search(project:str, dataset: str, search_name: str, request: Request):
+    """ precomputed result of named search (304 if client has it, by ETag) """
     try:
         ds = projects[project][dataset]
     except KeyError:
-        return HTTPException(status_code=404, detail=f"No such dataset {dataset!r}")
-    
-    try:
-        ns = ds.named_search[search_name]
-    except KeyError:
-        return HTTPException(status_code=404, detail=f"No such named search {search_name!r} in ds {dataset!r}")
-    
-    start = time.time()
+        raise HTTPException(status_code=404, detail=f"No such dataset {dataset!r}")
 
-
-    if ns['r'] is None:
-        ns['r'] = ds.search(ns['sq'])
-    
-    r = ns['r']
-    r['time'] = round(time.time() - start, 3)
-    return r
+    body, etag = ds.named_result(search_name)
+    if etag in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers={'ETag': etag})
+    return Response(body, media_type='application/json', headers={'ETag': etag})
 
 @router.get('/{project}/{dataset}')
 def status(project:str, dataset: str):
@@ -260,6 +296,30 @@ def ds_put(project_name: str, ds_name: str, sq: SearchQuery, request: Request, a
     return PlainTextResponse(f"Inserted record to {ds_name!r} in project {project_name!r} new size: {len(ds)}.")
 
 
+@router.post('/{project_name}/{ds_name}/_bulk')
+async def ds_bulk(project_name: str, ds_name: str, request: Request, batch: int = 1000, authorization: HTTPBasicCredentials = Depends(auth)):
+
+    """ INSERT many records, request body is NDJSON or JSON list """
+
+    project, ds = get_project_ds(project_name=project_name, ds_name=ds_name)
+    check_token(request, config=ds.config, credentials=authorization.credentials)
+
+    if batch < 1:
+        raise HTTPException(status_code=400, detail='batch must be positive')
+
+    start = time.time()
+
+    # small body stays in memory, large goes to disk
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as fh:
+        async for chunk in request.stream():
+            fh.write(chunk)
+        fh.seek(0)
+        r = await run_in_threadpool(ds.bulk_insert, fh, batch)
+
+    r['time'] = round(time.time() - start, 3)
+    return r
+
+
 
 @router.delete('/{project_name}')
 def rm(project_name: str, request: Request, 
@@ -284,9 +344,10 @@ def rm(project_name: str, request: Request,
         os.unlink(ds.path)
 
     try:
-        del project[ds_param.name]
+        project.remove_dataset(ds_param.name)
     except KeyError:
         raise HTTPException(status_code=404, detail=f"Not found dataset {ds_param.name!r} in project {project_name!r}")
+    project.changed()
 
     projects.cron()
 
@@ -295,17 +356,35 @@ def rm(project_name: str, request: Request,
 
 
 @router.put('/{project_name}')
-def put(project_name: str, request: Request, 
-        ds_param: DatasetPutParameter,
+async def put(project_name: str, request: Request,
+        name: str = None, secret: str = None,
         authorization: HTTPBasicCredentials = Depends(auth)):
+    """
+        upload dataset.
+        ?name=NAME: request body is dataset itself (JSON list or NDJSON), it's streamed to disk
+        otherwise body is JSON {"name": ..., "ds": [...], "secret": ...}
+    """
 
     projects.cron()
 
-    #check token or raise exception
-    #check token or raise exception
-    # validate_token(request, ds_name, authorization.credentials)
     project = get_project(project_name=project_name)
 
+    if name is None:
+        # whole dataset inside JSON object
+        try:
+            body = ingest.loads(await request.body())
+            if not isinstance(body, dict):
+                raise ValueError('request body must be JSON object with name and ds')
+            ds_param = DatasetPutParameter(**body)
+        except ValueError as e:
+            # ValidationError is ValueError too
+            raise HTTPException(status_code=422, detail=str(e))
+    else:
+        try:
+            ds_param = DatasetPutParameter(ds=list(), name=name, secret=secret)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
     try:
         dataset = project[ds_param.name]
         config = dataset.config
@@ -332,20 +411,39 @@ def put(project_name: str, request: Request,
             raise HTTPException(status_code=401, 
                                 detail=f'secret mismatch')
 
-
-
-
     if project.is_sandbox():
         secret = ds_param.secret
     else:
         secret = None
 
-    dataset.set_dataset(ds_param.ds, ip=client_ip(request), secret=secret)
+    if name is None:
+        data = ds_param.ds
+        # save dataset (if not sandbox)
+        await run_in_threadpool(dataset.upload, data, ip=client_ip(request), secret=secret, save=not project.is_sandbox())
+    else:
+        # stream body to temporary file, then load records from it
+        # not used by any other writer (compaction, URL refresh, other upload)
+        tmp_path = tmp_path_for(dataset.get_dataset_path())
+        try:
+            with open(tmp_path, "wb") as fh:
+                async for chunk in request.stream():
+                    fh.write(chunk)
+
+            try:
+                data = await run_in_threadpool(dataset.load_file, tmp_path)
+            except ingest.IngestError as e:
+                raise HTTPException(status_code=400, detail=f'Can not load dataset: {e}')
+
+            await run_in_threadpool(dataset.upload, data, ip=client_ip(request), secret=secret,
+                                    save=not project.is_sandbox(), tmp_path=tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    new = ds_param.name not in project
     project[ds_param.name] = dataset
+    if new and not project.is_sandbox():
+        # other processes add it too
+        project.changed()
 
-    # save dataset (if not sandbox)
-    if not project.is_sandbox():
-        with open(dataset.get_dataset_path(), "w") as fh:
-            json.dump(ds_param.ds, fh)
-
-    return PlainTextResponse(f"Loaded dataset {ds_param.name!r} ({len(ds_param.ds)} records)")
+    return PlainTextResponse(f"Loaded dataset {ds_param.name!r} ({len(data)} records)")
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Request
 from ..prettyjson import PrettyJSONResponse
 from ..project import projects
+from ..exprcache import expr_cache
 from .. import __version__, started, docker_build_time
 
 router = APIRouter()
@@ -16,5 +17,6 @@ def read_root(request: Request):
         "docker_build_time": docker_build_time,
         "client_host": request.client.host,
         # "headers": request.headers
-        "tenants": str(projects)
+        "tenants": str(projects),
+        "expr_cache": expr_cache.stats()
         }
@@ -0,0 +1,655 @@
+"""
+    Columnar storage for datasets (``storage: columnar`` in dataset config).
+
+    Every field is kept as typed numpy array plus two masks: ``missing``
+    (record has no such key) and ``null`` (value is None). evalidate Expr AST
+    is evaluated over whole columns at once and gives boolean mask of matching
+    rows and mask of rows where row-by-row eval() would raise exception.
+
+    Anything we cannot evaluate exactly as python does (function calls,
+    attributes, substring search, mixed-type columns...) raises NotVectorizable
+    and caller falls back to row-by-row eval.
+
+    String fields which are interned (see interning.py) are dictionary-encoded:
+    column keeps int32 code of each value (-1 for missing/None) and list of
+    distinct values. Equality with constant compares codes.
+
+    Searches use columns of their version of dataset: writer changes copy()
+    of store, and arrays are copied before they are changed (see mvcc.py).
+"""
+
+import ast
+import copy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from typing import List, Dict, Iterable
+
+# python int values which are safe to keep in int64 / float64 columns
+INT64_MAX = 2**63 - 1
+FLOAT_EXACT_INT = 2**53
+# int arithmetic result which is surely not wrapped around in int64
+INT64_SAFE = 2**62
+
+_MISSING = object()
+
+
+class NotVectorizable(Exception):
+    pass
+
+
+def available() -> bool:
+    return np is not None
+
+
+class Column():
+    """ one field of dataset. kind is one of bool/int/float/str/object """
+
+    def __init__(self, kind: str, values, missing, null, dictionary: list = None):
+        self.kind = kind
+        self.missing = missing
+        self.null = null
+        # encoded: values are codes
+        self.dictionary = dictionary
+        if dictionary is None:
+            self._values = values
+            self.codes = None
+        else:
+            self._values = None
+            self.codes = values
+            self.lookup = { v: code for code, v in enumerate(dictionary) }
+
+    @property
+    def values(self):
+        if self.codes is None:
+            return self._values
+        # decoded, code -1 (missing/None) is last element, ''
+        return np.array(self.dictionary + [''], dtype=object)[self.codes]
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+
+    def code(self, value: str) -> int:
+        """ code of value, added to dictionary if new """
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.dictionary)
+            self.dictionary.append(value)
+        return code
+
+    @staticmethod
+    def _kind(values: list) -> str:
+        kinds = set()
+        for v in values:
+            if v is _MISSING or v is None:
+                continue
+            t = type(v)
+            if t is bool:
+                kinds.add('bool')
+            elif t is int:
+                if not -INT64_MAX <= v <= INT64_MAX:
+                    return 'object'
+                kinds.add('int')
+            elif t is float:
+                kinds.add('float')
+            elif t is str:
+                kinds.add('str')
+            else:
+                return 'object'
+
+        if not kinds:
+            # only None/missing values, actual values are never compared
+            return 'float'
+
+        if len(kinds) == 1:
+            return kinds.pop()
+
+        if kinds == {'int', 'float'}:
+            if all(-FLOAT_EXACT_INT <= v <= FLOAT_EXACT_INT for v in values if type(v) is int):
+                return 'float'
+
+        return 'object'
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict], field: str, encode: bool = False):
+        values = [row.get(field, _MISSING) for row in rows]
+        n = len(values)
+        kind = cls._kind(values)
+
+        missing = np.fromiter((v is _MISSING for v in values), dtype=bool, count=n)
+        null = np.fromiter((v is None for v in values), dtype=bool, count=n)
+
+        if kind == 'object':
+            arr = None
+        elif kind == 'str' and encode:
+            lookup = dict()
+            codes = np.fromiter((lookup.setdefault(v, len(lookup)) if type(v) is str else -1 for v in values), dtype=np.int32, count=n)
+            return cls(kind, codes, missing, null, dictionary=list(lookup))
+        elif kind == 'str':
+            arr = np.array([v if type(v) is str else '' for v in values], dtype=object)
+        else:
+            dtype = {'bool': bool, 'int': np.int64, 'float': np.float64}[kind]
+            placeholder = False if kind == 'bool' else 0
+            arr = np.fromiter((placeholder if v is _MISSING or v is None else v for v in values), dtype=dtype, count=n)
+
+        return cls(kind, arr, missing, null)
+
+    def fits(self, value) -> bool:
+        """ can value be stored in this column without changing kind """
+        t = type(value)
+        if value is None:
+            return self.kind != 'object'
+        if self.kind == 'bool':
+            return t is bool
+        if self.kind == 'int':
+            return t is int and -INT64_MAX <= value <= INT64_MAX
+        if self.kind == 'float':
+            return t is float or (t is int and -FLOAT_EXACT_INT <= value <= FLOAT_EXACT_INT)
+        if self.kind == 'str':
+            return t is str
+        return False
+
+    def assign(self, positions, value):
+        # arrays can be used by searches of previous version, change copies
+        self.missing = self.missing.copy()
+        self.null = self.null.copy()
+        if self.codes is not None:
+            self.codes = self.codes.copy()
+        elif self._values is not None:
+            self._values = self._values.copy()
+
+        self.missing[positions] = False
+        if value is None:
+            self.null[positions] = True
+            if self.codes is not None:
+                self.codes[positions] = -1
+        else:
+            self.null[positions] = False
+            if self.codes is not None:
+                self.codes[positions] = self.code(value)
+            else:
+                self.values[positions] = value
+
+
+class ColumnStore():
+    """
+        columns for first `size` records of dataset. Records appended after
+        store was built (tail) are not in columns, caller checks them row-by-row
+    """
+
+    def __init__(self, rows: List[Dict], encode: Iterable[str] = ()):
+        """ encode: fields to keep dictionary-encoded (if they have only strings) """
+        self.columns: Dict[str, Column] = dict()
+        self.size = len(rows)
+        self.encode = set(encode)
+        fields = dict()
+        for row in rows:
+            for k in row:
+                fields[k] = True
+        for field in fields:
+            self.columns[field] = Column.build(rows, field, encode=field in self.encode)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, field):
+        return field in self.columns
+
+    def copy(self) -> "ColumnStore":
+        """ copy to change, columns are copied, their arrays are shared until changed """
+        store = copy.copy(self)
+        store.columns = { field: copy.copy(col) for field, col in self.columns.items() }
+        store.encode = set(self.encode)
+        return store
+
+    def compress(self, keep):
+        """ leave only rows where keep mask is True """
+        for col in self.columns.values():
+            col.missing = col.missing[keep]
+            col.null = col.null[keep]
+            if col.codes is not None:
+                col.codes = col.codes[keep]
+            elif col.values is not None:
+                col.values = col.values[keep]
+        self.size = int(keep.sum())
+
+    def delete(self, positions: List[int]):
+        keep = np.ones(self.size, dtype=bool)
+        keep[positions] = False
+        self.compress(keep)
+
+    def assign(self, positions, update: dict, rows: List[Dict]):
+        """ records at positions got item.update(update), reflect it in columns """
+        for field, value in update.items():
+            col = self.columns.get(field)
+            if col is not None and col.fits(value):
+                col.assign(positions, value)
+            else:
+                # new field or value of other type
+                self.columns[field] = Column.build(rows[:self.size], field, encode=field in self.encode)
+
+    def match(self, node: ast.Expression, shadowed=()):
+        """
+            evaluate expression over all columns.
+            returns tuple (matched, errors) of boolean masks.
+            shadowed: names which eval() resolves even if record has no such field
+        """
+        evaluator = _Evaluator(self, shadowed)
+        return evaluator.truth(evaluator.eval(node.body))
+
+    def select(self, node: ast.Expression, shadowed=()):
+        """ same as match(), but returns arrays of positions """
+        matched, errors = self.match(node, shadowed)
+        return np.flatnonzero(matched), np.flatnonzero(errors)
+
+
+class _Const():
+    def __init__(self, value):
+        self.value = value
+
+
+class _Values():
+    """
+        column-like intermediate value. err is mask of rows where evaluation raised.
+        encoded: column with codes (values are decoded only if needed)
+    """
+
+    def __init__(self, kind, values, null, err, encoded: Column = None):
+        self.kind = kind
+        self._values = values
+        self.null = null
+        self.err = err
+        self.encoded = encoded
+
+    @property
+    def values(self):
+        if self._values is None and self.encoded is not None:
+            self._values = self.encoded.values
+        return self._values
+
+
+class _Mask():
+    def __init__(self, mask, err):
+        self.mask = mask
+        self.err = err
+
+
+_NUMERIC = ('bool', 'int', 'float')
+
+_cmp_ops = {
+    ast.Eq: lambda a, b: a == b,
+    ast.NotEq: lambda a, b: a != b,
+    ast.Lt: lambda a, b: a < b,
+    ast.LtE: lambda a, b: a <= b,
+    ast.Gt: lambda a, b: a > b,
+    ast.GtE: lambda a, b: a >= b,
+}
+
+
+def _const_kind(value):
+    t = type(value)
+    if value is None:
+        return 'null'
+    if t is bool:
+        return 'bool'
+    if t is int:
+        return 'int'
+    if t is float:
+        return 'float'
+    if t is str:
+        return 'str'
+    raise NotVectorizable(f'constant of type {t.__name__}')
+
+
+class _Evaluator():
+
+    def __init__(self, store: ColumnStore, shadowed):
+        self.store = store
+        self.n = store.size
+        self.shadowed = shadowed
+
+    def zeros(self):
+        return np.zeros(self.n, dtype=bool)
+
+    def ones(self):
+        return np.ones(self.n, dtype=bool)
+
+    def eval(self, node):
+        method = getattr(self, 'eval_' + type(node).__name__, None)
+        if method is None:
+            raise NotVectorizable(f'node {type(node).__name__}')
+        return method(node)
+
+    def eval_Constant(self, node):
+        _const_kind(node.value)
+        return _Const(node.value)
+
+    def eval_Name(self, node):
+        col = self.store.columns.get(node.id)
+        if col is None:
+            if node.id in self.shadowed:
+                raise NotVectorizable(f'name {node.id!r}')
+            # NameError on every row
+            return _Values('float', np.zeros(self.n), self.zeros(), self.ones())
+
+        if col.kind == 'object':
+            raise NotVectorizable(f'field {node.id!r} has mixed or complex values')
+
+        if node.id in self.shadowed and col.missing.any():
+            raise NotVectorizable(f'name {node.id!r}')
+
+        if col.codes is not None:
+            return _Values(col.kind, None, col.null, col.missing, encoded=col)
+
+        return _Values(col.kind, col.values, col.null, col.missing)
+
+    def eval_List(self, node):
+        return _Const([self.eval_Constant(x).value for x in self._constants(node.elts)])
+
+    eval_Tuple = eval_List
+
+    def _constants(self, elts):
+        for x in elts:
+            if not isinstance(x, ast.Constant):
+                raise NotVectorizable('non-constant list element')
+            yield x
+
+    #
+    # Truth
+    #
+
+    def truth(self, v):
+        """ convert any value to (mask, err) as bool(value) would do """
+        if isinstance(v, _Mask):
+            return v.mask, v.err
+        if isinstance(v, _Const):
+            return (self.ones() if v.value else self.zeros()), self.zeros()
+
+        if v.encoded is not None:
+            empty = v.encoded.lookup.get('')
+            t = v.encoded.codes >= 0
+            if empty is not None:
+                t &= v.encoded.codes != empty
+        elif v.kind == 'str':
+            t = v.values != ''
+        else:
+            t = v.values != 0
+        return t & ~v.null & ~v.err, v.err
+
+    def eval_BoolOp(self, node):
+        err = self.zeros()
+        if isinstance(node.op, ast.And):
+            # rows which are still evaluated
+            alive = self.ones()
+            for operand in node.values:
+                t, e = self.truth(self.eval(operand))
+                err |= alive & e
+                alive &= t & ~e
+            return _Mask(alive, err)
+
+        # Or
+        result = self.zeros()
+        pending = self.ones()
+        for operand in node.values:
+            t, e = self.truth(self.eval(operand))
+            err |= pending & e
+            result |= pending & t & ~e
+            pending &= ~t & ~e
+        return _Mask(result, err)
+
+    def eval_UnaryOp(self, node):
+        if isinstance(node.op, ast.Not):
+            t, e = self.truth(self.eval(node.operand))
+            return _Mask(~t & ~e, e)
+
+        v = self.eval(node.operand)
+        if isinstance(node.op, ast.USub):
+            op = lambda x: -x
+        elif isinstance(node.op, ast.UAdd):
+            op = lambda x: +x
+        else:
+            raise NotVectorizable(f'unary {type(node.op).__name__}')
+
+        if isinstance(v, _Const):
+            try:
+                return _Const(op(v.value))
+            except Exception:
+                raise NotVectorizable('constant unary op')
+
+        if isinstance(v, _Mask) or v.kind not in _NUMERIC:
+            raise NotVectorizable('unary op on non-numeric value')
+
+        values = v.values.astype(np.int64) if v.kind == 'bool' else v.values
+        kind = 'int' if v.kind == 'bool' else v.kind
+        return _Values(kind, op(values), self.zeros(), v.err | v.null)
+
+    #
+    # Arithmetic
+    #
+
+    def eval_BinOp(self, node):
+        a = self.eval(node.left)
+        b = self.eval(node.right)
+
+        op = type(node.op)
+        if op not in (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod):
+            raise NotVectorizable(f'binary {op.__name__}')
+
+        if isinstance(a, _Const) and isinstance(b, _Const):
+            raise NotVectorizable('constant expression')
+
+        operands = list()
+        err = self.zeros()
+        kinds = list()
+        for v in (a, b):
+            if isinstance(v, _Mask):
+                raise NotVectorizable('arithmetic on boolean expression')
+            if isinstance(v, _Const):
+                kind = _const_kind(v.value)
+                if kind not in _NUMERIC:
+                    raise NotVectorizable('arithmetic on non-numeric constant')
+                operands.append(v.value)
+            else:
+                if v.kind not in _NUMERIC:
+                    raise NotVectorizable('arithmetic on non-numeric column')
+                kind = v.kind
+                # None + 1 raises TypeError
+                err |= v.err | v.null
+                operands.append(v.values)
+            kinds.append('int' if kind == 'bool' else kind)
+
+        x, y = operands
+        if isinstance(x, np.ndarray) and x.dtype == bool:
+            x = x.astype(np.int64)
+        if isinstance(y, np.ndarray) and y.dtype == bool:
+            y = y.astype(np.int64)
+
+        kind = 'float' if 'float' in kinds or op is ast.Div else 'int'
+
+        if kind == 'float' and (self._inexact(a) or self._inexact(b)):
+            # int / int is exact in python, numpy converts to float64 first
+            raise NotVectorizable('int value is not exact as float')
+        if kind == 'int' and any(type(v) is int and not -INT64_MAX <= v <= INT64_MAX for v in (x, y)):
+            raise NotVectorizable('int constant out of int64 range')
+
+        with np.errstate(all='ignore'):
+            if op is ast.Add:
+                values = x + y
+            elif op is ast.Sub:
+                values = x - y
+            elif op is ast.Mult:
+                values = x * y
+            else:
+                # ZeroDivisionError
+                zero = (y == 0)
+                if isinstance(zero, np.ndarray):
+                    err = err | zero
+                elif zero:
+                    err = self.ones()
+                safe_y = np.where(y == 0, 1, y) if isinstance(y, np.ndarray) else (y or 1)
+                if op is ast.Div:
+                    values = x / safe_y
+                else:
+                    values = np.mod(x, safe_y)
+
+            if kind == 'int' and op is not ast.Mod:
+                # int64 wraps around silently, python int does not: same in float64 must be far from limit
+                fx, fy = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+                approx = fx + fy if op is ast.Add else fx - fy if op is ast.Sub else fx * fy
+                if np.any(np.abs(np.broadcast_to(approx, (self.n,))[~err]) >= INT64_SAFE):
+                    raise NotVectorizable('int64 overflow')
+
+        values = np.broadcast_to(values, (self.n,))
+        return _Values(kind, values, self.zeros(), err)
+
+    #
+    # Comparison
+    #
+
+    def eval_Compare(self, node):
+        left = self.eval(node.left)
+        err = self._err(left)
+        alive = ~err
+
+        for op, comparator in zip(node.ops, node.comparators):
+            right = self.eval(comparator)
+            e = self._err(right)
+            err |= alive & e
+            alive &= ~e
+
+            mask, e = self.compare(left, type(op), right)
+            err |= alive & e
+            alive &= mask & ~e
+            left = right
+
+        return _Mask(alive, err)
+
+    def _err(self, v):
+        if isinstance(v, _Const):
+            return self.zeros()
+        return v.err.copy()
+
+    def compare(self, a, op, b):
+        """ returns (mask, err) for a <op> b """
+
+        if isinstance(a, _Mask) or isinstance(b, _Mask):
+            raise NotVectorizable('comparison of boolean expression')
+
+        if op in (ast.In, ast.NotIn):
+            mask, err = self._contains(a, b)
+            if op is ast.NotIn:
+                mask = ~mask & ~err
+            return mask, err
+
+        if op in (ast.Is, ast.IsNot):
+            if isinstance(b, _Const) and b.value is None and isinstance(a, _Values):
+                mask = a.null.copy()
+            elif isinstance(a, _Const) and a.value is None and isinstance(b, _Values):
+                mask = b.null.copy()
+            else:
+                raise NotVectorizable('"is" with non-None operand')
+            if op is ast.IsNot:
+                mask = ~mask
+            return mask, self.zeros()
+
+        if isinstance(a, _Const) and isinstance(b, _Const):
+            try:
+                r = _cmp_ops[op](a.value, b.value)
+            except TypeError:
+                return self.zeros(), self.ones()
+            return (self.ones() if r else self.zeros()), self.zeros()
+
+        if op in (ast.Eq, ast.NotEq):
+            mask = self._equal(a, b)
+            if op is ast.NotEq:
+                mask = ~mask
+            return mask, self.zeros()
+
+        return self._order(a, op, b)
+
+    @staticmethod
+    def _kind(v):
+        return _const_kind(v.value) if isinstance(v, _Const) else v.kind
+
+    @staticmethod
+    def _compatible(ka, kb):
+        if ka in _NUMERIC and kb in _NUMERIC:
+            return True
+        return ka == kb
+
+    def _inexact(self, v) -> bool:
+        """ int values which can not be converted to float64 exactly """
+        if isinstance(v, _Const):
+            return type(v.value) is int and not -FLOAT_EXACT_INT <= v.value <= FLOAT_EXACT_INT
+        if isinstance(v, _Mask) or v.kind != 'int':
+            return False
+        values = v.values[~(v.null | v.err)]
+        return bool(values.size) and int(np.abs(values).max()) > FLOAT_EXACT_INT
+
+    def _check_exact(self, a, b):
+        """ python compares int with float (and big ints) exactly, numpy does not """
+        kinds = (self._kind(a), self._kind(b))
+        if 'int' not in kinds:
+            return
+        if 'float' in kinds and (self._inexact(a) or self._inexact(b)):
+            raise NotVectorizable('int value is not exact as float')
+        if any(isinstance(v, _Const) and type(v.value) is int and not -INT64_MAX <= v.value <= INT64_MAX for v in (a, b)):
+            raise NotVectorizable('int constant out of int64 range')
+
+    def _null(self, v):
+        if isinstance(v, _Const):
+            return self.ones() if v.value is None else self.zeros()
+        return v.null
+
+    def _raw(self, v):
+        return v.value if isinstance(v, _Const) else v.values
+
+    def _equal(self, a, b):
+        if isinstance(a, _Const) and isinstance(b, _Values):
+            a, b = b, a
+        if isinstance(a, _Values) and a.encoded is not None and isinstance(b, _Const) and type(b.value) is str:
+            # compare codes, missing/None rows have code -1
+            code = a.encoded.lookup.get(b.value)
+            if code is None:
+                return self.zeros()
+            return a.encoded.codes == code
+
+        self._check_exact(a, b)
+        ka, kb = self._kind(a), self._kind(b)
+        na, nb = self._null(a), self._null(b)
+
+        # None == None
+        mask = na & nb
+
+        if ka != 'null' and kb != 'null' and self._compatible(ka, kb):
+            eq = np.asarray(self._raw(a) == self._raw(b), dtype=bool)
+            mask = mask | (np.broadcast_to(eq, (self.n,)) & ~na & ~nb)
+
+        return mask
+
+    def _order(self, a, op, b):
+        self._check_exact(a, b)
+        ka, kb = self._kind(a), self._kind(b)
+        na, nb = self._null(a), self._null(b)
+
+        if ka == 'null' or kb == 'null' or not self._compatible(ka, kb):
+            # TypeError: '<' not supported between instances
+            return self.zeros(), self.ones()
+
+        err = na | nb
+        r = np.asarray(_cmp_ops[op](self._raw(a), self._raw(b)), dtype=bool)
+        mask = np.broadcast_to(r, (self.n,)) & ~err
+        return mask, err
+
+    def _contains(self, a, b):
+        if not isinstance(b, _Const) or not isinstance(b.value, list):
+            raise NotVectorizable('"in" with non-list right operand')
+
+        mask = self.zeros()
+        for value in b.value:
+            mask |= self._equal(a, _Const(value))
+        return mask, self.zeros()
@@ -1,19 +1,51 @@
 
 from evalidate import Expr, EvalException, base_eval_model, EvalModel
-import requests
+import shutil
+import email.utils
 import json
 from fastapi import HTTPException
-from sqlalchemy import create_engine
-import sqlalchemy as sa
 import time
 import os
+import heapq
 import sys
+import builtins
+import ast
+import random
+import threading
+import uuid
+from contextlib import contextmanager, nullcontext
 
 from pydantic import ValidationError
 
 from .api.params import SearchQuery
 from .config import Config
-from typing import TYPE_CHECKING, List, Dict
+from . import columnar
+from .columnar import ColumnStore, NotVectorizable
+from .exprcache import expr_cache
+from .index import Indexes, IndexConfigError
+from .aggregate import Aggregator, GroupBy
+from . import parallel
+from .parallel import ParallelScanner
+from .resultcache import ResultCache
+from . import ingest
+from . import db
+from .db import DBConfigError
+from . import scheduler
+from . import fetch
+from . import interning
+from .interning import Interner
+from .rows import Row, Schema
+from .named import NamedSearch
+from .mvcc import State, Change, Records, SHIFT, MASK
+from . import rows
+from .watcher import file_stat
+from . import serialize
+from . import snapshot
+from .snapshot import SnapshotError
+from . import wal
+from . import shared
+from .wal import MutationLog, WALError
+from typing import TYPE_CHECKING, List, Dict, Iterable, Iterator
 if TYPE_CHECKING:
     from .project import Project
 
@@ -32,6 +64,14 @@ def get_deep_size(obj, seen=None):
     if isinstance(obj, dict):
         size += sum([get_deep_size(v, seen) for v in obj.values()])
         size += sum([get_deep_size(k, seen) for k in obj.keys()])
+    elif isinstance(obj, Records):
+        size += sum([get_deep_size(chunk, seen) for chunk in obj.chunks])
+    elif isinstance(obj, Row):
+        # values of slots and overflow dict
+        extra = obj.extra()
+        size += sum([get_deep_size(v, seen) for k, v in obj.items() if extra is None or k not in extra])
+        if extra is not None:
+            size += get_deep_size(extra, seen)
     elif hasattr(obj, '__dict__'):
         size += get_deep_size(obj.__dict__, seen)
     elif hasattr(obj, '__iter__') and not isinstance(obj, (str, bytes, bytearray)):
@@ -39,20 +79,155 @@ def get_deep_size(obj, seen=None):
     return size
 
 
+# datasets larger than this get sampled size estimate on load
+SIZE_EXACT_MAX = 10000
+SIZE_SAMPLE = 1000
+
+
+def record_size(item: dict, shared: Interner = None) -> int:
+    """
+        size of one record, keys are not counted (same keys are shared by records),
+        nor interned strings
+    """
+    size = sys.getsizeof(item)
+    if isinstance(item, Row) and item.extra() is not None:
+        size += sys.getsizeof(item.extra())
+
+    if shared is None:
+        return size + sum(get_deep_size(v) for v in item.values())
+
+    tables = shared.tables
+    return size + sum(get_deep_size(v) for k, v in item.items()
+                      if type(v) is not str or tables.get(k, {}).get(v) is not v)
+
+
+def estimate_size(data: list, shared: Interner = None) -> int:
+    """ size of list of records from random sample """
+    if len(data) <= SIZE_SAMPLE:
+        return get_deep_size(data)
+    sample = random.sample(data, SIZE_SAMPLE)
+    per_record = sum(record_size(item, shared) for item in sample) / SIZE_SAMPLE
+    return sys.getsizeof(data) + int(per_record * len(data)) + (shared.size() if shared else 0)
+
+
+def result_size(r: dict, shared: Interner = None) -> int:
+    """ size of search result, its records are estimated from sample """
+    records = r.get('result') or []
+    return estimate_size(records, shared) + get_deep_size({ k: v for k, v in r.items() if k != 'result' })
+
+
+def tmp_path_for(path: str) -> str:
+    """ unique temporary file next to path, for os.replace() (other writers use other files) """
+    return f'{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp'
+
+
+def shadowed_names():
+    """ names which eval() resolves from module globals or builtins if record has no such field """
+    return set(globals()) | set(vars(builtins))
+
+
+class ScanStats():
+    """
+        exceptions raised while scanning dataset.
+        first/last are by position of record, records may be scanned in any order
+    """
+
+    def __init__(self):
+        self.exceptions = 0
+        self.first_exception = None
+        self.last_exception = None
+        self._first_pos = None
+        self._last_pos = -1
+        # records checked so far / records scan will check in total
+        self.scanned = 0
+        self.planned = 0
+
+    def error(self, pos: int, e, count: int = 1):
+        self.exceptions += count
+        if self._first_pos is None or pos < self._first_pos:
+            self._first_pos = pos
+            self.first_exception = str(e)
+        if pos >= self._last_pos:
+            self._last_pos = pos
+            self.last_exception = str(e)
+
+    def merge(self, other: "ScanStats"):
+        self.scanned += other.scanned
+        if not other.exceptions:
+            return
+        self.error(other._first_pos, other.first_exception, count=0)
+        self.error(other._last_pos, other.last_exception, count=other.exceptions)
+
+
+class Collected():
+    """ what search collected from dataset: counters, aggregations and records for output """
+
+    def __init__(self, sq: SearchQuery, limit: int):
+        self.matches = 0
+        # records which passed fields projection
+        self.collected = 0
+        self.outlist = list()
+        # False if scan stopped before checking all records
+        self.complete = True
+
+        self.aggregator = Aggregator(sq.aggregate) if sq.aggregate else None
+        self.grouping = GroupBy(sq.group_by, self.aggregator or Aggregator([])) if sq.group_by else None
+
+        # records needed for output (one more to know if result is truncated)
+        self.need = None if limit is None else sq.offset + limit + 1
+
 
 class Dataset():
-    def __init__(self, name: str, project: "Project", model: EvalModel, path: os.DirEntry = None):
+    def __init__(self, name: str, project: "Project", model: EvalModel, path: os.DirEntry = None, lazy: bool = False):
         self.name = name
-        self._data = None
+        # current version of records, indexes and columns (data is None until loaded)
+        self._state = State(None, Indexes(list()), None, 0)
+        # version being built by writer
+        self._next: Change = None
         self.model = model
         self.project = project
         self.loaded = None
         self.size = None
+        # size is from full walk over data (not estimated/adjusted)
+        self.size_exact = False
+        # records, time and peak RSS of last load from file
+        self.load_stats = None
         self.load_ip = None
         self.update_ip = None
         self.path: os.DirEntry = path
         self.status = "OK"
         self.secret = None
+        self._interner: Interner = None
+        # compact records (None: records are dicts)
+        self._schema: Schema = None
+        self._parallel: ParallelScanner = None
+        self._result_cache: ResultCache = None
+        self._row_cache: serialize.RowCache = None
+        self.config = None
+        # incremented on every change of data
+        self.version = 0
+        self._load_lock = threading.Lock()
+        # mutations (and their log records) go one by one, searches do not wait
+        self._write_lock = threading.RLock()
+        self.wal: MutationLog = None
+        # shared mode: lock of local file, log and snapshot for all processes
+        self._files_lock: shared.FileLock = None
+        # (size, mtime) of local file and config when they were read or written
+        self._file_stat = None
+        self._config_stat = None
+        # delta sync from database
+        self._sync: db.SyncConfig = None
+        self._sync_job: scheduler.Job = None
+        self._watermark = None
+        self._sync_lock = threading.Lock()
+        self.sync_stats = None
+        # refresh from URL
+        self._refresh_job: scheduler.Job = None
+        self._refresh_lock = threading.Lock()
+        self._validators = None
+        self.refresh_stats = None
+        # named searches computed in background
+        self._warm_job: scheduler.Job = None
 
         self.postload_model = base_eval_model.clone()
         self.postload_model.nodes.extend(['Call', 'Attribute'])
@@ -62,7 +237,24 @@ class Dataset():
         self.read_config()
 
         if path:
-            self.set_dataset(data = self.load_file(self.path), ip=None)
+            if lazy:
+                # loaded on first access (or by project in background)
+                self.status = "not loaded"
+                self.remember_file()
+            else:
+                self.load()
+
+    @property
+    def _data(self) -> Records:
+        return self._state.data
+
+    @property
+    def _indexes(self) -> Indexes:
+        return self._state.indexes
+
+    @property
+    def _columns(self) -> ColumnStore:
+        return self._state.columns
 
     def get_config_path(self):
         return os.path.join(self.project.path, '_' + self.name + '.yaml')
@@ -71,6 +263,11 @@ class Dataset():
         return os.path.join(self.project.path, self.name + '.json')
 
     def read_config(self):
+        if self.config is not None:
+            # reload, model could be changed
+            expr_cache.invalidate(self.model)
+
+        self._config_stat = file_stat(self.get_config_path())
         try:
             self.config = Config(self.get_config_path(), role="dataset", parent=self.project.config)
         except FileNotFoundError as e:
@@ -82,15 +279,54 @@ class Dataset():
             for search_name, search_desc in vspec_searches.items():
                 try:
                     sq = SearchQuery(**search_desc)
-                    self.named_search[search_name] = dict(desc = search_desc, sq = sq, r = None)
+                    self.named_search[search_name] = NamedSearch(search_name, search_desc, sq)
                 except ValidationError as e:
                     self.status = f"named search {search_name!r} error: {e}"
         
+        # serve outdated named search result while new one is computed
+        self.search_stale = self.config.get('search_stale', False)
         self.allowed_operations = self.config.get('allowed_operations', list())
+        self.storage = self.config.get('storage', 'rows')
+
+        try:
+            indexes = Indexes(self.config.get('indexes', list()))
+        except IndexConfigError as e:
+            indexes = Indexes(list())
+            self.status = f"indexes error: {e}"
+
+        if self._parallel:
+            self._parallel.close()
+            self._parallel = None
+
+        if self.config.get('parallel'):
+            if parallel.available():
+                self._parallel = ParallelScanner(self, self.config['parallel'])
+            else:
+                print(f"!! fork() is not available, ds {self.name!r} uses serial scan")
+
+        # limits could be changed, old results are not valid.
+        # caches are per dataset, off by default (many datasets, each with own budget)
+        result_cache_size = self.config.get('result_cache', 0)
+        self._result_cache = ResultCache(result_cache_size) if result_cache_size else None
+
+        row_cache_size = self.config.get('row_cache', 0)
+        self._row_cache = serialize.RowCache(row_cache_size) if row_cache_size else None
+
+        self.configure_sync(indexes)
+        self.configure_refresh()
 
         self.set_defaults()
 
+        # searches use old indexes and columns until new ones are built
+        with self._write_lock:
+            state = self._state
+            columns = None
+            if state.data is not None:
+                indexes.build(state.data)
+                columns = self._make_columns(state.data, self._interner)
+            self._state = State(state.data, indexes, columns, state.version)
 
+        self.warm_named()
 
     def set_defaults(self):
         """
@@ -112,34 +348,266 @@ class Dataset():
         return not bool(self.load_ip)
 
     def set_dataset(self, data, ip=None, secret: str = None):
-        self._data = data
+        # new data is interned and indexed first, searches use old data until swap
+        interner = self._make_interner()
+        if interner is not None:
+            interner.data(data)
+        schema = self._make_schema(data)
+        if schema is not None:
+            schema.compact(data)
+        indexes = self._indexes.empty()
+        indexes.build(data)
+        columns = self._make_columns(data, interner)
+
+        with self._write_lock:
+            self._interner, self._schema = interner, schema
+            self.version += 1
+            self._state = State(Records(data), indexes, columns, self.version)
+            if self._row_cache is not None:
+                self._row_cache.clear()
+            self._watermark = None
+            if self.status in ("not loaded", "loading"):
+                # e.g. uploaded before lazy dataset was loaded
+                self.status = "OK"
+        self.warm_named()
+
         self.loaded = int(time.time())
-        # self.size = size
-        self.update_size()
+        self.init_size()
         self.load_ip = ip
         self.secret = secret
 
-    def load_db(self, dburl, sql):
-        assert(sql is not None)
-        engine = create_engine(dburl)
-        with engine.begin() as conn:
-            qry = sa.text(sql)
-            resultset = conn.execute(qry)
-            data = [ dict(x) for x in resultset.mappings().all() ]
-        return data
-
+    def _make_columns(self, data, interner: Interner = None) -> ColumnStore:
+        if self.storage != 'columnar':
+            return None
+
+        if not columnar.available():
+            print(f"!! numpy is not installed, ds {self.name!r} uses row storage")
+            return None
+
+        # interned fields are kept as codes
+        return ColumnStore(data, encode=interner.fields if interner else ())
+
+    def _make_interner(self) -> Interner:
+        spec = self.config.get('intern', 'auto')
+        if not spec:
+            return None
+        max_distinct = self.config.get('intern_max_distinct', interning.MAX_DISTINCT)
+        if spec == 'auto':
+            return Interner(max_distinct=max_distinct)
+        if isinstance(spec, str):
+            spec = [spec]
+        return Interner(fields=list(spec), max_distinct=max_distinct)
+
+    def _make_schema(self, data: list) -> Schema:
+        if not self.config.get('compact_rows', False):
+            return None
+        return Schema.from_sample(Interner.sample(data))
 
     def load_file(self, path: os.DirEntry) -> List[Dict]:
 
         print(f".. load dataset {self.name!r} from {path!r}")
-        with open(path) as fh:
-            return json.load(fh)
+        start = time.time()
+        with open(path, 'rb') as fh:
+            data = list(ingest.iter_records(fh))
+
+        self.load_stats = dict(records=len(data), time=round(time.time() - start, 3), peak_rss=ingest.peak_rss())
+        rss = self.load_stats['peak_rss']
+        print(f".. loaded {len(data)} records in {self.load_stats['time']}s" + (f", peak RSS: {rss // 2**20}M" if rss else ""))
+        return data
+
+    def load_db(self, dburl, sql) -> List[Dict]:
+        """ rows of sql query, read in batches through shared engine """
+        engine = db.get_engine(dburl, self.config.get('db_pool'))
+
+        print(f".. load dataset {self.name!r} from {db.engine_name(dburl)!r}")
+        start = time.time()
+        data = [ serialize.plain(row) for row in db.iter_rows(engine, sql, batch_size=self.config.get('db_batch', db.BATCH_SIZE)) ]
 
-    def load_url(self, url, format=None):
+        self.load_stats = dict(records=len(data), time=round(time.time() - start, 3), peak_rss=ingest.peak_rss())
+        print(f".. loaded {len(data)} records in {self.load_stats['time']}s")
+        return data
+
+    def _loads_db(self) -> bool:
+        """ loaded from database (not from local file) on every load. With sync, local file is kept up to date instead """
+        return bool(self.config.get('db') and self.config.get('sql') and not self.config.get('sync'))
+
+    def load(self):
+        """ load dataset from local file or database (if not loaded yet) """
+        with self._load_lock:
+            if self._data is not None:
+                return
+
+            status = self.status
+            self.status = "loading"
+            try:
+                with self._files_locked():
+                    # shared mode: first process writes snapshot, others load it
+                    self.remember_file()
+                    if self._loads_db() and shared.is_leader():
+                        # other processes reload local file when it's replaced
+                        data = self.load_db(self.config['db'], self.config['sql'])
+                        self._save_local(data)
+                    else:
+                        data = self.load_local(self.path)
+                self.set_dataset(data = data, ip=None)
+                self.status = "OK" if status in ("not loaded", "loading") else status
+                self.start_wal()
+            except Exception as e:
+                self.status = f"load error: {e}"
+                raise
+
+    def remember_file(self):
+        """ local file is read or written by us, watcher must not reload it """
+        self._file_stat = file_stat(self.get_dataset_path())
+
+    def reload_file(self):
+        """ load local file changed by someone else (mutation log of old file is dropped) """
+        with self._load_lock:
+            if self._data is None:
+                # not loaded yet, new file will be loaded
+                self.remember_file()
+                return
+
+            json_path = self.get_dataset_path()
+            # even if it can not be loaded, do not try again until file is changed
+            self.remember_file()
+            data = self.load_local(json_path)
+            self.set_dataset(data)
+            self.start_wal()
+
+    def ensure_loaded(self):
+        if self._data is None and self.path:
+            try:
+                self.load()
+            except Exception as e:
+                raise HTTPException(status_code=503, detail=f'Can not load ds {self.name!r}: {e}')
+        elif shared.enabled:
+            self.follow()
+
+    def load_local(self, path: os.DirEntry) -> List[Dict]:
+        """ load from snapshot if it's valid, otherwise from JSON file (and write snapshot) """
+        if self.config.get('snapshot', True):
+            start = time.time()
+            try:
+                data = snapshot.read(path)
+            except SnapshotError as e:
+                print(f"!! {e}")
+                data = None
+
+            if data is not None:
+                self.load_stats = dict(records=len(data), time=round(time.time() - start, 3), peak_rss=ingest.peak_rss(), snapshot=True)
+                print(f".. loaded dataset {self.name!r} from snapshot ({len(data)} records) in {self.load_stats['time']}s")
+                return data
+
+        data = self.load_file(path)
+        self.save_snapshot(path, data)
+        return data
+
+    def save_snapshot(self, path: os.DirEntry, data: list):
+        if not self.config.get('snapshot', True):
+            return
+        try:
+            # marshal needs dicts
+            snapshot.write(path, rows.plain(data) if self._schema is not None else list(data))
+        except (SnapshotError, OSError) as e:
+            print(f"!! can not write snapshot for ds {self.name!r}: {e}")
+
+    def load_url(self, url, format=None) -> List[Dict]:
         print(f".. load dataset {self.name!r} from {url!r}")
-        return requests.get(url).json()
+        fh, _ = fetch.download(url, timeout=self.config.get('http_timeout', fetch.TIMEOUT))
+        with fh:
+            return self._parse_download(fh)
+
+    def _parse_download(self, fh) -> List[Dict]:
+        """ records from downloaded JSON/NDJSON, or from its 'keypath' field """
+        keypath = self.config.get('keypath')
+        if keypath:
+            # document is not list, can not be parsed record by record
+            data = ingest.loads(fh.read())[keypath]
+            if not isinstance(data, list):
+                raise ingest.IngestError(f'{keypath!r} is not list')
+            return data
+        return list(ingest.iter_records(fh))
+
+    def refresh_url(self) -> bool:
+        """
+            download dataset from 'url' if it's changed since last download and
+            replace data (and local file). Returns False if not modified
+            (or if other process does it, see shared.py)
+        """
+        if not shared.is_leader():
+            return False
+        url = self.config['url']
+        with self._refresh_lock:
+            start = time.time()
+            if self._validators is None and self.path and os.path.exists(self.get_dataset_path()):
+                # local copy is from last download
+                self._validators = dict(last_modified=email.utils.formatdate(os.path.getmtime(self.get_dataset_path()), usegmt=True))
+
+            fh, validators = fetch.download(url, validators=self._validators, timeout=self.config.get('http_timeout', fetch.TIMEOUT))
+            if fh is None:
+                self.refresh_stats = dict(modified=False, time=round(time.time() - start, 3), checked=int(time.time()))
+                return False
+
+            with fh:
+                # old data stays if new one can not be parsed
+                data = self._parse_download(fh)
+                with self._mutating():
+                    if self.path:
+                        self._save_download(fh, data)
+                    self.set_dataset(data)
+                    if self.path and self.wal is None:
+                        self.start_wal()
+
+            self._validators = validators
+            self.refresh_stats = dict(modified=True, records=len(data), time=round(time.time() - start, 3), checked=int(time.time()))
+            print(f".. refreshed ds {self.name!r} from {url!r} ({len(data)} records) in {self.refresh_stats['time']}s")
+            return True
+
+    def _save_download(self, fh, data: list):
+        """ new local copy of URL dataset (local changes in mutation log are dropped) """
+        json_path = self.get_dataset_path()
+        tmp_path = tmp_path_for(json_path)
+        with open(tmp_path, 'wb') as out:
+            if self.config.get('keypath'):
+                out.write(serialize.dumps(data))
+            else:
+                fh.seek(0)
+                shutil.copyfileobj(fh, out)
+        os.replace(tmp_path, json_path)
+        self.remember_file()
+        self.save_snapshot(json_path, data)
+        if self.wal is not None:
+            self.wal.reset()
+
+    def upload(self, data: list, ip=None, secret: str = None, save: bool = True, tmp_path: str = None):
+        """
+            replace data with uploaded one. save: write it to local file too
+            (tmp_path is file with it, already written), its mutation log starts
+        """
+        with self._mutating():
+            self.set_dataset(data, ip=ip, secret=secret)
+            if not save:
+                return
+
+            self._save_local(data, tmp_path)
+            self.start_wal()
+
+    def _save_local(self, data: list, tmp_path: str = None):
+        """ replace local file (and snapshot) with data, its old mutation log is not valid anymore """
+        json_path = self.get_dataset_path()
+        if tmp_path is None:
+            # other processes must not see half-written file
+            tmp_path = tmp_path_for(json_path)
+            with open(tmp_path, "w") as fh:
+                # records could be compacted by set_dataset
+                json.dump(data, fh, default=serialize._default)
+        os.replace(tmp_path, json_path)
+        self.remember_file()
+        self.save_snapshot(json_path, data)
 
     def __len__(self):
+        self.ensure_loaded()
         return len(self._data)
 
     def __str__(self):
@@ -154,93 +622,264 @@ class Dataset():
         raise HTTPException(status_code=401, detail=f'Operation {opname!r} not allowed for ds {self.name!r}')
 
 
-    def search(self, sq: SearchQuery):
+    def compile(self, expr: str) -> Expr:
+        """ compiled expression (cached), raises EvalException """
+        return expr_cache.get(expr, self.model)
 
-        def minnone(*args):
-            l = [ x for x in args if x is not None ]
-            if not l:
-                return None
-            return min(l)
+    def _row_exception(self, expr: Expr, item: dict):
+        """ exception eval() raises on this record """
+        try:
+            eval(expr.code, None, item)
+        except Exception as e:
+            return e
+
+    def _eval_rows(self, expr: Expr, positions: Iterable[int], stats: ScanStats, data: Records):
+        """ row-by-row eval() on records at positions """
+        chunks = data.chunks
+        for pos in positions:
+            stats.scanned += 1
+            item = chunks[pos >> SHIFT][pos & MASK]
+            try:
+                if eval(expr.code, None, item):
+                    yield pos, item
+            except Exception as e:
+                stats.error(pos, e)
+
+    def _scan(self, expr: Expr, stats: ScanStats, state: State):
+        """ yield (position, record) for each record of state (version) matching expr """
+
+        start = 0
+        data, indexes, columns = state.data, state.indexes, state.columns
+
+        if indexes:
+            candidates = indexes.candidates(expr.node)
+            if candidates is not None:
+                stats.planned = len(candidates)
+                yield from self._eval_rows(expr, candidates, stats, data)
+                return
+
+        if columns is not None:
+            try:
+                positions, errors = columns.select(expr.node, shadowed=shadowed_names())
+            except NotVectorizable:
+                pass
+            else:
+                stats.planned = len(columns)
+                if len(errors):
+                    first_pos, last_pos = int(errors[0]), int(errors[-1])
+                    stats.error(first_pos, self._row_exception(expr, data[first_pos]))
+                    if len(errors) > 1:
+                        stats.error(last_pos, self._row_exception(expr, data[last_pos]), count=len(errors) - 1)
+
+                chunks = data.chunks
+                for pos in positions.tolist():
+                    # all records before this one are checked
+                    stats.scanned = pos + 1
+                    yield pos, chunks[pos >> SHIFT][pos & MASK]
+
+                # records inserted after column store was built
+                start = stats.scanned = len(columns)
+
+        stats.planned += len(data) - start
+        yield from self._eval_rows(expr, range(start, len(data)), stats, data)
+
+    def _scan_sorted(self, expr: Expr, sq: SearchQuery, stats: ScanStats, state: State):
+        """
+            yield (position, record) for records matching expr in sq.sort order,
+            taken from sorted index. None if sorted index can not be used.
+        """
+        if not sq.sort or (sq.fields and sq.sort not in sq.fields):
+            return None
+
+        index = state.indexes.sorted_index(sq.sort)
+        if index is None:
+            return None
+
+        candidates = state.indexes.candidates(expr.node)
+        unsorted, ordered = index.order(state.data, reverse=sq.reverse, candidates=candidates)
+
+        # matching records without sort field or with value of other type
+        # will fail sorted() or be sorted other way, do it as usual
+        unsorted_stats = ScanStats()
+        for _ in self._eval_rows(expr, unsorted, unsorted_stats, state.data):
+            return None
+        # (not before: usual scan plans its own records)
+        stats.planned = len(state.data) if candidates is None else len(candidates)
+        stats.merge(unsorted_stats)
 
-        exceptions = 0
-        last_exception = None
-        matches = 0
+        return self._eval_rows(expr, ordered, stats, state.data)
 
-        op = sq.op or 'filter'
+    def _collect(self, sq: SearchQuery, limit: int, stats: ScanStats, matched: Iterable, presorted: bool = False, early_stop: bool = True) -> Collected:
+        """
+            consume matched (position, record) pairs: count matches, aggregate,
+            keep records needed for output
+        """
+        c = Collected(sq, limit)
+        c.outlist = list(self._output(c, sq, stats, matched, presorted=presorted, early_stop=early_stop))
+        return c
+
+    def _output(self, c: Collected, sq: SearchQuery, stats: ScanStats, matched: Iterable, presorted: bool = False, early_stop: bool = True) -> Iterable[dict]:
+        """
+            records needed for output (offset + limit + 1) in output order.
+            counters and aggregations in c are complete when generator is exhausted
+        """
+
+        aggregator = c.aggregator
+        grouping = c.grouping
+
+        def projected():
+            for pos, item in matched:
+                try:
+                    c.matches += 1
+                    if sq.fields:
+                        item = {k: item[k] for k in sq.fields}
 
-        limit = minnone(self.config.get('limit'), sq.limit)
+                except Exception as e:
+                    stats.error(pos, e)
+                    continue
+
+                c.collected += 1
+                if aggregator:
+                    aggregator.add(item)
+                if grouping:
+                    grouping.add(item)
+                yield item
+
+        need = c.need
+        # stop as soon as page is filled (if exact count is not needed)
+        early_stop = early_stop and sq.count != 'exact' and not (aggregator or grouping)
+
+        if sq.discard:
+            # only counters and aggregations
+            for item in projected():
+                if early_stop and need is not None and c.collected >= need:
+                    c.complete = False
+                    break
+
+        elif need is None:
+            if sq.sort and not presorted:
+                yield from sorted(projected(), key=lambda x: x[sq.sort], reverse=sq.reverse)
+            else:
+                yield from projected()
+
+        elif sq.sort and not presorted:
+            # top-K, same as sorted()[:need]
+            select = heapq.nlargest if sq.reverse else heapq.nsmallest
+            yield from select(need, projected(), key=lambda x: x[sq.sort])
+
+        else:
+            # records come in final order
+            n = 0
+            for item in projected():
+                if n < need:
+                    n += 1
+                    yield item
+                elif early_stop:
+                    c.complete = False
+                    break
 
+    def search(self, sq: SearchQuery):
+        self.ensure_loaded()
         try:
-            expr = Expr(sq.expr, model=self.model) 
+            expr = self.compile(sq.expr)
         except EvalException as e:
             raise HTTPException(status_code=400, detail=f'Eval exception: {e}')
 
-        outlist = list()
-        
-        for item in self._data:
-            try:
-                if eval(expr.code, None, item):
-                    matches += 1
-                    if sq.fields:
-                        item = {k: item[k] for k in sq.fields}
-                    outlist.append(item)
+        # whole search works with this version, changes made meanwhile are not seen
+        state = self._state
+        if self._result_cache is None:
+            return self._search(sq, expr, state)
+
+        key = self._result_key(sq, expr)
+        r = self._result_cache.get(key, state.version)
+        if r is None:
+            r = self._search(sq, expr, state)
+            self._result_cache.put(key, state.version, r, result_size(r, self._interner))
+
+        # caller may add fields (e.g. 'time') to result
+        return dict(r)
+
+    @staticmethod
+    def _result_key(sq: SearchQuery, expr: Expr):
+        """ same key for queries which give same result """
+        return (
+            ast.dump(expr.node),
+            sq.sort, sq.reverse, sq.limit, sq.offset,
+            tuple(sq.fields) if sq.fields else None,
+            tuple(sq.aggregate) if sq.aggregate else None,
+            sq.group_by, sq.discard, sq.count
+        )
+
+    def _limit(self, sq: SearchQuery):
 
-            except Exception as e:
-                exceptions += 1
-                last_exception = str(e)
+        def minnone(*args):
+            l = [ x for x in args if x is not None ]
+            if not l:
+                return None
+            return min(l)
+
+        return minnone(self.config.get('limit'), sq.limit)
+
+    def _run(self, sq: SearchQuery, expr: Expr, limit: int, stats: ScanStats, state: State):
+        """
+            (Collected, records in output order). Records may be generator,
+            counters in Collected are final only after it is consumed
+        """
+        matched = self._scan_sorted(expr, sq, stats, state)
+        presorted = matched is not None
 
-        # Sort
-        if sq.sort:
-            outlist = sorted(outlist, key=lambda x: x[sq.sort], reverse=sq.reverse)
+        if not presorted and self._parallel and self._parallel.suitable(sq) \
+                and state.columns is None and state.indexes.candidates(expr.node) is None:
+            c = self._parallel.collect(expr, sq, limit, stats)
+            return c, c.outlist
 
+        if not presorted:
+            matched = self._scan(expr, stats, state)
+        c = Collected(sq, limit)
+        return c, self._output(c, sq, stats, matched, presorted=presorted)
+
+    def _summary(self, c: Collected, sq: SearchQuery, limit: int, stats: ScanStats) -> dict:
+        """ search result without records """
 
         result = {
             'status': 'OK',
             'limit': limit,
-            'matches': matches,
+            'matches': c.matches,
             'truncated': False,
 
-            'exceptions': exceptions,
-            'last_exception': last_exception
+            'exceptions': stats.exceptions,
+            'last_exception': stats.last_exception
         }
 
-        # Aggregation functions
-        if sq.aggregate:
-            result['aggregation']=dict()
-            for agg in sq.aggregate:
-                try:
-                    method, field = agg.split(':')
-                except ValueError:
-                    raise HTTPException(status_code=400, detail=f'Can not parse aggregation statement {agg!r} must be in form AGG:FIELD e.g. min:price')
+        if not c.complete:
+            if sq.count == 'none':
+                result['matches'] = None
+            else:
+                result['matches'] = round(c.matches * stats.planned / stats.scanned)
 
-                try:
+        if sq.count != 'exact':
+            result['count'] = 'exact' if c.complete else sq.count
 
-                    if outlist:
-                        if method == 'sum':
-                            agg_result = sum(x[field] for x in outlist)
-                        elif method == 'max':
-                            agg_result = max(x[field] for x in outlist)
-                        elif method == 'min':
-                            agg_result = min(x[field] for x in outlist)
-                        elif method == 'avg':
-                            agg_result = sum(x[field] for x in outlist) / len(outlist)
-                        elif method == 'distinct':
-                            agg_result = sorted({x[field] for x in outlist})
-                        else:
-                            raise HTTPException(status_code=400, detail=f'Unknown aggregation method {method!r} must be one of sum/min/max/avg/distinct, e.g. min:price')
+        if c.aggregator:
+            result['aggregation'] = c.aggregator.results()
 
-                    else:
-                        # empty outlist
-                        agg_result=None
-                
-                except KeyError as e:
-                    field = e.args[0]
-                    raise HTTPException(status_code=400, detail=f'Key exception {field!r} during aggregation')
+        if c.grouping:
+            result['groups'] = c.grouping.results()
 
-                except Exception as e:
-                    raise HTTPException(status_code=400, detail=f'Exception during aggregation: {e!r}')
-                                    
-                result['aggregation'][agg] = agg_result
+        if limit is not None and c.collected - sq.offset > limit:
+            result['truncated'] = True
+
+        return result
+
+    def _search(self, sq: SearchQuery, expr: Expr, state: State):
+
+        stats = ScanStats()
+        limit = self._limit(sq)
+
+        c, records = self._run(sq, expr, limit, stats, state)
+        outlist = list(records)
+
+        result = self._summary(c, sq, limit, stats)
 
         # Truncate to offset/limit            
         if sq.offset:
@@ -248,33 +887,109 @@ class Dataset():
         
         if limit is not None and len(outlist) > limit:
             outlist = outlist[:limit]
-            result['truncated'] = True
 
         # Discard
         if not sq.discard:
             result['result'] = outlist
 
         return result
-            
+
+    def _row_encoder(self, sq: SearchQuery):
+        """ encoder of output records, cached for records of dataset (not projected by fields) """
+        if self._row_cache is not None and not sq.fields:
+            return self._row_cache.encode
+        return None
+
+    def dumps_result(self, result: dict, sq: SearchQuery) -> bytes:
+        """ search() result as JSON bytes """
+        return serialize.dumps_result(result, self._row_encoder(sq))
+
+    def search_stream(self, sq: SearchQuery) -> Iterator[bytes]:
+        """
+            search result as NDJSON lines: records, then {"summary": {...}}
+            (same as search() result without 'result').
+            Records are sent while dataset is scanned (unless they must be sorted)
+        """
+        self.ensure_loaded()
+        try:
+            expr = self.compile(sq.expr)
+        except EvalException as e:
+            raise HTTPException(status_code=400, detail=f'Eval exception: {e}')
+
+        stats = ScanStats()
+        limit = self._limit(sq)
+        c, records = self._run(sq, expr, limit, stats, self._state)
+        encode = self._row_encoder(sq) or serialize.dumps
+
+        def generate():
+            try:
+                for n, item in enumerate(records):
+                    if n < sq.offset or (limit is not None and n >= sq.offset + limit):
+                        continue
+                    yield encode(item) + b'\n'
+                summary = self._summary(c, sq, limit, stats)
+            except HTTPException as e:
+                # headers are already sent
+                summary = dict(status='ERROR', detail=e.detail)
+            yield serialize.dumps(dict(summary=summary)) + b'\n'
+
+        return generate()
+
     def delete(self, sq: SearchQuery):
 
         self.check_allowed_operation("delete")
+        self.ensure_loaded()
 
-        exceptions = 0
-        last_exception = None
         try:
-            expr = Expr(sq.expr, model=self.model) 
+            expr = self.compile(sq.expr)
         except EvalException as e:
             raise HTTPException(status_code=400, detail=f'Eval exception: {e}')
 
-        try:
-            old_size = len(self._data)
-            self._data[:] = [ item for item in self._data if not eval(expr.code, None, item)  ]
-            new_size = len(self._data)
+        with self._mutating():
+            result = self._delete(expr)
+            if result['new_size'] != result['old_size']:
+                self._log(dict(op='delete', expr=sq.expr))
 
-        except Exception as e:
-            exceptions += 1
-            last_exception = str(e)
+        return result
+
+    @contextmanager
+    def _writing(self) -> Iterator[Change]:
+        """
+            change of data: next version is built (copy-on-write) from current
+            one and published at the end. Nested writes are part of outer one.
+            Nothing is published if exception is raised
+        """
+        with self._write_lock:
+            if self._next is not None:
+                yield self._next
+                return
+
+            change = self._next = Change(self._state)
+            try:
+                yield change
+            finally:
+                self._next = None
+
+            if change.changed:
+                self.version += 1
+                self._state = change.state(self.version)
+
+    def _delete(self, expr: Expr):
+        stats = ScanStats()
+        with self._writing() as change:
+            old_size = len(change.data)
+            positions = [ pos for pos, _ in self._scan(expr, stats, change) ]
+
+            if stats.exceptions:
+                # nothing is deleted if expression fails on any record
+                exceptions = 1
+                last_exception = stats.first_exception
+            else:
+                exceptions = 0
+                last_exception = None
+                self._delete_positions(positions)
+
+            new_size = len(change.data)
 
         result = {
             'status': 'OK',
@@ -287,60 +1002,485 @@ class Dataset():
         self.drop_cache()
         return result
 
+    def _delete_positions(self, positions: List[int]):
+        if not positions:
+            return
+
+        with self._writing() as change:
+            drop = set(positions)
+            removed = [ change.data[pos] for pos in positions ]
+            self.adjust_size(removed=removed)
+            if self._row_cache is not None:
+                for item in removed:
+                    self._row_cache.discard(item)
+
+            data = Records(item for pos, item in enumerate(change.data) if pos not in drop)
+            # positions are shifted
+            indexes = change.indexes.empty()
+            indexes.build(data)
+            change.replace(data=data, indexes=indexes)
+
+            columns = change.writable_columns()
+            if columns is not None:
+                columns.delete([ pos for pos in positions if pos < len(columns) ])
+
     def insert(self, record):
-        self._data.append(record)
+        self.ensure_loaded()
+        with self._mutating():
+            self._insert(record)
+            self._log(dict(op='insert', record=record))
+
+    def insert_many(self, records: List[dict]):
+        """ insert batch of records, indexes and size are updated once """
+        self.ensure_loaded()
+        with self._mutating():
+            self._insert_many(records)
+            self._log(dict(op='insert', records=records))
+
+    def bulk_insert(self, fh, batch_size: int = 1000) -> dict:
+        """ insert records from NDJSON or JSON list file, bad records are reported and skipped """
+        errors = list()
+        inserted = 0
+        batch = list()
+
+        try:
+            for record in ingest.iter_records(fh, errors=errors):
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    self.insert_many(batch)
+                    inserted += len(batch)
+                    batch = list()
+        except ingest.IngestError as e:
+            # broken JSON list, can not continue
+            errors.append(dict(line=None, error=f'{e}, rest of data is ignored'))
+
+        if batch:
+            self.insert_many(batch)
+            inserted += len(batch)
+
+        return {
+            'status': 'OK',
+            'inserted': inserted,
+            'rejected': len(errors),
+            # do not send too much
+            'errors': errors[:100],
+            'new_size': len(self._data)
+        }
+
+    def _insert(self, record):
+        self._insert_many([record])
+
+    def _insert_many(self, records: List[dict]):
+        if self._interner is not None:
+            self._interner.intern(records)
+        if self._schema is not None:
+            records = self._schema.rows(records)
+
+        with self._writing() as change:
+            data = change.rows()
+            start = len(data)
+            data.extend(records)
+            self.adjust_size(added=records)
+            change.writable_indexes().add_many(start, records)
+
+            if change.columns is not None:
+                # rebuild columns when too many records are checked row-by-row
+                tail = len(data) - len(change.columns)
+                if tail > max(1000, len(change.columns) // 8):
+                    change.replace(columns=self._make_columns(data, self._interner))
+
+        self.drop_cache()
 
     def update(self, sq: SearchQuery, ip: str = None):
 
         self.check_allowed_operation("update")
-
-        exceptions = 0
-        last_exception = None
+        self.ensure_loaded()
 
         if sq.update is None:
             raise HTTPException(status_code=400, detail=f'need update')
 
 
         try:
-            expr = Expr(sq.expr, model=self.model) 
+            expr = self.compile(sq.expr)
         except EvalException as e:
             raise HTTPException(status_code=400, detail=f'Compile {sq.expr!r} exception: {e}')
 
-        matches = 0
-
-        value = sq.update
+        with self._mutating():
+            result = self._update(expr, sq.update)
+            if result['matches']:
+                self._log(dict(op='update', expr=sq.expr, update=sq.update))
 
-        for item in self._data:
-            try:
-                if eval(expr.code, None, item):
-                    matches += 1
-                    # value = eval(update_expr.code, None, item)
-                    # item[sq.update_field] = value
-                    item.update(value)
-
-            except Exception as e:
-                exceptions += 1
-                last_exception = str(e)
-
-
-        self.update_size()
         self.update_ip = ip
+        return result
+
+    def _update_rows(self, change: Change, positions: List[int], value: dict):
+        """ records at positions are replaced with updated copies (old ones can be used by searches) """
+        data = change.rows()
+        indexes = change.writable_indexes()
+        for pos in positions:
+            item = data[pos]
+            new = item.copy()
+            new.update(value)
+            indexes.discard(pos, item, fields=value)
+            indexes.add(pos, new, fields=value)
+            data[pos] = new
+            self.adjust_size(removed=[item], added=[new])
+            if self._row_cache is not None:
+                self._row_cache.discard(item)
+
+        columns = change.writable_columns()
+        if columns is not None:
+            columns.assign([ pos for pos in positions if pos < len(columns) ], value, data)
+
+    def _update(self, expr: Expr, value: dict):
+        if self._interner is not None:
+            self._interner.intern([value])
+        stats = ScanStats()
+
+        with self._writing() as change:
+            positions = [ pos for pos, _ in self._scan(expr, stats, change) ]
+            if positions:
+                self._update_rows(change, positions, value)
+        matches = len(positions)
 
         result = {
             'status': 'OK',
             'matches': matches,
-            'exceptions': exceptions,
-            'last_exception': last_exception
+            'exceptions': stats.exceptions,
+            'last_exception': stats.last_exception
         }
         self.drop_cache()
         return result
-    
+
+    def configure_refresh(self):
+        if self._refresh_job is not None:
+            scheduler.cancel(self._refresh_job)
+            self._refresh_job = None
+
+        refresh = self.config.get('refresh')
+        if not refresh:
+            return
+
+        if not self.config.get('url'):
+            self.status = "refresh error: refresh needs url"
+            return
+
+        self._refresh_job = scheduler.every(refresh, self.refresh_url, name=f'refresh {self.name}')
+
+    def configure_sync(self, indexes: Indexes):
+        if self._sync_job is not None:
+            scheduler.cancel(self._sync_job)
+            self._sync_job = None
+        self._sync = None
+
+        if not self.config.get('sync'):
+            return
+
+        try:
+            if not (self.config.get('db') and self.config.get('sql')):
+                raise DBConfigError("sync needs db and sql")
+            self._sync = db.SyncConfig(self.config['sync'])
+            indexes.ensure(self._sync.key)
+        except (DBConfigError, IndexConfigError) as e:
+            self._sync = None
+            self.status = f"sync error: {e}"
+            return
+
+        # first sync soon after start
+        self._sync_job = scheduler.every(self._sync.interval, self.sync_db, name=f'sync {self.name}', delay=0)
+
+    def sync_db(self) -> dict:
+        """ fetch rows changed in database since last sync and merge them """
+        if not shared.is_leader():
+            # other process syncs, changes come with its mutation log
+            return None
+        if self._sync is None or self._data is None:
+            # not loaded yet (lazy), will sync after load
+            return None
+
+        with self._sync_lock:
+            return self._sync_db(self._sync)
+
+    def _sync_db(self, sync: db.SyncConfig) -> dict:
+        engine = db.get_engine(self.config['db'], self.config.get('db_pool'))
+        batch_size = self.config.get('db_batch', db.BATCH_SIZE)
+
+        if self._watermark is None:
+            # dataset loaded from file (or empty): continue from its newest record
+            self._watermark = max((item[sync.watermark] for item in self._data if item.get(sync.watermark) is not None), default=None)
+
+        start = time.time()
+        stats = dict(fetched=0, inserted=0, updated=0, deleted=0)
+        batch = list()
+
+        def merge():
+            # row could be changed more than once since last sync, last version wins
+            latest = { row[sync.key]: row for row in batch }
+            deleted = list()
+            if sync.deleted:
+                deleted = [ key for key, row in latest.items() if row.get(sync.deleted) ]
+                records = [ row for row in latest.values() if not row.get(sync.deleted) ]
+            else:
+                records = list(latest.values())
+
+            with self._mutating():
+                inserted, updated, removed = self._merge(sync.key, records, deleted)
+                if inserted or updated or removed:
+                    self._log(dict(op='merge', key=sync.key, records=records, deleted=deleted))
+            stats['inserted'] += inserted
+            stats['updated'] += updated
+            stats['deleted'] += removed
+
+        last = None
+        for row in db.iter_changes(engine, self.config['sql'], sync, self._watermark, batch_size=batch_size):
+            # rows come in watermark order. Value as database gives it, to compare in next query
+            last = row[sync.watermark]
+            batch.append(serialize.plain(row))
+            stats['fetched'] += 1
+            if len(batch) >= batch_size:
+                merge()
+                self._watermark = last
+                batch = list()
+        if batch:
+            merge()
+            self._watermark = last
+
+        self.sync_stats = dict(stats, watermark=self._watermark, time=round(time.time() - start, 3), finished=int(time.time()))
+        return self.sync_stats
+
+    def _merge(self, key: str, records: List[dict], deleted: list = ()):
+        """
+            insert records with new key, update records with existing key,
+            delete records with keys in deleted. Returns (inserted, updated, deleted)
+        """
+        new = list()
+        updated = 0
+        if self._interner is not None:
+            self._interner.intern(records)
+
+        # whole merge is one version
+        with self._writing() as change:
+            if key not in change.indexes:
+                # e.g. log is replayed before sync is configured
+                change.writable_indexes().ensure(key).build(change.data)
+
+            for record in records:
+                positions = change.indexes.ensure(key).lookup([record[key]])
+                if not positions:
+                    new.append(record)
+                    continue
+
+                # same row can be fetched again (rows with last watermark are), it's not update
+                positions = [ pos for pos in positions
+                    if not all(field in change.data[pos] and change.data[pos][field] == value for field, value in record.items()) ]
+                if positions:
+                    self._update_rows(change, sorted(positions), record)
+                    updated += len(positions)
+
+            if new:
+                self._insert_many(new)
+
+            positions = sorted(change.indexes.ensure(key).lookup(deleted)) if deleted else []
+            self._delete_positions(positions)
+
+        if updated or positions:
+            self.drop_cache()
+
+        return len(new), updated, len(positions)
+
+    def _files_locked(self):
+        """ shared mode: lock of local file, log and snapshot for all processes """
+        if not shared.enabled or self.project is None:
+            return nullcontext()
+        if self._files_lock is None:
+            self._files_lock = shared.FileLock(shared.lock_path(self.get_dataset_path()))
+        return self._files_lock
+
+    @contextmanager
+    def _mutating(self):
+        """
+            write lock for mutation. Shared mode: also lock for all processes,
+            mutations made by other processes are applied first
+        """
+        with self._write_lock, self._files_locked():
+            if shared.enabled and self.wal is not None:
+                self._follow()
+            yield
+
+    def follow(self):
+        """ shared mode: apply mutations made by other processes (new version of dataset) """
+        if self.wal is not None and self.wal.behind():
+            with self._mutating():
+                pass
+
+    def _follow(self):
+        for entry in self.wal.follow():
+            self._replay(entry)
+
+        if self.wal.stale:
+            # local file is replaced by other process (upload, URL refresh)
+            self.wal.close()
+            self.wal = None
+            if file_stat(self.get_dataset_path()) != self._file_stat:
+                self.remember_file()
+                self.set_dataset(self.load_local(self.get_dataset_path()))
+            self.start_wal()
+        elif self.wal.switched:
+            # compacted by other process
+            self.wal.switched = False
+            self.remember_file()
+
+    def _log(self, entry: dict):
+        if self.wal is not None:
+            self.wal.append(entry)
+
+    def start_wal(self):
+        """ replay mutation log of local dataset and continue it """
+        json_path = self.get_dataset_path()
+        if not self.config.get('wal', True) or not os.path.exists(json_path):
+            return
+
+        replayed = 0
+        with self._write_lock, self._files_locked():
+            if self.wal is not None:
+                self.wal.close()
+
+            try:
+                self.wal = MutationLog(json_path, fsync=self.config.get('wal_fsync', 'batch'))
+                for entry in self.wal.entries():
+                    self._replay(entry)
+                    replayed += 1
+                self.wal.open()
+            except (WALError, OSError) as e:
+                # e.g. read-only project directory: dataset is served, changes are not saved
+                print(f"!! no mutation log for ds {self.name!r}: {e}")
+                self.status = f"wal error: {e}"
+                if self.wal is not None:
+                    self.wal.close()
+                self.wal = None
+                return
+
+        if replayed:
+            print(f".. replayed {replayed} mutations for ds {self.name!r}")
+        wal.register(self)
+
+    def _replay(self, entry: dict):
+        op = entry['op']
+        if op == 'insert':
+            if 'records' in entry:
+                self._insert_many(entry['records'])
+            else:
+                self._insert(entry['record'])
+            return
+
+        if op == 'merge':
+            self._merge(entry['key'], entry['records'], entry.get('deleted', []))
+            return
+
+        expr = self.compile(entry['expr'])
+        if op == 'update':
+            self._update(expr, entry['update'])
+        elif op == 'delete':
+            self._delete(expr)
+        else:
+            raise WALError(f"unknown operation {op!r} in mutation log")
+
+    def wal_tick(self):
+        """ called periodically by wal thread """
+        if self.wal is None:
+            return
+
+        self.wal.sync()
+        if shared.enabled:
+            self.follow()
+
+        if not self.wal.records or not shared.is_leader():
+            return
+
+        if self.wal.size > self.config.get('wal_compact_size', 16 * 1024 * 1024) \
+                or time.time() - self.wal.since > self.config.get('wal_compact_interval', 3600):
+            self.compact()
+
+    def compact(self):
+        """ write dataset to new JSON file (and snapshot), start new empty log """
+        json_path = self.get_dataset_path()
+        tmp_path = tmp_path_for(json_path)
+
+        # mutations wait until new JSON and log are in place
+        with self._mutating():
+            start = time.time()
+            with open(tmp_path, 'w') as fh:
+                json.dump(list(self._data), fh, default=serialize._default)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, json_path)
+            self.remember_file()
+            self.wal.reset(compacted=True)
+            self.save_snapshot(json_path, self._data)
+
+        print(f".. compacted ds {self.name!r} ({len(self._data)} records) in {time.time() - start:.3f}s")
+
     def drop_cache(self):
-        # Drop all names searches cache
-        for ns_name, ns in self.named_search.items():
-            ns['r'] = None
+        if self._result_cache is not None:
+            self._result_cache.clear()
+        # named searches are computed again for new data
+        self.warm_named()
+
+    def warm_named(self):
+        """ compute named searches for current version of data in background """
+        if not self.named_search or self._data is None:
+            return
+        job = self._warm_job
+        if job is not None and not job.running and not job.cancelled:
+            # not started yet, will compute for latest version
+            return
+        self._warm_job = scheduler.soon(self._compute_named, name=f'named searches {self.name}')
 
+    def _compute_named(self):
+        for name, ns in list(self.named_search.items()):
+            try:
+                ns.compute(self)
+            except HTTPException as e:
+                print(f"!! named search {name!r} of ds {self.name!r} failed: {e.detail}")
+
+    def named_result(self, name: str):
+        """ (body, etag) of named search """
+        try:
+            ns = self.named_search[name]
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"No such named search {name!r} in ds {self.name!r}")
+        self.ensure_loaded()
+        return ns.result(self, stale=self.search_stale)
+
+
+    def init_size(self):
+        """ exact size for small dataset, estimate (and exact later) for large """
+        if len(self._data) <= SIZE_EXACT_MAX:
+            self.update_size()
+            return
+
+        self.size = estimate_size(self._data, self._interner)
+        self.size_exact = False
+        if self.config.get('size_recount', 'background') == 'background':
+            threading.Thread(target=self.update_size, daemon=True).start()
 
     def update_size(self):
-        self.size = get_deep_size(self._data)
+        """ exact size, full walk over data """
+        version = self.version
+        try:
+            size = get_deep_size(self._data)
+        except RuntimeError:
+            # data was changed during walk
+            return
+        if version == self.version:
+            self.size = size
+            self.size_exact = True
+
+    def adjust_size(self, added: list = (), removed: list = ()):
+        """ update size for added/removed records, without walk over all data """
+        if self.size is None:
+            return
+        self.size += sum(record_size(item, self._interner) for item in added)
+        self.size -= sum(record_size(item, self._interner) for item in removed)
+        self.size_exact = False
 
@@ -0,0 +1,113 @@
+"""
+    Loading datasets from SQL databases.
+
+    Engines (and their connection pools) are created once per database URL and
+    pool settings (``db_pool:`` in config) and reused by all loads. Rows are read
+    with server-side cursor (if database driver supports it) in batches, so
+    result set is never in memory twice.
+
+    Delta sync (``sync:`` in config): only rows with watermark column (like
+    updated_at) not less than last seen watermark are fetched and merged into
+    dataset by key column. Rows with true value in tombstone column (optional)
+    are removed from dataset.
+"""
+
+import threading
+from typing import Iterator
+
+import sqlalchemy as sa
+
+BATCH_SIZE = 10000
+
+# db_pool config key -> create_engine() argument
+POOL_OPTIONS = {
+    'size': 'pool_size',
+    'max_overflow': 'max_overflow',
+    'timeout': 'pool_timeout',
+    'recycle': 'pool_recycle',
+    'pre_ping': 'pool_pre_ping',
+}
+
+_engines = dict()
+_engines_lock = threading.Lock()
+
+
+class DBConfigError(Exception):
+    pass
+
+
+def get_engine(dburl: str, pool: dict = None) -> sa.engine.Engine:
+    """ shared engine for dburl with given pool settings """
+    pool = dict(pool or {})
+    unknown = set(pool) - set(POOL_OPTIONS)
+    if unknown:
+        raise DBConfigError(f"unknown db_pool options: {', '.join(sorted(unknown))}")
+
+    key = (dburl, tuple(sorted(pool.items())))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            kwargs = dict(pool_pre_ping=True, pool_recycle=3600)
+            kwargs.update({ POOL_OPTIONS[k]: v for k, v in pool.items() })
+            try:
+                engine = sa.create_engine(dburl, **kwargs)
+            except TypeError as e:
+                # e.g. pool_size for in-memory SQLite
+                raise DBConfigError(f"bad db_pool for {engine_name(dburl)!r}: {e}")
+            _engines[key] = engine
+        return engine
+
+
+def engine_name(dburl: str) -> str:
+    """ URL without password, for messages """
+    return sa.engine.make_url(dburl).render_as_string(hide_password=True)
+
+
+def iter_rows(engine: sa.engine.Engine, sql: str, params: dict = None, batch_size: int = BATCH_SIZE) -> Iterator[dict]:
+    """ rows of query as dicts, fetched in batches """
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(sa.text(sql), params or {})
+        for partition in result.mappings().partitions():
+            for row in partition:
+                yield dict(row)
+
+
+class SyncConfig():
+
+    def __init__(self, spec: dict):
+        if not isinstance(spec, dict):
+            raise DBConfigError(f"sync must be dict, not {type(spec).__name__}")
+        try:
+            self.key = spec['key']
+            self.watermark = spec['watermark']
+        except KeyError as e:
+            raise DBConfigError(f"sync needs {e.args[0]!r}")
+        self.interval = spec.get('interval', 60)
+        # tombstone column
+        self.deleted = spec.get('deleted')
+
+    def __repr__(self):
+        return f"SyncConfig(key={self.key!r}, watermark={self.watermark!r}, every {self.interval}s)"
+
+
+def iter_changes(engine: sa.engine.Engine, sql: str, sync: SyncConfig, watermark=None, batch_size: int = BATCH_SIZE) -> Iterator[dict]:
+    """
+        rows of query with watermark >= given (all rows if watermark is None),
+        in watermark order
+    """
+    query = f"SELECT * FROM ({sql}) AS sync_src"
+    params = dict()
+    if watermark is not None:
+        # >=: rows with same watermark could be committed after last sync
+        query += f" WHERE {sync.watermark} >= :watermark"
+        params['watermark'] = watermark
+    query += f" ORDER BY {sync.watermark}"
+    return iter_rows(engine, query, params, batch_size=batch_size)
+
+
+def dispose():
+    """ close all pooled connections """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
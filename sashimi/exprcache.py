@@ -0,0 +1,79 @@
+"""
+    Process-wide LRU cache of compiled evalidate expressions.
+
+    Parsing, whitelist validation and compile() are done once per
+    (expression text, EvalModel) pair. Cache must be invalidated when model
+    may be changed (project or dataset config reloaded).
+"""
+
+import threading
+from collections import OrderedDict
+
+from evalidate import Expr, EvalModel
+
+
+class ExprCache():
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, expr: str, model: EvalModel) -> Expr:
+        """ return compiled Expr, raises EvalException if expr is not valid """
+        key = (expr, id(model))
+
+        with self._lock:
+            cached = self._cache.get(key)
+            # id() may be reused by new model after old one is garbage collected
+            if cached is not None and cached.model is model:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+
+        compiled = Expr(expr, model=model)
+
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = compiled
+            self._cache.move_to_end(key)
+            self._evict()
+
+        return compiled
+
+    def _evict(self):
+        while len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, size: int):
+        with self._lock:
+            self.size = size
+            self._evict()
+
+    def invalidate(self, model: EvalModel = None):
+        """ drop expressions compiled for model (or all expressions) """
+        with self._lock:
+            if model is None:
+                self._cache.clear()
+                return
+            for key in [ k for k, v in self._cache.items() if v.model is model ]:
+                del self._cache[key]
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._cache),
+            'max_size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+    def __len__(self):
+        return len(self._cache)
+
+
+expr_cache = ExprCache()
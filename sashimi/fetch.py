@@ -0,0 +1,76 @@
+"""
+    Download of URL datasets.
+
+    All downloads go through one shared requests session (keep-alive connection
+    pool). Validators (ETag, Last-Modified) of last download are sent back, so
+    unchanged dataset is not downloaded again (304 Not Modified).
+"""
+
+import tempfile
+import threading
+from typing import IO, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import __version__
+
+TIMEOUT = 30
+POOL_SIZE = 16
+CHUNK_SIZE = 1024 * 1024
+# downloads larger than this go to disk
+SPOOL_SIZE = 8 * 1024 * 1024
+
+_session: requests.Session = None
+_session_lock = threading.Lock()
+
+
+class FetchError(Exception):
+    pass
+
+
+def session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            s.mount('http://', adapter)
+            s.mount('https://', adapter)
+            s.headers['User-Agent'] = f'sashimi/{__version__}'
+            _session = s
+        return _session
+
+
+def download(url: str, validators: dict = None, timeout: float = TIMEOUT) -> Tuple[Optional[IO[bytes]], dict]:
+    """
+        (file, validators) with body of url, (None, validators) if not modified
+        since download with given validators
+    """
+    headers = dict()
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    try:
+        with session().get(url, headers=headers, timeout=timeout, stream=True) as r:
+            if r.status_code == 304:
+                return None, validators
+
+            if r.status_code != 200:
+                raise FetchError(f'{url} returned {r.status_code}')
+
+            fh = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+            try:
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    fh.write(chunk)
+            except BaseException:
+                fh.close()
+                raise
+            fh.seek(0)
+            return fh, dict(etag=r.headers.get('ETag'), last_modified=r.headers.get('Last-Modified'))
+
+    except requests.RequestException as e:
+        raise FetchError(f'can not download {url}: {e}')
@@ -0,0 +1,549 @@
+"""
+    Dataset indexes (``indexes:`` in dataset config).
+
+    Index never decides if record matches, it only gives candidates: positions
+    of all records which can match expression (or raise exception on it).
+    Whole expression is then evaluated on candidates only, so search results
+    (and exception counters) are same as with full scan.
+
+    Searches use index of their version of dataset, writer changes copy()
+    of index (see mvcc.py). Built part of index is shared by all copies and
+    never changed, changes since build are kept aside in small 'recent' part,
+    which is copied. When it grows too big, next version gets rebuilt index.
+"""
+
+import ast
+import copy
+import heapq
+import math
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Optional, Iterable
+
+
+class IndexConfigError(Exception):
+    pass
+
+
+def conjuncts(node: ast.Expression) -> List[ast.AST]:
+    """ top-level 'and' operands of expression """
+    body = node.body
+    if isinstance(body, ast.BoolOp) and isinstance(body.op, ast.And):
+        return body.values
+    return [body]
+
+
+class HashIndex():
+    """ value -> positions, for == and 'in' predicates """
+
+    kind = 'hash'
+
+    def __init__(self, field: str):
+        self.field = field
+        self.values: Dict[object, set] = dict()
+        # records without field. Name lookup will raise (or find global name)
+        self.missing = set()
+        self._reset()
+
+    def _reset(self):
+        # values and missing are not changed after build (copies share them),
+        # changes are kept aside: stale positions are not (or not only) where
+        # values/missing say, recent ones are added since build
+        self.stale = set()
+        self.recent: Dict[object, set] = dict()
+        self.recent_missing = set()
+        self.changes = 0
+        # values which recent sets are not shared with other copy
+        self._own = set()
+
+    def build(self, rows: List[dict]):
+        values = dict()
+        missing = set()
+        for pos, row in enumerate(rows):
+            try:
+                value = row[self.field]
+            except KeyError:
+                missing.add(pos)
+                continue
+
+            try:
+                values.setdefault(value, set()).add(pos)
+            except TypeError:
+                # unhashable (list, dict) never equals to constant
+                pass
+        self.values, self.missing = values, missing
+        self._reset()
+
+    def copy(self) -> "HashIndex":
+        index = copy.copy(self)
+        index.stale = set(self.stale)
+        index.recent = dict(self.recent)
+        index.recent_missing = set(self.recent_missing)
+        index._own = set()
+        return index
+
+    def _recent(self, value) -> set:
+        """ recent positions of value, which can be changed """
+        if value not in self._own:
+            self.recent[value] = set(self.recent.get(value, ()))
+            self._own.add(value)
+        return self.recent[value]
+
+    def add(self, pos: int, row: dict):
+        self.changes += 1
+        try:
+            value = row[self.field]
+        except KeyError:
+            self.recent_missing.add(pos)
+            return
+
+        try:
+            self._recent(value).add(pos)
+        except TypeError:
+            pass
+
+    def add_many(self, start: int, rows: List[dict]):
+        for pos, row in enumerate(rows, start):
+            self.add(pos, row)
+
+    def discard(self, pos: int, row: dict):
+        self.changes += 1
+        self.stale.add(pos)
+        try:
+            value = row[self.field]
+        except KeyError:
+            self.recent_missing.discard(pos)
+            return
+
+        try:
+            if value in self.recent:
+                self._recent(value).discard(pos)
+        except TypeError:
+            pass
+
+    def lookup(self, values: list) -> set:
+        result = set()
+        stale = self.stale
+        for value in values:
+            try:
+                positions = self.values.get(value)
+                if positions:
+                    result |= positions - stale if stale else positions
+                positions = self.recent.get(value)
+                if positions:
+                    result |= positions
+            except TypeError:
+                pass
+        return result
+
+    def predicate(self, node: ast.AST) -> Optional[list]:
+        """ list of values if node is 'field == const' or 'field in [consts]' """
+        if not isinstance(node, ast.Compare) or len(node.ops) != 1:
+            return None
+
+        op = node.ops[0]
+        left, right = node.left, node.comparators[0]
+
+        if isinstance(op, ast.Eq):
+            if isinstance(right, ast.Name) and isinstance(left, ast.Constant):
+                left, right = right, left
+            if isinstance(left, ast.Name) and left.id == self.field and isinstance(right, ast.Constant):
+                return [right.value]
+
+        elif isinstance(op, ast.In):
+            if isinstance(left, ast.Name) and left.id == self.field \
+                    and isinstance(right, (ast.List, ast.Tuple)) \
+                    and all(isinstance(x, ast.Constant) for x in right.elts):
+                return [x.value for x in right.elts]
+
+        return None
+
+    def candidates(self, node: ast.AST) -> Optional[tuple]:
+        """ (match, maybe) sets of positions or None if node can not use index """
+        values = self.predicate(node)
+        if values is None:
+            return None
+
+        missing = self.missing
+        if self.stale or self.recent_missing:
+            missing = (missing - self.stale) | self.recent_missing
+        return self.lookup(values), missing
+
+
+class SortedIndex():
+    """
+        (value, position) pairs sorted by value, for range predicates and sort.
+        Only values of one kind (numbers or strings) are in index, records with
+        values of other type (None, lists, NaN...) are kept in 'other' set.
+    """
+
+    kind = 'sorted'
+
+    # position which is greater/less than any real position
+    _AFTER = math.inf
+    _BEFORE = -1
+
+    _flip = {
+        ast.Lt: ast.Gt,
+        ast.LtE: ast.GtE,
+        ast.Gt: ast.Lt,
+        ast.GtE: ast.LtE,
+        ast.Eq: ast.Eq
+    }
+
+    def __init__(self, field: str):
+        self.field = field
+        self.entries = list()
+        self.missing = set()
+        self.other = set()
+        # 'num' or 'str'
+        self.vkind = None
+        self._reset()
+
+    def _reset(self):
+        # same as in HashIndex: entries, missing and other are shared by
+        # copies, changes since build are in small sorted 'recent' list and sets
+        self.stale = set()
+        self.recent = list()
+        self.recent_missing = set()
+        self.recent_other = set()
+        self.changes = 0
+
+    @staticmethod
+    def _vkind(value):
+        t = type(value)
+        if t in (int, bool) or (t is float and not math.isnan(value)):
+            return 'num'
+        if t is str:
+            return 'str'
+        return None
+
+    def build(self, rows: List[dict]):
+        self.missing = set()
+        self.other = set()
+
+        kinds = dict(num=0, str=0)
+        for row in rows:
+            kind = self._vkind(row.get(self.field))
+            if kind:
+                kinds[kind] += 1
+        if kinds['num'] or kinds['str']:
+            self.vkind = 'str' if kinds['str'] > kinds['num'] else 'num'
+        else:
+            self.vkind = None
+
+        entries = list()
+        for pos, row in enumerate(rows):
+            try:
+                value = row[self.field]
+            except KeyError:
+                self.missing.add(pos)
+                continue
+
+            if self._vkind(value) == self.vkind:
+                entries.append((value, pos))
+            else:
+                self.other.add(pos)
+
+        entries.sort()
+        self.entries = entries
+        self._reset()
+
+    def copy(self) -> "SortedIndex":
+        index = copy.copy(self)
+        index.stale = set(self.stale)
+        index.recent = list(self.recent)
+        index.recent_missing = set(self.recent_missing)
+        index.recent_other = set(self.recent_other)
+        return index
+
+    def add(self, pos: int, row: dict):
+        self.add_many(pos, [row])
+
+    def add_many(self, start: int, rows: List[dict]):
+        """ add rows at positions start, start+1... """
+        new = list()
+        for pos, row in enumerate(rows, start):
+            self.changes += 1
+            try:
+                value = row[self.field]
+            except KeyError:
+                self.recent_missing.add(pos)
+                continue
+
+            if self.vkind is None:
+                self.vkind = self._vkind(value)
+
+            if self._vkind(value) == self.vkind:
+                new.append((value, pos))
+            else:
+                self.recent_other.add(pos)
+
+        if len(new) < 8:
+            for entry in new:
+                insort(self.recent, entry)
+        else:
+            # sort merges two sorted runs
+            self.recent.extend(new)
+            self.recent.sort()
+
+    def discard(self, pos: int, row: dict):
+        self.changes += 1
+        self.stale.add(pos)
+        try:
+            value = row[self.field]
+        except KeyError:
+            self.recent_missing.discard(pos)
+            return
+
+        if self._vkind(value) == self.vkind:
+            idx = bisect_left(self.recent, (value, pos))
+            if idx < len(self.recent) and self.recent[idx] == (value, pos):
+                del self.recent[idx]
+        else:
+            self.recent_other.discard(pos)
+
+    def conditions(self, node: ast.AST) -> Optional[list]:
+        """ list of (op, value) if node is like 'field < 10' or '10 < field <= 20' """
+        if not isinstance(node, ast.Compare):
+            return None
+
+        operands = [node.left] + node.comparators
+        result = list()
+        for a, op, b in zip(operands, node.ops, operands[1:]):
+            op = type(op)
+            if op not in self._flip:
+                return None
+
+            if isinstance(b, ast.Name) and isinstance(a, ast.Constant):
+                a, b, op = b, a, self._flip[op]
+
+            if not (isinstance(a, ast.Name) and a.id == self.field and isinstance(b, ast.Constant)):
+                return None
+
+            if self._vkind(b.value) != self.vkind:
+                return None
+
+            result.append((op, b.value))
+        return result
+
+    def slice(self, conditions: list, entries: list):
+        """ (lo, hi) range of entries matching all conditions """
+        lo, hi = 0, len(entries)
+        for op, value in conditions:
+            if op in (ast.Gt, ast.Eq, ast.LtE):
+                right = bisect_right(entries, (value, self._AFTER))
+            if op in (ast.GtE, ast.Eq, ast.Lt):
+                left = bisect_left(entries, (value, self._BEFORE))
+
+            if op is ast.Gt:
+                lo = max(lo, right)
+            elif op is ast.GtE:
+                lo = max(lo, left)
+            elif op is ast.Lt:
+                hi = min(hi, left)
+            elif op is ast.LtE:
+                hi = min(hi, right)
+            else:
+                lo, hi = max(lo, left), min(hi, right)
+        return lo, max(lo, hi)
+
+    def unsorted(self) -> set:
+        """ positions of records which are not in index (no such field or other type) """
+        if not (self.stale or self.recent_missing or self.recent_other):
+            if not self.other:
+                return self.missing
+            if not self.missing:
+                return self.other
+        return ((self.missing | self.other) - self.stale) | self.recent_missing | self.recent_other
+
+    def candidates(self, node: ast.AST) -> Optional[tuple]:
+        conditions = self.conditions(node)
+        if conditions is None:
+            return None
+
+        lo, hi = self.slice(conditions, self.entries)
+        if self.stale:
+            stale = self.stale
+            match = { pos for _, pos in self.entries[lo:hi] if pos not in stale }
+        else:
+            match = { pos for _, pos in self.entries[lo:hi] }
+
+        if self.recent:
+            lo, hi = self.slice(conditions, self.recent)
+            match.update(pos for _, pos in self.recent[lo:hi])
+        return match, self.unsorted()
+
+    @classmethod
+    def _walk(cls, entries: list, reverse: bool) -> Iterable[tuple]:
+        if not reverse:
+            yield from entries
+            return
+
+        end = len(entries)
+        while end:
+            value = entries[end - 1][0]
+            start = bisect_left(entries, (value, cls._BEFORE), 0, end)
+            for i in range(start, end):
+                yield entries[i]
+            end = start
+
+    def walk(self, reverse: bool = False) -> Iterable[int]:
+        """
+            positions in same order as sorted(..., reverse=reverse) gives:
+            equal values always go in order of position
+        """
+        entries = self._walk(self.entries, reverse)
+        if self.stale:
+            stale = self.stale
+            entries = (entry for entry in entries if entry[1] not in stale)
+        if self.recent:
+            key = (lambda entry: (entry[0], -entry[1])) if reverse else None
+            entries = heapq.merge(entries, self._walk(self.recent, reverse), key=key, reverse=reverse)
+
+        for _, pos in entries:
+            yield pos
+
+    def order(self, rows: List[dict], reverse: bool = False, candidates: List[int] = None):
+        """
+            returns (unsorted, ordered) positions.
+            unsorted: records which are not in index (no such field or other type)
+            ordered: positions in sort order
+        """
+        skip = self.unsorted()
+        if candidates is None:
+            return sorted(skip), self.walk(reverse)
+
+        unsorted = [ pos for pos in candidates if pos in skip ]
+        if unsorted:
+            skip = set(unsorted)
+            candidates = [ pos for pos in candidates if pos not in skip ]
+
+        if len(candidates) > (len(self.entries) + len(self.recent)) // 8:
+            # walk over index is cheaper than sorting many candidates
+            cset = set(candidates)
+            return unsorted, (pos for pos in self.walk(reverse) if pos in cset)
+
+        field = self.field
+        return unsorted, sorted(candidates, key=lambda pos: rows[pos][field], reverse=reverse)
+
+
+class Indexes():
+    """ all indexes of dataset """
+
+    index_types = {
+        'hash': HashIndex,
+        'sorted': SortedIndex,
+    }
+
+    def __init__(self, spec):
+        """
+            spec is dict field: type or list of fields (hash indexes)
+            and/or dicts field: type
+        """
+        self.indexes = dict()
+
+        if isinstance(spec, list):
+            spec_list, spec = spec, dict()
+            for item in spec_list:
+                if isinstance(item, dict):
+                    spec.update(item)
+                else:
+                    spec[item] = 'hash'
+
+        if not isinstance(spec, dict):
+            raise IndexConfigError(f"indexes must be list or dict, not {type(spec).__name__}")
+
+        for field, kind in spec.items():
+            try:
+                self.indexes[field] = self.index_types[kind](field)
+            except KeyError:
+                raise IndexConfigError(f"Unknown index type {kind!r} for field {field!r}, must be one of {'/'.join(self.index_types)}")
+
+    def __bool__(self):
+        return bool(self.indexes)
+
+    def __contains__(self, field):
+        return field in self.indexes
+
+    def empty(self) -> "Indexes":
+        """ indexes on same fields, not built (for new data) """
+        return Indexes({ field: index.kind for field, index in self.indexes.items() })
+
+    def copy(self) -> "Indexes":
+        """ copy to change (for next version of data) """
+        indexes = Indexes(dict())
+        indexes.indexes = { field: index.copy() for field, index in self.indexes.items() }
+        return indexes
+
+    def need_rebuild(self, size: int) -> bool:
+        """ True if indexes have too many changes since build for dataset of this size """
+        limit = max(1000, size // 32)
+        return any(index.changes > limit for index in self.indexes.values())
+
+    def ensure(self, field: str) -> HashIndex:
+        """ hash index on field (created if field has no index), for lookups by key """
+        index = self.indexes.get(field)
+        if index is None:
+            index = self.indexes[field] = HashIndex(field)
+        elif not isinstance(index, HashIndex):
+            raise IndexConfigError(f"field {field!r} needs hash index, not {index.kind}")
+        return index
+
+    def build(self, rows: List[dict]):
+        for index in self.indexes.values():
+            index.build(rows)
+
+    def add(self, pos: int, row: dict, fields=None):
+        for field, index in self.indexes.items():
+            if fields is None or field in fields:
+                index.add(pos, row)
+
+    def add_many(self, start: int, rows: List[dict]):
+        for index in self.indexes.values():
+            index.add_many(start, rows)
+
+    def discard(self, pos: int, row: dict, fields=None):
+        for field, index in self.indexes.items():
+            if fields is None or field in fields:
+                index.discard(pos, row)
+
+    def sorted_index(self, field: str) -> Optional[SortedIndex]:
+        index = self.indexes.get(field)
+        if isinstance(index, SortedIndex):
+            return index
+        return None
+
+    def _candidates(self, node):
+        for index in self.indexes.values():
+            r = index.candidates(node)
+            if r is not None:
+                return r
+        return None
+
+    def candidates(self, node: ast.Expression) -> Optional[List[int]]:
+        """
+            sorted positions of records which may match expression,
+            None if index can not be used
+        """
+
+        # Only leading indexed conjuncts are used: if record fails conjunct,
+        # 'and' never evaluates next ones, so they can not raise on it.
+        chain = list()
+        for conj in conjuncts(node):
+            r = self._candidates(conj)
+            if r is None:
+                break
+            chain.append(r)
+
+        if not chain:
+            return None
+
+        # records which pass i-th conjunct and go further or raise exception on it
+        result = None
+        for match, maybe in reversed(chain):
+            if result is None:
+                result = match | maybe
+            else:
+                result = (match & result) | maybe
+
+        return sorted(result)
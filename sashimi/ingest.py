@@ -0,0 +1,187 @@
+"""
+    Streaming dataset parser: JSON array of records or NDJSON (record per line).
+
+    Records are parsed one by one while file is read in chunks, so whole file
+    (or its text) is never in memory. orjson is used for NDJSON if installed.
+"""
+
+import re
+import json
+import codecs
+from typing import IO, Iterator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+
+CHUNK_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_ws_re = re.compile(r'[ \t\r\n]*')
+_sep_re = re.compile(r'[ \t\r\n]*([,\]])[ \t\r\n]*')
+_number_re = re.compile(r'[0-9eE+\-.]*[ \t\r\n]*')
+
+
+class IngestError(ValueError):
+    pass
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def peak_rss() -> int:
+    """ peak resident set size of process (bytes) or None """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if rss > 1 << 32 else rss * 1024
+
+
+def _chunks(fh: IO[bytes], chunk_size: int) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    while True:
+        data = fh.read(chunk_size)
+        if not data:
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(data)
+
+
+def iter_array(fh: IO[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """ elements of top-level JSON array """
+    chunks = _chunks(fh, chunk_size)
+    scan = _decoder.scan_once
+    buf = ''
+    pos = 0
+    eof = False
+    keys = dict()
+
+    def more():
+        nonlocal buf, pos, eof
+        try:
+            buf = buf[pos:] + next(chunks)
+            pos = 0
+        except StopIteration:
+            eof = True
+
+    # opening bracket
+    while True:
+        pos = _ws_re.match(buf, pos).end()
+        if pos < len(buf):
+            break
+        if eof:
+            raise IngestError('Empty dataset')
+        more()
+
+    if buf[pos] != '[':
+        raise IngestError(f'Dataset must be JSON list, got {buf[pos]!r} at start')
+    pos += 1
+
+    while True:
+        pos = _ws_re.match(buf, pos).end()
+        if pos < len(buf) or eof:
+            break
+        more()
+    if buf[pos:pos + 1] == ']':
+        return
+
+    while True:
+        try:
+            element, end = scan(buf, pos)
+        except (StopIteration, json.JSONDecodeError):
+            # separator could be at the end of previous chunk, whitespace is not skipped
+            skipped = _ws_re.match(buf, pos).end()
+            if skipped != pos:
+                pos = skipped
+                continue
+            if eof:
+                raise IngestError(f'JSON error: can not parse list element at {buf[pos:pos + 40]!r}')
+            # element is not read completely
+            more()
+            continue
+
+        m = _sep_re.match(buf, end)
+        if m is None:
+            # number could be cut at chunk boundary: '6.2' from '6.25e3'
+            if not eof and _number_re.fullmatch(buf, end):
+                more()
+                continue
+            raise IngestError(f'JSON error: unexpected data after list element at {buf[end:end + 40]!r}')
+
+        if type(element) is dict:
+            # share key strings between records, as json.load() does
+            element = dict(zip(map(keys.setdefault, element, element), element.values()))
+
+        yield element
+
+        if m.group(1) == ']':
+            return
+        pos = m.end()
+
+
+def iter_ndjson(fh: IO[bytes], errors: list = None) -> Iterator:
+    """ records from NDJSON, one per line. Bad lines go to errors (if given) """
+    for n, line in enumerate(fh, start=1):
+        line = line.strip().lstrip(codecs.BOM_UTF8)
+        if not line:
+            continue
+        try:
+            record = loads(line)
+        except ValueError as e:
+            if errors is None:
+                raise IngestError(f'JSON error in line {n}: {e}')
+            errors.append(dict(line=n, error=f'JSON error: {e}'))
+            continue
+
+        if errors is not None and not isinstance(record, dict):
+            errors.append(dict(line=n, error=f'record must be JSON object, not {type(record).__name__}'))
+            continue
+
+        yield record
+
+
+def iter_records(fh: IO[bytes], chunk_size: int = CHUNK_SIZE, errors: list = None) -> Iterator:
+    """
+        records from seekable binary file, JSON list or NDJSON
+
+        if errors list is given, records which are not JSON objects (and bad
+        NDJSON lines) are skipped and reported there as {'line': N, 'error': ...}
+        (for JSON list N is number of element)
+    """
+    start = fh.tell()
+    head = b''
+    while True:
+        data = fh.read(4096)
+        head = data.lstrip(b' \t\r\n' + codecs.BOM_UTF8)
+        if head or not data:
+            break
+    fh.seek(start)
+
+    if head.startswith(b'['):
+        if errors is None:
+            return iter_array(fh, chunk_size)
+        return _only_objects(iter_array(fh, chunk_size), errors)
+    return iter_ndjson(fh, errors=errors)
+
+
+def _only_objects(records: Iterator, errors: list) -> Iterator:
+    for n, record in enumerate(records, start=1):
+        if isinstance(record, dict):
+            yield record
+        else:
+            errors.append(dict(line=n, error=f'record must be JSON object, not {type(record).__name__}'))
+
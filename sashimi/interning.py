@@ -0,0 +1,120 @@
+"""
+    Sharing of repeated strings between records (``intern:`` in dataset config).
+
+    Values like brand or category repeat in many records, but after parsing
+    every record has its own copy of string. Interner keeps one object for
+    each distinct value of chosen fields and puts it into all records (and same
+    for keys of records). Equal interned strings are compared by identity, and
+    columnar storage keeps such fields as integer codes.
+
+    Fields are given in config, or chosen automatically (``auto``): string
+    fields which have few distinct values in sample of records. Field with
+    more than ``intern_max_distinct`` values is not interned further.
+"""
+
+import sys
+import random
+from typing import Dict, List, Optional
+
+SAMPLE = 1000
+MAX_DISTINCT = 10000
+# auto: field is interned if in sample it has less distinct values than this part of records
+AUTO_RATIO = 0.5
+
+
+class Interner():
+
+    def __init__(self, fields: Optional[List[str]] = None, max_distinct: int = MAX_DISTINCT):
+        """ fields: list of fields or None for auto """
+        self.auto = fields is None
+        self.max_distinct = max_distinct
+        # field -> {value: shared value}
+        self.tables: Dict[str, dict] = { field: dict() for field in fields or () }
+        # auto: fields with too many distinct values
+        self.rejected = set()
+        self.keys = dict()
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self.tables)
+
+    @staticmethod
+    def sample(data: list) -> list:
+        return random.sample(data, SAMPLE) if len(data) > SAMPLE else data
+
+    def choose(self, sample: list):
+        """ auto: find repeated string fields in sample of data """
+        if not self.auto:
+            return
+
+        distinct = dict()
+        count = dict()
+        for rec in sample:
+            if type(rec) is not dict:
+                continue
+            for k, v in rec.items():
+                if type(v) is str:
+                    distinct.setdefault(k, set()).add(v)
+                    count[k] = count.get(k, 0) + 1
+
+        for field, values in distinct.items():
+            if field in self.tables or field in self.rejected:
+                continue
+            if count[field] > 1 and len(values) < count[field] * AUTO_RATIO:
+                self.tables[field] = dict()
+
+    @staticmethod
+    def keys_shared(sample: list) -> bool:
+        keys = dict()
+        for rec in sample:
+            if type(rec) is dict:
+                for k in rec:
+                    if keys.setdefault(k, k) is not k:
+                        return False
+        return True
+
+    def share_keys(self, data: list):
+        """ records get same key objects (json.loads per line makes new ones) """
+        keys = self.keys
+        for pos, rec in enumerate(data):
+            if type(rec) is dict:
+                data[pos] = dict(zip(map(keys.setdefault, rec, rec), rec.values()))
+
+    def intern(self, data: list):
+        """ share values of interned fields in data (records are changed in place) """
+        for field in list(self.tables):
+            table = self.tables[field]
+            for rec in data:
+                try:
+                    v = rec[field]
+                except (KeyError, TypeError):
+                    continue
+                if type(v) is not str:
+                    continue
+                shared = table.get(v)
+                if shared is None:
+                    if self.auto and len(table) >= self.max_distinct:
+                        # values are too different, interned ones stay shared
+                        self.rejected.add(field)
+                        del self.tables[field]
+                        break
+                    table[v] = shared = v
+                rec[field] = shared
+
+    def data(self, data: list):
+        """ intern data loaded from somewhere """
+        sample = self.sample(data)
+        self.choose(sample)
+        if not self.keys_shared(sample):
+            self.share_keys(data)
+        self.intern(data)
+
+    def size(self) -> int:
+        """ memory of shared strings (counted once) """
+        return sum(sys.getsizeof(v) for table in self.tables.values() for v in table)
+
+    def stats(self) -> dict:
+        return {
+            'fields': { field: len(table) for field, table in self.tables.items() },
+            'rejected': sorted(self.rejected)
+        }
@@ -0,0 +1,168 @@
+"""
+    Versions of dataset (snapshot isolation for searches).
+
+    Search takes current State (records, indexes and columns of one version)
+    once and works only with it, without any lock: State is never changed
+    after it is published.
+
+    Writer (under dataset write lock) builds next version as Change of current
+    State, copy-on-write in small parts:
+
+        records     list of chunks (CHUNK records each), changed chunks are copied
+        record      changed record is copied, old one stays in old version
+        indexes     built part is shared, changes since build are in small
+                    per-version part (rebuilt when it grows, see index.py)
+        columns     changed column arrays are copied
+
+    Next State is published by one assignment when whole mutation is done, so
+    search sees all of it or nothing of it.
+"""
+
+from collections.abc import Sequence
+from itertools import chain, islice
+from typing import Iterable, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .index import Indexes
+    from .columnar import ColumnStore
+
+SHIFT = 12
+CHUNK = 1 << SHIFT
+MASK = CHUNK - 1
+
+
+class Records(Sequence):
+    """
+        records of one version, list of chunks. Hot loops take record at
+        position as chunks[pos >> SHIFT][pos & MASK]
+    """
+    __slots__ = ('chunks', 'size', '_own')
+
+    def __init__(self, data: Iterable = ()):
+        if not isinstance(data, list):
+            data = list(data)
+        self.chunks = [ data[start:start + CHUNK] for start in range(0, len(data), CHUNK) ]
+        self.size = len(data)
+        # writable copy: numbers of chunks which are not shared
+        self._own = None
+
+    def copy(self) -> "Records":
+        """ writable copy, chunks are shared until changed """
+        records = Records()
+        records.chunks = list(self.chunks)
+        records.size = self.size
+        records._own = set()
+        return records
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            start, stop, step = pos.indices(self.size)
+            return list(islice(self, start, stop, step))
+        if pos < 0:
+            pos += self.size
+        if not 0 <= pos < self.size:
+            raise IndexError('record position out of range')
+        return self.chunks[pos >> SHIFT][pos & MASK]
+
+    def _chunk(self, n: int) -> list:
+        """ chunk n, which can be changed """
+        if n not in self._own:
+            self.chunks[n] = list(self.chunks[n])
+            self._own.add(n)
+        return self.chunks[n]
+
+    def __setitem__(self, pos: int, item):
+        if pos < 0:
+            pos += self.size
+        if not 0 <= pos < self.size:
+            raise IndexError('record position out of range')
+        self._chunk(pos >> SHIFT)[pos & MASK] = item
+
+    def extend(self, items: Iterable):
+        items = list(items)
+        done = 0
+        if self.chunks and len(self.chunks[-1]) < CHUNK:
+            done = CHUNK - len(self.chunks[-1])
+            self._chunk(len(self.chunks) - 1).extend(items[:done])
+        for start in range(done, len(items), CHUNK):
+            self.chunks.append(items[start:start + CHUNK])
+            self._own.add(len(self.chunks) - 1)
+        self.size += len(items)
+
+    def __iter__(self):
+        return chain.from_iterable(self.chunks)
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, Records)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return f'Records({list(self)!r})'
+
+
+class State():
+    """ one version of dataset """
+    __slots__ = ('data', 'indexes', 'columns', 'version')
+
+    def __init__(self, data: Optional[Records], indexes: "Indexes", columns: Optional["ColumnStore"], version: int):
+        self.data = data
+        self.indexes = indexes
+        self.columns = columns
+        self.version = version
+
+    def __len__(self):
+        return len(self.data)
+
+
+class Change():
+    """ next version of dataset, built by writer from base State """
+
+    def __init__(self, base: State):
+        self.base = base
+        self.data = base.data
+        self.indexes = base.indexes
+        self.columns = base.columns
+        self.changed = False
+        self._own = set()
+
+    def rows(self) -> Records:
+        """ records to change """
+        if 'data' not in self._own:
+            self.data = self.data.copy()
+            self._own.add('data')
+        self.changed = True
+        return self.data
+
+    def writable_indexes(self) -> "Indexes":
+        if 'indexes' not in self._own:
+            self.indexes = self.indexes.copy()
+            self._own.add('indexes')
+        self.changed = True
+        return self.indexes
+
+    def writable_columns(self) -> Optional["ColumnStore"]:
+        if self.columns is not None and 'columns' not in self._own:
+            self.columns = self.columns.copy()
+            self._own.add('columns')
+        self.changed = True
+        return self.columns
+
+    def replace(self, data: Records = None, indexes: "Indexes" = None, columns: "ColumnStore" = None):
+        """ use new (not shared) records, indexes or columns """
+        for name, value in (('data', data), ('indexes', indexes), ('columns', columns)):
+            if value is not None:
+                setattr(self, name, value)
+                self._own.add(name)
+        self.changed = True
+
+    def state(self, version: int) -> State:
+        if self.indexes.need_rebuild(len(self.data)):
+            # too many changes since indexes were built, searches would check too much
+            indexes = self.indexes.empty()
+            indexes.build(self.data)
+            self.indexes = indexes
+        return State(self.data, self.indexes, self.columns, version)
@@ -0,0 +1,77 @@
+"""
+    Named searches (``search:`` in dataset config), computed in advance.
+
+    Result of named search is computed in background after dataset is loaded
+    and after every change of it, and kept as JSON bytes with ETag, so request
+    is answered without any work (or with 304 Not Modified).
+
+    If request comes while result is outdated, it waits for new result, or,
+    with ``search_stale: true``, gets old one (stale-while-revalidate) and new
+    one is computed in background.
+"""
+
+import time
+import hashlib
+import threading
+from typing import Tuple, TYPE_CHECKING
+
+from .api.params import SearchQuery
+
+if TYPE_CHECKING:
+    from .dataset import Dataset
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+class NamedSearch():
+
+    def __init__(self, name: str, desc: dict, sq: SearchQuery):
+        self.name = name
+        self.desc = desc
+        self.sq = sq
+        # (body, etag) of result for dataset version
+        self.response: Tuple[bytes, str] = None
+        self.version = None
+        # when result was computed and how long it took
+        self.computed = None
+        self.time = None
+        self._lock = threading.Lock()
+
+    def fresh(self, ds: "Dataset") -> bool:
+        return self.response is not None and self.version == ds.version
+
+    def compute(self, ds: "Dataset"):
+        """ compute result for current version of dataset (if not computed yet) """
+        with self._lock:
+            # data could be changed while searching, then result is for older version
+            version = ds.version
+            if self.response is not None and self.version == version:
+                return
+
+            start = time.time()
+            r = ds.search(self.sq)
+            body = ds.dumps_result(r, self.sq)
+            elapsed = round(time.time() - start, 3)
+
+            # same result has same ETag, 'time' is not part of it
+            etag = make_etag(body)
+            if len(body) > 2:
+                body = body[:-1] + b',"time":' + str(elapsed).encode() + b'}'
+
+            self.response, self.version = (body, etag), version
+            self.computed, self.time = int(time.time()), elapsed
+
+    def result(self, ds: "Dataset", stale: bool = False) -> Tuple[bytes, str]:
+        """ (body, etag) """
+        if not self.fresh(ds):
+            if stale and self.response is not None:
+                # old result now, new one in background
+                ds.warm_named()
+            else:
+                self.compute(ds)
+        return self.response
+
+    def stats(self, ds: "Dataset") -> dict:
+        return dict(fresh=self.fresh(ds), etag=self.response[1] if self.response else None, computed=self.computed, time=self.time)
@@ -0,0 +1,168 @@
+"""
+    Parallel scan of large datasets (``parallel:`` in dataset config).
+
+    Dataset is shared with worker processes by fork(): workers get copy-on-write
+    snapshot of dataset memory, nothing is serialized. Each worker scans chunk
+    of dataset and returns counters, partial aggregations and only records which
+    may be in output (top-K of chunk if sorted). Parent merges them.
+
+    Pool is forked again when dataset is changed (new version), workers scan
+    version of dataset which was current when pool was forked. Not more often
+    than once in ``refork`` seconds: meanwhile changed dataset is scanned
+    serially. Workers of old pool exit after their current tasks.
+
+    Note: fork() is not available on Windows, parallel scan is disabled there.
+"""
+
+import os
+import time
+import heapq
+import atexit
+import threading
+import multiprocessing
+import weakref
+from typing import TYPE_CHECKING
+
+from evalidate import Expr
+from fastapi import HTTPException
+
+from .api.params import SearchQuery
+
+if TYPE_CHECKING:
+    from .dataset import Dataset, ScanStats, Collected
+
+
+# datasets visible to worker processes (inherited on fork)
+_snapshots = dict()
+
+_scanners = weakref.WeakSet()
+
+
+def available() -> bool:
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def _collect_chunk(key: int, expr_text: str, sq: SearchQuery, limit: int, start: int, end: int):
+    """ runs in worker process """
+    from .dataset import ScanStats
+
+    ds, state = _snapshots[key]
+    stats = ScanStats()
+    try:
+        # not from expr_cache: its lock could be held by other thread during fork()
+        expr = Expr(expr_text, model=ds.model)
+        c = ds._collect(sq, limit, stats, ds._eval_rows(expr, range(start, end), stats, state.data), early_stop=False)
+    except HTTPException as e:
+        return dict(error=(e.status_code, e.detail))
+
+    return dict(collected=c, stats=stats)
+
+
+class ParallelScanner():
+
+    def __init__(self, ds: "Dataset", config: dict):
+        self.ds = ds
+        self.key = id(ds)
+        self.workers = config.get('workers') or os.cpu_count()
+        self.threshold = config.get('threshold', 100000)
+        self.chunk = config.get('chunk')
+        self.refork = config.get('refork', 10)
+
+        self._pool = None
+        # version of dataset in pool
+        self._pool_state = None
+        self._forked = 0
+        self._lock = threading.Lock()
+        _scanners.add(self)
+
+    def suitable(self, sq: SearchQuery) -> bool:
+        """ is parallel scan better than serial for this query """
+        if len(self.ds) < self.threshold:
+            return False
+
+        if sq.count != 'exact' and not (sq.sort or sq.aggregate or sq.group_by):
+            # serial scan stops early
+            return False
+
+        if self._pool is not None and self._pool_state is not self.ds._state \
+                and time.time() - self._forked < self.refork:
+            # dataset changed soon after fork, forking is not cheap
+            return False
+
+        return True
+
+    def pool(self):
+        """ (pool, version of dataset which its workers have) """
+        with self._lock:
+            state = self.ds._state
+            if self._pool is None or self._pool_state is not state:
+                if self._pool is not None:
+                    self._retire(self._pool)
+                _snapshots[self.key] = (self.ds, state)
+                self._pool = multiprocessing.get_context('fork').Pool(self.workers)
+                self._pool_state = state
+                self._forked = time.time()
+            return self._pool, self._pool_state
+
+    @staticmethod
+    def _retire(pool):
+        """ old snapshot, workers exit after finishing current tasks and are joined """
+        pool.close()
+        threading.Thread(target=pool.join, name='pool join', daemon=True).start()
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+            _snapshots.pop(self.key, None)
+
+    def chunks(self, n: int):
+        size = self.chunk or max(n // (self.workers * 4), 1000)
+        return [ (start, min(start + size, n)) for start in range(0, n, size) ]
+
+    def collect(self, expr: Expr, sq: SearchQuery, limit: int, stats: "ScanStats") -> "Collected":
+        from .dataset import Collected
+
+        # parse aggregations in parent, errors are raised here
+        c = Collected(sq, limit)
+        pool, state = self.pool()
+        stats.planned = len(state)
+
+        tasks = [ (self.key, expr.expr, sq, limit, start, end) for start, end in self.chunks(len(state)) ]
+        results = pool.starmap(_collect_chunk, tasks)
+
+        items = list()
+        for r in results:
+            if 'error' in r:
+                status_code, detail = r['error']
+                raise HTTPException(status_code=status_code, detail=detail)
+
+            part = r['collected']
+            stats.merge(r['stats'])
+            c.matches += part.matches
+            c.collected += part.collected
+            if c.aggregator:
+                c.aggregator.merge(part.aggregator)
+            if c.grouping:
+                c.grouping.merge(part.grouping)
+            items.extend(part.outlist)
+
+        # chunks go in dataset order, so sort is stable as in serial scan
+        if sq.discard:
+            pass
+        elif c.need is None:
+            c.outlist = sorted(items, key=lambda x: x[sq.sort], reverse=sq.reverse) if sq.sort else items
+        elif sq.sort:
+            select = heapq.nlargest if sq.reverse else heapq.nsmallest
+            c.outlist = select(c.need, items, key=lambda x: x[sq.sort])
+        else:
+            c.outlist = items[:c.need]
+
+        return c
+
+
+@atexit.register
+def _shutdown():
+    for scanner in list(_scanners):
+        scanner.close()
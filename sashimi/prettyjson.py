@@ -2,6 +2,8 @@ from starlette.responses import Response
 import typing
 import json
 
+from .serialize import _default
+
 class PrettyJSONResponse(Response):
     media_type = "application/json"
 
@@ -10,6 +12,7 @@ class PrettyJSONResponse(Response):
             content,
             ensure_ascii=False,
             allow_nan=False,
+            default=_default,
             indent=4,
             separators=(", ", ": "),
         ).encode("utf-8")
@@ -5,6 +5,8 @@ from yaml.loader import SafeLoader
 from pathlib import Path
 import string
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from typing import Dict
 
@@ -13,9 +15,34 @@ from .dataset import Dataset
 from .config import Config
 from .defdict import DefDict
 from .exception import ProjectExistsException
+from .exprcache import expr_cache
+from .watcher import file_stat, check_project
+from . import shared
+from . import snapshot
+from . import wal
 
 from evalidate import EvalModel
 
+
+# loads datasets of projects with 'loading: background'
+_loader: ThreadPoolExecutor = None
+
+
+def background_load(ds: Dataset, workers: int = 4):
+    global _loader
+    if _loader is None:
+        _loader = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dsload')
+
+    def load():
+        try:
+            ds.load()
+        except Exception as e:
+            print(f"!! can not load ds {ds.name!r}: {e}")
+
+    ds.status = "loading"
+    _loader.submit(load)
+
+
 class Project(DefDict):
 
     _d: Dict[str, Dataset]
@@ -31,10 +58,21 @@ class Project(DefDict):
         self.datasets = dict()
         self.app_config = app_config
         self.config = None
-        self.path = str(de)
+        self._config_stat = None
+        self.path = os.fspath(de)
+        # shared mode: changes made by other processes (see shared.py)
+        self._marker_stat = file_stat(shared.marker_path(self.path))
+        self._follow_lock = threading.Lock()
 
         self.read_config()
 
+        # eager: load all datasets now, lazy: on first access, background: in loader threads
+        app_config = self.app_config or dict()
+        self.loading = self.config.get('loading', app_config.get('loading', 'eager'))
+        if self.loading not in ('eager', 'lazy', 'background'):
+            print(f"!! unknown loading mode {self.loading!r} in project {self.name!r}, use eager")
+            self.loading = 'eager'
+
         for datafile in os.scandir(de):
 
             if datafile.name.startswith('_'):
@@ -45,21 +83,70 @@ class Project(DefDict):
 
 
             dsname = os.path.splitext(datafile.name)[0]
+            self.add_dataset(dsname, datafile.path)
+
+    def add_dataset(self, dsname: str, path: str) -> Dataset:
+        """ dataset from local file, loaded as project config says """
+        app_config = self.app_config or dict()
+        ds = self._d[dsname] = Dataset(name = dsname, project=self,
+                                       path = path,
+                                       model=self.model,
+                                       lazy = self.loading != 'eager')
+
+        if self.loading == 'background':
+            background_load(ds, workers=app_config.get('load_workers', 4))
+        return ds
+
+    def remove_dataset(self, dsname: str):
+        """ forget dataset, its mutation log, snapshot and lock file are removed """
+        ds = self._d.pop(dsname)
+        wal.unregister(ds)
+        if ds.wal is not None:
+            ds.wal.remove()
+        snapshot.remove(ds.get_dataset_path())
+        try:
+            os.unlink(shared.lock_path(ds.get_dataset_path()))
+        except FileNotFoundError:
+            pass
+
+    def changed(self):
+        """ datasets added/removed or configs changed, other processes follow it """
+        shared.changed(self.path)
 
-            self._d[dsname] = Dataset(name = dsname, project=self, 
-                                      path = datafile.path,
-                                      model=self.model)
+    def follow(self):
+        """ shared mode: datasets added/removed and configs changed by other processes """
+        stat = file_stat(shared.marker_path(self.path))
+        if stat == self._marker_stat:
+            return
+        with self._follow_lock:
+            stat = file_stat(shared.marker_path(self.path))
+            if stat == self._marker_stat:
+                return
+            self._marker_stat = stat
+            # changed data of dataset comes with its mutation log
+            check_project(self, reload=False)
 
     def get_config_path(self) -> str:
         return os.path.join(self.de, '__project.yml')
 
     def read_config(self):
+        if self.config is not None:
+            # reload, model could be changed
+            expr_cache.invalidate(self.model)
+
+        self._config_stat = file_stat(self.get_config_path())
         try:
             self.config = Config(self.get_config_path(), role="project", parent = self.app_config)
         except FileNotFoundError:
             self.config = Config(role="project", parent=self.app_config)
 
 
+    def reload_config(self):
+        """ read project config again, and configs of datasets (they inherit it) """
+        self.read_config()
+        for ds in self._d.values():
+            ds.read_config()
+
     def __repr__(self):
         return f'Project {self.name!r} ({" ".join(self._d)})'
     
@@ -97,6 +184,7 @@ class Project(DefDict):
         config.save()
 
         self.read_config()
+        self.changed()
 
         return token
 
@@ -155,7 +243,10 @@ class Projects():
         self.projects[key] = item
 
     def __getitem__(self, key):
-        return self.projects[key]
+        project = self.projects[key]
+        if shared.enabled:
+            project.follow()
+        return project
 
     def __repr__(self):
         return f"Projects({len(self.projects)})"
@@ -0,0 +1,80 @@
+"""
+    Per-dataset cache of search results (``result_cache:`` in dataset config).
+
+    Results are valid only for dataset version they were made for, cache is
+    emptied when dataset version changes. Least recently used results are
+    evicted when total (approximate) size of cached results exceeds budget.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class ResultCache():
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.version = None
+        # key -> (result, size)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_version(self, version: int):
+        if version != self.version:
+            self._cache.clear()
+            self.bytes = 0
+            self.version = version
+
+    def get(self, key, version: int) -> Optional[dict]:
+        with self._lock:
+            self._check_version(version)
+            cached = self._cache.get(key)
+            if cached is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached[0]
+
+    def put(self, key, version: int, result: dict, size: int):
+        if size > self.max_bytes:
+            # would evict everything and still not fit
+            return
+
+        with self._lock:
+            self._check_version(version)
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._cache[key] = (result, size)
+            self.bytes += size
+
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._cache.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            'entries': len(self._cache),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / requests, 3) if requests else None
+        }
+
+    def __len__(self):
+        return len(self._cache)
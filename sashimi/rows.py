@@ -0,0 +1,156 @@
+"""
+    Compact records (``compact_rows:`` in dataset config).
+
+    Record loaded from JSON is dict: hash table with keys and values, few
+    hundred bytes per record before any value. Compact record keeps only
+    values, in slots of class made for dataset schema (fields found in sample
+    of records), and behaves like dict (mapping), so expressions, fields,
+    update and output work as with dict records.
+
+    Fields which are not in schema go to overflow dict of record. Field which
+    is missing in record is unset slot (not stored at all).
+"""
+
+import gc
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, List
+
+# fields not in sample of records go to overflow dict
+MAX_FIELDS = 256
+
+
+class Row(MutableMapping):
+    """ base of record classes made by Schema """
+    __slots__ = ('_extra', )
+
+    # field -> slot name, set for class of schema
+    _slot: Dict[str, str] = {}
+
+    def __getitem__(self, key):
+        slot = self._slot.get(key)
+        try:
+            if slot is not None:
+                return getattr(self, slot)
+            return self._extra[key]
+        except (AttributeError, KeyError, TypeError):
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __setitem__(self, key, value):
+        slot = self._slot.get(key)
+        if slot is not None:
+            setattr(self, slot, value)
+            return
+        try:
+            self._extra[key] = value
+        except AttributeError:
+            self._extra = {key: value}
+
+    def __delitem__(self, key):
+        slot = self._slot.get(key)
+        try:
+            if slot is not None:
+                delattr(self, slot)
+            else:
+                del self._extra[key]
+        except (AttributeError, KeyError):
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        for field, slot in self._slot.items():
+            if hasattr(self, slot):
+                yield field
+        yield from getattr(self, '_extra', ())
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def copy(self) -> "Row":
+        row = type(self)()
+        for slot in self._slot.values():
+            try:
+                setattr(row, slot, getattr(self, slot))
+            except AttributeError:
+                pass
+        extra = self.extra()
+        if extra is not None:
+            row._extra = dict(extra)
+        return row
+
+    def extra(self) -> dict:
+        """ overflow dict (fields not in schema) or None """
+        return getattr(self, '_extra', None)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __reduce__(self):
+        # class is made at runtime, pickled (e.g. from parallel worker) as dict
+        return (dict, (dict(self), ))
+
+
+class Schema():
+    """ fields of dataset records and class of compact records for them """
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = list(fields)
+        slots = tuple(f'_{n}' for n in range(len(self.fields)))
+        self.slot = dict(zip(self.fields, slots))
+        self.row_class = type('Row', (Row, ), dict(__slots__=slots, _slot=self.slot))
+
+    @classmethod
+    def from_sample(cls, sample: list) -> "Schema":
+        """ schema with fields of records in sample (None if records are not dicts) """
+        fields = dict()
+        for rec in sample:
+            if type(rec) is not dict:
+                return None
+            for k in rec:
+                if len(fields) < MAX_FIELDS and type(k) is str:
+                    fields[k] = True
+        return cls(fields)
+
+    def make(self, record: dict) -> Row:
+        row = self.row_class()
+        slot = self.slot
+        for k, v in record.items():
+            s = slot.get(k)
+            if s is None:
+                row[k] = v
+            else:
+                setattr(row, s, v)
+        return row
+
+    def rows(self, records: List[dict]) -> List[Row]:
+        return [ self.make(rec) if type(rec) is dict else rec for rec in records ]
+
+    def compact(self, data: list):
+        """ replace dict records in data with compact ones (one by one, old record is freed) """
+        make = self.make
+        # many new containers trigger useless garbage collections
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for pos, rec in enumerate(data):
+                if type(rec) is dict:
+                    data[pos] = make(rec)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+
+def plain(data: list) -> list:
+    """ records as dicts (e.g. for marshal) """
+    return [ dict(rec) if isinstance(rec, Row) else rec for rec in data ]
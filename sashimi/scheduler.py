@@ -0,0 +1,100 @@
+"""
+    Periodic background jobs (database sync, URL refresh) and one-time
+    background tasks (warming of named searches).
+
+    Jobs are run by small thread pool, job is never run again before previous
+    run is finished. Jobs are bound methods, referenced weakly: job of dataset
+    which is removed (or replaced by reload) is cancelled automatically.
+"""
+
+import time
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+TICK = 1
+WORKERS = 4
+
+_jobs = set()
+_jobs_lock = threading.Lock()
+_worker: threading.Thread = None
+_executor: ThreadPoolExecutor = None
+
+
+class Job():
+
+    def __init__(self, method: Callable, interval: float, name: str = None, delay: float = None):
+        """ interval None: run once """
+        self.method = weakref.WeakMethod(method)
+        self.interval = interval
+        self.name = name or method.__qualname__
+        self.next_run = time.time() + (interval if delay is None else delay)
+        self.running = False
+        self.cancelled = False
+        self.last_error = None
+
+    def due(self, now: float) -> bool:
+        return not self.running and now >= self.next_run
+
+    def run(self):
+        try:
+            method = self.method()
+            if method is None:
+                cancel(self)
+                return
+            method()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"!! job {self.name!r} failed: {e}")
+        finally:
+            if self.interval is None:
+                cancel(self)
+            else:
+                self.next_run = time.time() + self.interval
+            self.running = False
+
+    def __repr__(self):
+        if self.interval is None:
+            return f"Job({self.name!r}, once)"
+        return f"Job({self.name!r}, every {self.interval}s)"
+
+
+def every(interval: float, method: Callable, name: str = None, delay: float = None) -> Job:
+    """ run method every interval seconds (first time after delay, default interval) """
+    return _add(Job(method, interval, name=name, delay=delay))
+
+
+def soon(method: Callable, name: str = None) -> Job:
+    """ run method once, in next tick """
+    return _add(Job(method, None, name=name, delay=0))
+
+
+def _add(job: Job) -> Job:
+    global _worker, _executor
+    with _jobs_lock:
+        _jobs.add(job)
+        if _worker is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='job')
+            _worker = threading.Thread(target=_work, name='scheduler', daemon=True)
+            _worker.start()
+    return job
+
+
+def cancel(job: Job):
+    job.cancelled = True
+    with _jobs_lock:
+        _jobs.discard(job)
+
+
+def _work():
+    while True:
+        time.sleep(TICK)
+        now = time.time()
+        with _jobs_lock:
+            due = [ job for job in _jobs if job.due(now) ]
+            for job in due:
+                job.running = True
+        for job in due:
+            _executor.submit(job.run)
@@ -0,0 +1,121 @@
+"""
+    JSON serialization of search results to bytes (orjson if installed).
+
+    Search results go to client as bytes made here, not through FastAPI
+    jsonable_encoder. Encoded dataset records are cached (RowCache) and spliced
+    into response as is.
+"""
+
+import json
+import decimal
+import datetime
+import threading
+from collections.abc import Mapping
+from typing import Callable, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    # values from databases (datetime, Decimal...)
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Mapping):
+        # compact records
+        return dict(obj)
+    return str(obj)
+
+
+def plain(record: dict) -> dict:
+    """ record with values of JSON types only (e.g. datetime from database as string) """
+    return { k: v if v is None or type(v) in (str, int, float, bool, list, dict) else _default(v) for k, v in record.items() }
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # e.g. int out of 64-bit range, json can do it
+            pass
+    return json.dumps(obj, ensure_ascii=False, default=_default).encode()
+
+
+def dumps_result(result: dict, encode_row: Optional[Callable] = None) -> bytes:
+    """
+        search result (dict with optional 'result' list) as JSON bytes.
+        records are encoded with encode_row (e.g. RowCache.encode) and spliced in
+    """
+    if 'result' not in result or encode_row is None:
+        return dumps(result)
+
+    summary = dumps({ k: v for k, v in result.items() if k != 'result' })
+    rows = b','.join(map(encode_row, result['result']))
+    # summary is '{...}', 'result' goes first
+    rest = b',' + summary[1:] if len(summary) > 2 else b'}'
+    return b'{"result":[' + rows + b']' + rest
+
+
+class RowCache():
+    """
+        encoded bytes of dataset records, by record identity. Cached entry keeps
+        reference to record, so id() is not reused while entry exists.
+        Entries must be discarded when record is changed in place.
+        New records are not cached when budget (max_bytes) is used.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        # id(record) -> (record, bytes)
+        self._rows = dict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, record) -> bytes:
+        cached = self._rows.get(id(record))
+        if cached is not None and cached[0] is record:
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        data = dumps(record)
+        if self.bytes + len(data) <= self.max_bytes:
+            with self._lock:
+                old = self._rows.get(id(record))
+                if old is not None:
+                    self.bytes -= len(old[1])
+                self._rows[id(record)] = (record, data)
+                self.bytes += len(data)
+        return data
+
+    def discard(self, record):
+        with self._lock:
+            cached = self._rows.pop(id(record), None)
+            if cached is not None:
+                self.bytes -= len(cached[1])
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            'entries': len(self._rows),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hit_ratio': round(self.hits / requests, 3) if requests else None
+        }
+
+    def __len__(self):
+        return len(self._rows)
@@ -0,0 +1,141 @@
+"""
+    Several server processes on one host (``shared: true`` in global config,
+    e.g. ``uvicorn sashimiapp:app --workers 4``).
+
+    Every process keeps its own dataset objects (Python objects can not be
+    shared): all records, indexes and columns are loaded in each process, so
+    memory for datasets is multiplied by number of processes. What is on
+    disk is shared:
+
+        NAME.snap   dataset is parsed once: first process loads JSON and writes
+                    snapshot (under lock), others load snapshot (memory-mapped
+                    while it's read, records are unmarshalled into memory of
+                    each process)
+        NAME.wal    mutation log is broadcast log. Mutation is done under lock
+                    of NAME.lock: process applies entries appended by others
+                    first, then makes its own change and appends it. All
+                    processes apply same mutations in same order, others pick
+                    them up before search (and every second) as new version.
+                    When file is replaced (upload, URL refresh, compaction),
+                    log is replaced with new one. After compaction its header
+                    has "prev" (base of old log): others apply rest of old log
+                    and continue with new one. Without "prev" old log is
+                    stale, file is loaded again (wal.py reset() and follow())
+        .sashimi.changed
+                    in project directory, appended when dataset is added or
+                    removed or config is changed. Others check it (stat) when
+                    project is used and rescan project directory
+
+    Background jobs which change data (URL refresh, database sync, log
+    compaction) run only in leader process, the one which holds lock of
+    .sashimi.lock in projects directory. If it exits, other one takes over.
+
+    Locks are flock(2), Linux/Unix only.
+"""
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+enabled = False
+
+# in project directory, appended to when datasets or configs are changed
+MARKER = '.sashimi.changed'
+
+_leader_path: str = None
+_leader_fh = None
+_leader_lock = threading.Lock()
+
+
+class SharedError(Exception):
+    pass
+
+
+def configure(projects_path: str):
+    """ enable shared mode for projects in this directory """
+    global enabled, _leader_path
+    if fcntl is None:
+        raise SharedError('shared mode needs flock(), not available on this system')
+    enabled = True
+    _leader_path = os.path.join(projects_path, '.sashimi.lock')
+
+
+def lock_path(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + '.lock'
+
+
+def marker_path(project_path: str) -> str:
+    return os.path.join(project_path, MARKER)
+
+
+def changed(project_path: str):
+    """ datasets of project are added/removed or configs are changed, others check it """
+    if not enabled:
+        return
+    # one byte more: size is changed even if mtime is not (coarse timestamps)
+    with open(marker_path(project_path), 'ab') as fh:
+        fh.write(b'.')
+
+
+class FileLock():
+    """
+        lock for threads of this process and for other processes (flock).
+        Re-entrant: same thread can take it again (flock of second file
+        descriptor would wait for first one forever)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fh = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                self._fh = open(self.path, 'a')
+                fcntl.flock(self._fh, fcntl.LOCK_EX)
+            except Exception:
+                if self._fh is not None:
+                    self._fh.close()
+                    self._fh = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            # closing file releases lock
+            self._fh.close()
+            self._fh = None
+        self._lock.release()
+
+
+def is_leader() -> bool:
+    """ True if this process runs background jobs (always True if not shared) """
+    global _leader_fh
+    if not enabled:
+        return True
+
+    with _leader_lock:
+        if _leader_fh is not None:
+            return True
+
+        fh = open(_leader_path, 'a')
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            fh.close()
+            return False
+
+        _leader_fh = fh
+        print(f".. process {os.getpid()} is leader, runs background jobs")
+        return True
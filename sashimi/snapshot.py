@@ -0,0 +1,130 @@
+"""
+    Binary snapshot of dataset, ``NAME.snap`` next to ``NAME.json``.
+
+    Loading snapshot is much faster than parsing JSON. Snapshot is valid only
+    for JSON file it was made from (same size and mtime), otherwise it's
+    ignored and dataset is loaded from JSON (and new snapshot is written).
+
+    Snapshot made by other Python version (marshal format is specific to it)
+    is ignored too.
+
+    File layout (little-endian):
+        header: magic, format version, flags, marshal version, Python
+                version (major, minor), JSON size, JSON mtime (ns), number of
+                records, payload length, payload crc32
+        payload: marshal of list of records (shared objects, like same keys,
+                 are stored once)
+"""
+
+import os
+import sys
+import gc
+import mmap
+import zlib
+import struct
+import marshal
+from typing import Optional
+
+MAGIC = b'SASHSNAP'
+FORMAT_VERSION = 2
+# snapshot can be read only by same marshal and Python version
+PYTHON = (marshal.version, *sys.version_info[:2])
+
+# magic, version, flags, marshal version, python major, minor, json size, json mtime_ns, records, payload length, crc32
+_header = struct.Struct('<8sHHBBBxQqQQI')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def snapshot_path(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + '.snap'
+
+
+def _source_stat(json_path: str):
+    st = os.stat(json_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def write(json_path: str, data: list):
+    """ write snapshot of data loaded from json_path """
+    try:
+        payload = marshal.dumps(data)
+    except ValueError as e:
+        # not only JSON types (e.g. datetime from database)
+        raise SnapshotError(f'Can not make snapshot: {e}')
+
+    size, mtime_ns = _source_stat(json_path)
+    header = _header.pack(MAGIC, FORMAT_VERSION, 0, *PYTHON, size, mtime_ns, len(data), len(payload), zlib.crc32(payload))
+
+    path = snapshot_path(json_path)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write(header)
+        fh.write(payload)
+    os.replace(tmp_path, path)
+
+
+def read(json_path: str) -> Optional[list]:
+    """ records from snapshot or None if there is no valid snapshot """
+    path = snapshot_path(json_path)
+    try:
+        fh = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    with fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            return None
+
+        with mm:
+            if len(mm) < _header.size:
+                return None
+
+            magic, version, _, *python, size, mtime_ns, records, length, crc = _header.unpack_from(mm)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                return None
+
+            if tuple(python) != PYTHON:
+                # made by other Python, load JSON
+                return None
+
+            try:
+                if (size, mtime_ns) != _source_stat(json_path):
+                    # stale, JSON is changed
+                    return None
+            except FileNotFoundError:
+                pass
+
+            payload = memoryview(mm)[_header.size:_header.size + length]
+            try:
+                if len(payload) != length or zlib.crc32(payload) != crc:
+                    raise SnapshotError(f'Snapshot {path!r} is corrupted (checksum mismatch)')
+                # many new containers trigger useless garbage collections
+                gc_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    data = marshal.loads(payload)
+                finally:
+                    if gc_enabled:
+                        gc.enable()
+            except (ValueError, EOFError, TypeError) as e:
+                raise SnapshotError(f'Snapshot {path!r} is corrupted: {e}')
+            finally:
+                payload.release()
+
+    if not isinstance(data, list) or len(data) != records:
+        raise SnapshotError(f'Snapshot {path!r} is corrupted')
+
+    return data
+
+
+def remove(json_path: str):
+    try:
+        os.unlink(snapshot_path(json_path))
+    except FileNotFoundError:
+        pass
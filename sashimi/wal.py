@@ -0,0 +1,267 @@
+"""
+    Append-only log of dataset mutations (``NAME.wal`` next to ``NAME.json``).
+
+    First line is header with size and mtime of JSON file log is made for,
+    each next line is one mutation (NDJSON):
+
+        {"op": "insert", "record": {...}}
+        {"op": "insert", "records": [{...}, ...]}
+        {"op": "update", "expr": "...", "update": {...}}
+        {"op": "delete", "expr": "..."}
+        {"op": "merge", "key": "id", "records": [{...}, ...], "deleted": [KEY, ...]}
+
+    Log is replayed after dataset is loaded from JSON (or snapshot). Compaction
+    writes dataset to new JSON file and starts new empty log for it. If process
+    crashes between these steps, old log does not match new JSON and is ignored
+    (new JSON already has all changes from it).
+
+    With several server processes (see shared.py) log is also read by follow():
+    entries appended by other processes are applied. Header of log started by
+    compaction has base of previous log ("prev"): processes which applied all
+    of previous log continue with new one, if log was started for other reason
+    (file replaced), dataset is loaded again.
+
+    fsync policy (``wal_fsync``): always (after each record), batch (by
+    background thread, once a second) or never.
+"""
+
+import os
+import json
+import time
+import threading
+import weakref
+from typing import Iterator, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .dataset import Dataset
+
+FSYNC_POLICIES = ('always', 'batch', 'never')
+
+# datasets with logs, background thread syncs and compacts them
+_datasets = weakref.WeakSet()
+_worker: threading.Thread = None
+_worker_lock = threading.Lock()
+
+TICK = 1
+
+
+class WALError(Exception):
+    pass
+
+
+def wal_path(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + '.wal'
+
+
+def _base(json_path: str) -> list:
+    st = os.stat(json_path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class MutationLog():
+
+    def __init__(self, json_path: str, fsync: str = 'batch'):
+        if fsync not in FSYNC_POLICIES:
+            raise WALError(f"wal_fsync must be one of {'/'.join(FSYNC_POLICIES)}, not {fsync!r}")
+
+        self.json_path = os.fspath(json_path)
+        self.path = wal_path(self.json_path)
+        self.fsync_policy = fsync
+        self._fh = None
+        self.dirty = False
+        # number of mutations in log, and time of first one
+        self.records = 0
+        self.since = None
+        # end of last complete record, if log has partial record at the end
+        self._truncate = None
+        # log exists and is made for current JSON
+        self._valid = False
+        # base of log and end of last record which is applied to dataset
+        self.base = None
+        self._pos = 0
+        self._ino = None
+        # follow(): log was replaced by compaction and new one is followed,
+        # or replaced for other reason (dataset must be loaded again)
+        self.switched = False
+        self.stale = False
+
+    @property
+    def size(self) -> int:
+        return self._pos if self._fh else 0
+
+    def entries(self) -> Iterator[dict]:
+        """ mutations to replay, empty if there is no log or it is not for current JSON """
+        try:
+            fh = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+
+        with fh:
+            try:
+                header = json.loads(fh.readline())
+            except ValueError:
+                print(f"!! bad header in {self.path!r}, log ignored")
+                return
+
+            if header.get('base') != _base(self.json_path):
+                # JSON was rewritten (compaction or upload) after this log
+                return
+            self._valid = True
+            self.base = header['base']
+
+            offset = fh.tell()
+            for line in fh:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('no newline')
+                    entry = json.loads(line)
+                except ValueError:
+                    # last line could be written partially before crash
+                    print(f"!! truncated record in {self.path!r}, rest of log ignored")
+                    self._truncate = offset
+                    return
+                offset += len(line)
+                self.records += 1
+                yield entry
+
+    def open(self):
+        """ continue existing log (after replay) or start new """
+        if self._valid and os.path.exists(self.path):
+            if self._truncate is not None:
+                os.truncate(self.path, self._truncate)
+                self._truncate = None
+            self._open()
+            if self.records:
+                self.since = time.time()
+        else:
+            self.reset()
+
+    def _open(self):
+        # readable too: follow() reads entries of other processes
+        self._fh = open(self.path, 'a+b')
+        st = os.fstat(self._fh.fileno())
+        self._pos, self._ino = st.st_size, st.st_ino
+
+    def reset(self, compacted: bool = False):
+        """ start new empty log for current JSON file """
+        self.close()
+        header = dict(wal=1, base=_base(self.json_path))
+        if compacted:
+            # JSON has everything from previous log
+            header['prev'] = self.base
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as fh:
+            fh.write(json.dumps(header).encode() + b'\n')
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.path)
+        self._open()
+        self.base = header['base']
+        self.records = 0
+        self.since = None
+        self.dirty = False
+
+    def append(self, entry: dict):
+        self._fh.write(json.dumps(entry, ensure_ascii=False).encode() + b'\n')
+        self._fh.flush()
+        # all before it is applied (other processes append under same lock)
+        self._pos = self._fh.tell()
+        self.records += 1
+        if self.since is None:
+            self.since = time.time()
+
+        if self.fsync_policy == 'always':
+            os.fsync(self._fh.fileno())
+        elif self.fsync_policy == 'batch':
+            self.dirty = True
+
+    def behind(self) -> bool:
+        """ other process appended to log or replaced it """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return st.st_size != self._pos or st.st_ino != self._ino
+
+    def follow(self) -> Iterator[dict]:
+        """
+            entries appended by other processes since last read (call it under
+            lock of dataset files). Log replaced by compaction is followed further
+        """
+        while self._fh:
+            fd = self._fh.fileno()
+            size = os.fstat(fd).st_size
+            if size > self._pos:
+                for line in os.pread(fd, size - self._pos, self._pos).splitlines(keepends=True):
+                    if not line.endswith(b'\n'):
+                        break
+                    self._pos += len(line)
+                    self.records += 1
+                    if self.since is None:
+                        self.since = time.time()
+                    yield json.loads(line)
+
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return
+            if st.st_ino == self._ino:
+                return
+
+            with open(self.path, 'rb') as fh:
+                line = fh.readline()
+            header = json.loads(line)
+            if header.get('prev') is None or header.get('prev') != self.base:
+                self.stale = True
+                return
+
+            # compacted by other process, its JSON is what we have now
+            self.close()
+            self._open()
+            self._pos = len(line)
+            self.base = header['base']
+            self.records = 0
+            self.since = None
+            self.switched = True
+
+    def sync(self):
+        if self.dirty and self._fh:
+            self.dirty = False
+            os.fsync(self._fh.fileno())
+
+    def close(self):
+        if self._fh:
+            self.sync()
+            self._fh.close()
+            self._fh = None
+
+    def remove(self):
+        self.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def register(ds: "Dataset"):
+    """ sync and compact log of dataset in background """
+    global _worker
+    _datasets.add(ds)
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_work, name='wal', daemon=True)
+            _worker.start()
+
+
+def unregister(ds: "Dataset"):
+    _datasets.discard(ds)
+
+
+def _work():
+    while True:
+        time.sleep(TICK)
+        for ds in list(_datasets):
+            try:
+                ds.wal_tick()
+            except Exception as e:
+                print(f"!! wal error in ds {ds.name!r}: {e}")
@@ -0,0 +1,207 @@
+"""
+    Hot reload of project directories (``watch:`` in global config).
+
+    Changed files are noticed with inotify (Linux) or by polling modification
+    times. Only what is changed is reloaded:
+
+        __project.yml   project config (and configs of its datasets, which inherit it)
+        _NAME.yaml      config of dataset NAME
+        NAME.json       data of dataset NAME (new file: new dataset, removed: dataset removed)
+
+    Files written by server itself (upload, compaction, URL refresh) are not
+    reloaded: dataset remembers size and mtime of files it has read or written.
+"""
+
+import os
+import time
+import struct
+import select
+import threading
+import ctypes
+import ctypes.util
+from typing import Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .project import Project, Projects
+
+MODES = ('inotify', 'poll')
+INTERVAL = 2
+# polling: file must be unchanged this long (could be written right now)
+SETTLE = 1
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+_event = struct.Struct('iIII')
+
+_watcher: "Watcher" = None
+
+
+def file_stat(path: str) -> Optional[Tuple[int, int]]:
+    """ (size, mtime_ns) or None if there is no such file """
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, TypeError):
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def watched(name: str) -> bool:
+    """ file is project/dataset config or dataset (not temporary, snapshot or log) """
+    return name.endswith(('.json', '.yaml', '.yml'))
+
+
+class Inotify():
+
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE
+
+    def __init__(self):
+        libname = ctypes.util.find_library('c')
+        try:
+            self._libc = ctypes.CDLL(libname, use_errno=True)
+            init = self._libc.inotify_init1
+        except (OSError, AttributeError):
+            raise OSError('inotify is not available')
+
+        self.fd = init(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = dict()
+
+    def add(self, path: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), self.mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'can not watch {path!r}')
+        self.watches[wd] = path
+
+    def read(self, timeout: float) -> list:
+        """ (directory, filename) of events, empty list after timeout """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+
+        buf = os.read(self.fd, 65536)
+        events = list()
+        pos = 0
+        while pos < len(buf):
+            wd, mask, cookie, length = _event.unpack_from(buf, pos)
+            pos += _event.size
+            name = buf[pos:pos + length].rstrip(b'\0').decode(errors='replace')
+            pos += length
+            if wd in self.watches and name:
+                events.append((self.watches[wd], name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Watcher():
+
+    def __init__(self, projects: "Projects", mode: str = None, interval: float = INTERVAL):
+        self.projects = projects
+        self.interval = interval
+        self.mode = mode
+        self._inotify = None
+
+        if mode in (None, 'inotify'):
+            try:
+                self._inotify = Inotify()
+                self.mode = 'inotify'
+            except OSError as e:
+                if mode == 'inotify':
+                    raise
+                print(f"!! {e}, watch by polling")
+                self.mode = 'poll'
+
+    def start(self):
+        threading.Thread(target=self._run, name='watcher', daemon=True).start()
+        print(f".. watching project directories ({self.mode})")
+
+    def _run(self):
+        while True:
+            try:
+                if self._inotify:
+                    self._wait_events()
+                else:
+                    time.sleep(self.interval)
+                    for project in list(self.projects):
+                        self.check(project, settle=SETTLE)
+            except Exception as e:
+                print(f"!! watcher error: {e}")
+                time.sleep(self.interval)
+
+    def _wait_events(self):
+        # projects created after start
+        watched_dirs = set(self._inotify.watches.values())
+        for project in list(self.projects):
+            if project.path not in watched_dirs:
+                self._inotify.add(project.path)
+
+        changed = { directory for directory, name in self._inotify.read(self.interval) if watched(name) }
+        for project in list(self.projects):
+            if project.path in changed:
+                self.check(project)
+
+    def check(self, project: "Project", settle: float = 0):
+        check_project(project, settle=settle)
+
+
+def check_project(project: "Project", settle: float = 0, reload: bool = True):
+    """
+        reload changed configs and datasets of project. reload=False: changed
+        dataset files are not reloaded (shared mode: mutation log tells
+        about them, see shared.py), only added and removed ones
+    """
+    now = time.time()
+
+    def settled(stat) -> bool:
+        return stat is None or now - stat[1] / 1e9 >= settle
+
+    stat = file_stat(project.get_config_path())
+    if stat != project._config_stat and settled(stat):
+        print(f".. project {project.name!r} config changed, reload")
+        project.reload_config()
+
+    for name, ds in list(project._d.items()):
+        stat = file_stat(ds.get_config_path())
+        if stat != ds._config_stat and settled(stat):
+            print(f".. ds {project.name}/{name} config changed, reload")
+            ds.read_config()
+
+        stat = file_stat(ds.get_dataset_path())
+        if stat is None and (ds._file_stat is not None or ds.path):
+            # (dataset from file which is not loaded yet has no stat)
+            print(f".. ds {project.name}/{name} file removed, remove dataset")
+            project.remove_dataset(name)
+            continue
+
+        if stat == ds._file_stat or not settled(stat):
+            continue
+
+        if reload:
+            print(f".. ds {project.name}/{name} file changed, reload")
+            try:
+                ds.reload_file()
+            except Exception as e:
+                print(f"!! can not reload ds {project.name}/{name}: {e}")
+
+    # new datasets
+    for de in os.scandir(project.path):
+        name, ext = os.path.splitext(de.name)
+        if ext == '.json' and not de.name.startswith('_') and name not in project \
+                and settled(file_stat(de.path)):
+            print(f".. new ds {project.name}/{name}")
+            project.add_dataset(name, de.path)
+
+
+def start(projects: "Projects", mode: str = None, interval: float = INTERVAL) -> Watcher:
+    global _watcher
+    if mode not in (None, *MODES):
+        raise ValueError(f"watch must be one of {'/'.join(MODES)} or true, not {mode!r}")
+    _watcher = Watcher(projects, mode=mode, interval=interval)
+    _watcher.start()
+    return _watcher
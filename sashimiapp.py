@@ -29,6 +29,9 @@ from evalidate import Expr, EvalException, base_eval_model, EvalModel
 from sashimi.dataset import Dataset
 from sashimi.project import projects
 from sashimi.config import Config
+from sashimi.exprcache import expr_cache
+from sashimi import watcher
+from sashimi import shared
 from sashimi.api.query import router as index_router
 from sashimi.api.project import router as project_router
 
@@ -95,10 +98,18 @@ def init():
     print(config)
 
     model = get_evalidate_model(config)
+    expr_cache.resize(config.get('expr_cache_size', 1024))
     projects.config = config
+    if config.get('shared') and 'projects' in config:
+        # several server processes (uvicorn --workers N)
+        shared.configure(config['projects'])
     if 'projects' in config:
         projects.read(config['projects'], model=model)
 
+        watch = config.get('watch', False)
+        if watch:
+            watcher.start(projects, mode=None if watch is True else watch, interval=config.get('watch_interval', 2))
+
     print("End of main")
 
     # print(json.dumps(config, indent=4))
@@ -0,0 +1,107 @@
+import json
+import copy
+from types import SimpleNamespace
+
+import pytest
+from evalidate import base_eval_model
+
+from sashimi.config import Config
+from sashimi.dataset import Dataset
+
+
+with open('tests/products.json') as fh:
+    _products = json.load(fh)['products']
+
+model = base_eval_model.clone()
+model.nodes.extend(['Call', 'Attribute', 'Mult', 'List'])
+model.attributes.extend(['startswith', 'upper', 'lower'])
+
+
+@pytest.fixture
+def clean_products():
+    """ 100 products, all with same fields """
+    return copy.deepcopy(_products)
+
+
+@pytest.fixture
+def products():
+    """ products with some missing and None values """
+    data = copy.deepcopy(_products)
+    data[3]['brand'] = None
+    del data[5]['price']
+    data[7]['rating'] = None
+    data.append({'id': 1000, 'title': 'no price'})
+    return data
+
+
+@pytest.fixture
+def make_ds(tmp_path):
+    """ make_ds(config, data) creates dataset 'products' with given dataset config (yaml) """
+    n = 0
+
+    def make(config: str, data: list, name='products'):
+        nonlocal n
+        n += 1
+        pdir = tmp_path / f'project{n}'
+        pdir.mkdir()
+        (pdir / f'_{name}.yaml').write_text(config)
+        project = SimpleNamespace(path=str(pdir), config=Config(role="project"))
+        ds = Dataset(name=name, project=project, model=model)
+        ds.set_dataset(copy.deepcopy(data))
+        return ds
+
+    return make
+
+
+@pytest.fixture
+def load_ds():
+    """ load_ds(path, config) loads dataset from JSON file path (pathlib) as project does """
+    def load(path, config=''):
+        name = path.stem
+        (path.parent / f'_{name}.yaml').write_text(config)
+        project = SimpleNamespace(path=str(path.parent), config=Config(role="project"))
+        return Dataset(name=name, project=project, model=model, path=str(path))
+
+    return load
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """
+        api(project_config, datasets) starts server (TestClient) with project 'p'
+        in tmp_path, datasets is dict name: records. Token is 'tok'
+    """
+    pytest.importorskip('httpx')
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sashimi.api.query import router as index_router
+    from sashimi.api.project import router as project_router
+    from sashimi.project import projects
+
+    clients = list()
+
+    def make(config: str = '', datasets: dict = None):
+        pdir = tmp_path / 'projects' / 'p'
+        pdir.mkdir(parents=True)
+        (pdir / '__project.yml').write_text('tokens: [tok]\n' + config)
+        for name, data in (datasets or {}).items():
+            (pdir / f'{name}.json').write_text(json.dumps(data))
+
+        monkeypatch.setattr(projects, 'projects', dict())
+        monkeypatch.setattr(projects, 'app_config', Config(role='master'))
+        monkeypatch.setattr(projects, 'path', None)
+        monkeypatch.setattr(projects, 'model', model, raising=False)
+        projects.read(str(tmp_path / 'projects'), model=model)
+
+        app = FastAPI()
+        app.include_router(index_router)
+        app.include_router(prefix='/ds', router=project_router)
+        client = TestClient(app, headers={'Authorization': 'Bearer tok'}, client=('127.0.0.1', 50000))
+        # one event loop for all requests (as in server)
+        client.__enter__()
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.__exit__(None, None, None)
@@ -0,0 +1,58 @@
+import io
+import json
+
+from sashimi.api.params import SearchQuery
+
+config = 'limit: 1000\nindexes:\n  brand: hash\n  price: sorted\n'
+
+
+def test_ndjson(make_ds, products):
+    ds = make_ds(config, products)
+    lines = [ json.dumps({'id': 2000 + i, 'brand': 'Bulk', 'price': i}) for i in range(50) ]
+    lines[10] = '{"id": 2010, "brand": '
+    lines[20] = '[1, 2]'
+    lines.insert(30, '')
+
+    r = ds.bulk_insert(io.BytesIO('\n'.join(lines).encode()), batch_size=7)
+    assert r['inserted'] == 48
+    assert r['new_size'] == len(products) + 48
+    assert [ e['line'] for e in r['errors'] ] == [11, 21]
+
+    # indexes are updated
+    assert ds.search(SearchQuery(expr='brand == "Bulk"'))['matches'] == 48
+    r = ds.search(SearchQuery(expr='price < 5', sort='price'))
+    assert [ x['price'] for x in r['result'] ] == sorted(x['price'] for x in ds._data if x.get('price', 10) < 5)
+
+
+def test_json_list(make_ds, products):
+    ds = make_ds(config, products)
+    data = [ {'id': 2000 + i, 'brand': 'Bulk'} for i in range(20) ] + ['x']
+    r = ds.bulk_insert(io.BytesIO(json.dumps(data).encode()))
+    assert r['inserted'] == 20
+    assert r['errors'] == [{'line': 21, 'error': 'record must be JSON object, not str'}]
+
+    r = ds.bulk_insert(io.BytesIO(b'[{"id": 1}, {"id": '))
+    assert r['inserted'] == 1
+    assert r['errors'][0]['line'] is None
+
+
+def test_wal(load_ds, tmp_path, products):
+    path = tmp_path / 'products.json'
+    path.write_text(json.dumps(products))
+    ds = load_ds(path, config)
+    ds.bulk_insert(io.BytesIO(b'{"id": 2000}\n{"id": 2001}\n'))
+    assert ds.wal.records == 1
+    assert load_ds(path, config)._data == ds._data
+
+
+def test_api(api, products):
+    client = api(config, dict(one=products))
+    body = '{"id": 2000}\n{"id": \n\n{"id": 2001}\n"x"\n'
+    r = client.post('/ds/p/one/_bulk?batch=1', content=body)
+    assert r.status_code == 200, r.text
+    r = r.json()
+    assert (r['inserted'], r['rejected'], r['new_size']) == (2, 2, len(products) + 2)
+    assert [ e['line'] for e in r['errors'] ] == [2, 5]
+
+    assert client.post('/ds/p/one/_bulk?batch=0', content=body).status_code == 400
+    assert client.post('/ds/p/one/_bulk', content=body, headers={'Authorization': 'Bearer bad'}).status_code == 401
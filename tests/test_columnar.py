@@ -0,0 +1,102 @@
+import pytest
+
+from sashimi.api.params import SearchQuery
+
+pytest.importorskip('numpy')
+
+config_rows = 'storage: rows\nlimit: 1000\n'
+config_columnar = 'storage: columnar\nlimit: 1000\n'
+
+
+expressions = [
+    'True',
+    'price > 20',
+    'price>50 and price <= 500',
+    '10 < price < 100',
+    'brand == "Apple" or brand == "Samsung"',
+    'not brand == "Apple"',
+    'brand != "Apple" and category in ["laptops", "smartphones"]',
+    'category not in ["laptops"]',
+    'id in [1, 2, 3, 1000]',
+    'price * 2 > 1000',
+    'price - discountPercentage > 100 and rating >= 4.5',
+    'price / (stock - 94) > 10',
+    'price % 3 == 0',
+    '-price < -1000',
+    'brand is None',
+    'rating is not None and rating > 4.9',
+    'brand > "M"',
+    'price > "x"',
+    'price == "x"',
+    'stock',
+    'SomethingWrong',
+    'nosuchfield == 1 or price < 15',
+    'id == 6',
+    # not vectorizable, row-by-row fallback
+    'title.startswith("i")',
+    '"laptops" in category',
+]
+
+
+@pytest.mark.parametrize('expr', expressions)
+def test_search_same_as_rows(make_ds, products, expr):
+    rows = make_ds(config_rows, products)
+    cols = make_ds(config_columnar, products)
+    assert cols._columns is not None
+
+    sq = SearchQuery(expr=expr, sort='id', aggregate=['sum:id'])
+    assert cols.search(sq) == rows.search(sq)
+
+
+# int64/float64 arithmetic is not python arithmetic, these fall back to rows
+big = [ dict(id=1, a=2**62, b=2**53 + 1), dict(id=2, a=1, b=1), dict(id=3, a=-2**62, b=None) ]
+big_expressions = [
+    'a * 4 > 0',
+    'a + a > 0',
+    'a - a == 0',
+    '-a - a < 0',
+    'a * 10000000000000000000000 > 0',
+    'a == 10000000000000000000000',
+    'b > 9007199254740992.0',
+    'b == 9007199254740992.0',
+    'b / 3 == 3002399751580331',
+    'b + 0.0 > b - 1',
+]
+
+
+@pytest.mark.parametrize('expr', big_expressions)
+def test_big_int_same_as_rows(make_ds, expr):
+    rows = make_ds(config_rows, big)
+    cols = make_ds(config_columnar, big)
+    assert cols._columns.columns['a'].kind == 'int'
+
+    sq = SearchQuery(expr=expr, sort='id')
+    assert cols.search(sq) == rows.search(sq)
+
+
+def test_update_delete_insert(make_ds, products):
+    rows = make_ds(config_rows, products)
+    cols = make_ds(config_columnar, products)
+
+    for ds in (rows, cols):
+        ds.update(SearchQuery(expr='brand == "Apple"', update={'price': 1.5, 'onstock': False}))
+        ds.update(SearchQuery(expr='id < 5', update={'brand': 'Apple'}))
+        ds.insert({'id': 2000, 'brand': 'Apple', 'price': 10})
+        ds.delete(SearchQuery(expr='category == "laptops"'))
+
+    for expr in ['brand == "Apple"', 'price < 2', 'onstock == False', 'id >= 2000']:
+        sq = SearchQuery(expr=expr)
+        assert cols.search(sq) == rows.search(sq)
+
+    assert len(cols) == len(rows)
+
+
+def test_delete_exception(make_ds, products):
+    rows = make_ds(config_rows, products)
+    cols = make_ds(config_columnar, products)
+
+    sq = SearchQuery(expr='price > 100')
+    r = cols.delete(sq)
+    assert r == rows.delete(sq)
+    assert r['exceptions'] == 1
+    assert r['new_size'] == r['old_size']
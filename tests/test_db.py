@@ -0,0 +1,72 @@
+import json
+import sqlite3
+
+import pytest
+import sqlalchemy as sa
+
+from sashimi import db
+
+
+@pytest.fixture
+def dburl(tmp_path):
+    path = tmp_path / 'shop.sqlite'
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE products (id INTEGER PRIMARY KEY, title TEXT, price REAL)')
+    conn.executemany('INSERT INTO products VALUES (?, ?, ?)', [ (n, f'product {n}', n * 1.5) for n in range(1, 2501) ])
+    conn.commit()
+    conn.close()
+    return f'sqlite:///{path}'
+
+
+def test_engine_shared(dburl):
+    assert db.get_engine(dburl) is db.get_engine(dburl)
+    assert db.get_engine(dburl, {'size': 2}) is db.get_engine(dburl, {'size': 2})
+    assert db.get_engine(dburl, {'size': 2}) is not db.get_engine(dburl)
+
+
+def test_bad_pool(dburl):
+    with pytest.raises(db.DBConfigError):
+        db.get_engine(dburl, {'poolsize': 2})
+
+
+@pytest.mark.parametrize('batch_size', [1, 100, 10000])
+def test_iter_rows(dburl, batch_size):
+    rows = list(db.iter_rows(db.get_engine(dburl), 'SELECT * FROM products WHERE price > :p ORDER BY id', dict(p=3), batch_size=batch_size))
+    assert len(rows) == 2498
+    assert rows[0] == {'id': 3, 'title': 'product 3', 'price': 4.5}
+
+
+def test_load_db(load_ds, dburl, tmp_path):
+    path = tmp_path / 'products.json'
+    path.write_text('[{"id": 1, "price": 0}]')
+    ds = load_ds(path, f'db: {dburl}\nsql: SELECT id, price FROM products\ndb_batch: 100\n')
+    assert ds.status == 'OK'
+    assert len(ds) == ds.load_stats['records'] == 2500
+    assert ds._data[-1] == {'id': 2500, 'price': 3750.0}
+
+    # local file is replaced, changes go to mutation log of new one
+    ds.insert({'id': 2501, 'price': 1.0})
+    ds.wal.sync()
+    again = load_ds(path, f'db: {dburl}\nsql: SELECT id, price FROM products\nsnapshot: false\n')
+    assert len(again) == 2500
+    assert json.loads(path.read_text())[0] == {'id': 1, 'price': 1.5}
+
+
+def test_load_db_error(load_ds, tmp_path):
+    path = tmp_path / 'products.json'
+    path.write_text('[]')
+    with pytest.raises(sa.exc.OperationalError):
+        load_ds(path, f'db: sqlite:///{tmp_path}/nothere.sqlite\nsql: SELECT * FROM products\n')
+
+
+def test_initial_load(make_ds, dburl):
+    # first sync loads whole table
+    sync = 'sync:\n  key: id\n  watermark: id\n  interval: 3600\n'
+    ds = make_ds(f'db: {dburl}\nsql: SELECT id, price FROM products\ndb_batch: 100\ndb_pool:\n  size: 2\n  recycle: 60\n' + sync, [])
+    stats = ds.sync_db()
+    assert stats['fetched'] == stats['inserted'] == len(ds) == 2500
+    assert ds._data[-1] == {'id': 2500, 'price': 3750.0}
+
+    engine = db.get_engine(dburl, {'size': 2, 'recycle': 60})
+    assert engine.pool.size() == 2
+    assert engine.pool.checkedout() == 0
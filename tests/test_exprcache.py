@@ -0,0 +1,41 @@
+import pytest
+from evalidate import base_eval_model, EvalException
+
+from sashimi.exprcache import ExprCache
+
+
+def test_lru():
+    cache = ExprCache(size=2)
+    model = base_eval_model.clone()
+
+    e = cache.get('price > 1', model)
+    assert cache.get('price > 1', model) is e
+    assert cache.stats()['hits'] == 1
+
+    # other model, other entry
+    assert cache.get('price > 1', base_eval_model) is not e
+
+    cache.get('price > 2', model)
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['misses'] == 3
+    assert len(cache) == 2
+
+
+def test_invalidate():
+    cache = ExprCache()
+    model = base_eval_model.clone()
+    cache.get('True', model)
+    cache.get('True', base_eval_model)
+
+    cache.invalidate(model)
+    assert len(cache) == 1
+
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_invalid_not_cached():
+    cache = ExprCache()
+    with pytest.raises(EvalException):
+        cache.get('__import__("os")', base_eval_model)
+    assert len(cache) == 0
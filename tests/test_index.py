@@ -0,0 +1,123 @@
+import pytest
+
+from sashimi.api.params import SearchQuery
+from sashimi.api.utils import make_expr
+
+config_noindex = 'limit: 1000\n'
+config_hash = '''
+limit: 1000
+indexes:
+  - brand
+  - category
+  - id
+'''
+
+filters = [
+    {'brand': 'Apple'},
+    {'category': 'laptops', 'brand': 'Samsung'},
+    {'category': ['smartphones', 'laptops'], 'price__lt': 1000},
+    {'brand': None},
+    {'id': 1000},
+    {'id': 1.0},
+    {'brand': 'NoSuchBrand'},
+]
+
+
+def query(f, expr=None):
+    return SearchQuery(expr=make_expr(expr, f), aggregate=['sum:id'])
+
+
+@pytest.mark.parametrize('f', filters)
+def test_filter_same_as_scan(make_ds, products, f):
+    plain = make_ds(config_noindex, products)
+    indexed = make_ds(config_hash, products)
+
+    assert indexed._indexes.candidates(indexed.compile(query(f).expr).node) is not None
+    assert indexed.search(query(f)) == plain.search(query(f))
+
+    # index is not used if other conjunct goes first
+    assert indexed.search(query(f, expr='price > 10')) == plain.search(query(f, expr='price > 10'))
+
+
+def test_mutations(make_ds, products):
+    plain = make_ds(config_noindex, products)
+    indexed = make_ds(config_hash, products)
+
+    for ds in (plain, indexed):
+        ds.update(SearchQuery(expr='brand == "Apple"', update={'brand': 'Pear'}))
+        ds.update(SearchQuery(expr='id in [1, 2, 3]', update={'category': 'fruits'}))
+        ds.insert({'id': 2000, 'brand': 'Apple', 'category': 'fruits'})
+        ds.delete(SearchQuery(expr='category == "laptops"'))
+
+    for f in [{'brand': 'Apple'}, {'brand': 'Pear'}, {'category': 'fruits'}, {'category': 'laptops'}, {'id': 2000}]:
+        assert indexed.search(query(f)) == plain.search(query(f))
+
+    indexed.set_dataset(products[:10])
+    assert indexed.search(query({'brand': 'Apple'}))['matches'] == 3
+
+
+config_sorted = '''
+limit: 1000
+indexes:
+  brand: hash
+  price: sorted
+  title: sorted
+  rating: sorted
+'''
+
+sorted_queries = [
+    dict(filter={'price__lt': 100}),
+    dict(filter={'price__ge': 100, 'price__le': 500}, sort='price'),
+    dict(expr='10 < price < 50', sort='price', reverse=True, limit=5, offset=3),
+    dict(expr='True', sort='price', limit=1),
+    dict(expr='True', sort='price', reverse=True, limit=10, offset=10),
+    dict(expr='price > 50', sort='price', limit=10, offset=10),
+    dict(filter={'brand': 'Apple'}, sort='price', reverse=True),
+    dict(filter={'title__gt': 'M'}, sort='title', limit=3),
+    dict(expr='True', sort='title', fields=['title'], limit=3),
+    dict(expr='price > 100', sort='price', aggregate=['sum:price']),
+    dict(filter={'brand': 'Apple'}, sort='rating', limit=2),
+    # rating None in one record, price missing in other: sorted() as usual
+    dict(expr='True', sort='rating'),
+    dict(expr='id < 10', sort='price'),
+]
+
+
+@pytest.mark.parametrize('clean', [False, True])
+@pytest.mark.parametrize('q', sorted_queries)
+def test_sorted_same_as_scan(make_ds, products, q, clean):
+    if clean:
+        # all records are in index, no fallback to sorted()
+        products = [ p for p in products if p.get('price') is not None and p.get('rating') is not None ]
+
+    plain = make_ds(config_noindex, products)
+    indexed = make_ds(config_sorted, products)
+
+    def run(ds):
+        sq = SearchQuery(**q)
+        if sq.filter:
+            sq.expr = make_expr(sq.expr, sq.filter)
+        try:
+            return ds.search(sq)
+        except Exception as e:
+            return repr(e)
+
+    assert run(indexed) == run(plain)
+
+
+def test_sorted_mutations(make_ds, products):
+    plain = make_ds(config_noindex, products)
+    indexed = make_ds(config_sorted, products)
+
+    for ds in (plain, indexed):
+        ds.update(SearchQuery(expr='id < 20', update={'price': 77}))
+        ds.update(SearchQuery(expr='id == 50', update={'price': 'free'}))
+        ds.insert({'id': 2000, 'price': 77})
+        ds.delete(SearchQuery(expr='id > 90 and id < 100'))
+
+    for q in [dict(expr='price == 77'), dict(expr='price < 100 and id != 50', sort='price', limit=5)]:
+        assert indexed.search(SearchQuery(**q)) == plain.search(SearchQuery(**q))
+
+    index = indexed._indexes.sorted_index('price')
+    match, _ = index.candidates(indexed.compile('price == 77').node.body)
+    assert match == { pos for pos, item in enumerate(plain._data) if item.get('price') == 77 }
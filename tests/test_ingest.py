@@ -0,0 +1,81 @@
+import os
+import io
+import json
+
+import pytest
+
+from sashimi.ingest import iter_records, IngestError
+
+records = [
+    {'id': 1, 'title': 'Привет', 'price': 12.5, 'tags': ['a', 'b'], 'x': None},
+    {'id': 22222, 'title': 'with "quotes" and ] [ , }', 'price': 1e10},
+    {},
+    {'id': -3, 'nested': {'a': [1, 2, {'b': True}]}},
+]
+
+
+def parse(data: bytes, chunk_size=3):
+    return list(iter_records(io.BytesIO(data), chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 1024])
+def test_array(chunk_size):
+    assert parse(json.dumps(records).encode(), chunk_size) == records
+    assert parse(json.dumps(records, indent=4, ensure_ascii=False).encode(), chunk_size) == records
+
+
+def test_numbers():
+    assert parse(b'[12345, 6.25e3, -1]', chunk_size=2) == [12345, 6250.0, -1]
+
+
+def test_ndjson():
+    data = '\n'.join(json.dumps(r, ensure_ascii=False) for r in records) + '\n\n'
+    assert parse(data.encode()) == records
+
+
+@pytest.mark.parametrize('data', [
+    b'  \n [] ',
+    b'\xef\xbb\xbf[]',
+    b'',
+])
+def test_empty(data):
+    assert parse(data) == []
+
+
+@pytest.mark.parametrize('data', [
+    b'[{"a": 1}, ',
+    b'[{"a": 1}, {"a": }]',
+    b'[1 x]',
+    b'{"a": 1}\n{"a": \n',
+])
+def test_errors(data):
+    with pytest.raises(IngestError):
+        parse(data)
+
+
+def test_load_file(make_ds, tmp_path):
+    ds = make_ds('limit: 10\n', [])
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps(records))
+    assert ds.load_file(str(path)) == records
+    assert ds.load_stats['records'] == len(records)
+
+
+def test_upload_streamed(api, tmp_path):
+    client = api()
+    ndjson = '\n'.join(json.dumps(r) for r in records)
+    r = client.put('/ds/p?name=one', content=ndjson)
+    assert r.status_code == 200, r.text
+    assert client.post('/ds/p/one', json=dict(expr='True')).json()['result'] == records
+
+    pdir = tmp_path / 'projects' / 'p'
+    path = pdir / 'one.json'
+    assert [ json.loads(line) for line in path.read_text().splitlines() ] == records
+
+    # broken body: old data stays, temporary file is removed (not file of other writer)
+    other = pdir / 'one.json.tmp'
+    other.write_text('[]')
+    r = client.put('/ds/p?name=one', content='[{"id": 1}, {"id": ')
+    assert r.status_code == 400
+    assert client.post('/ds/p/one', json=dict(expr='True')).json()['matches'] == len(records)
+    assert [ name for name in os.listdir(pdir) if name.endswith('.tmp') ] == [other.name]
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from sashimi.api.params import SearchQuery
+from sashimi.interning import Interner
+
+
+def test_auto_fields(make_ds, products):
+    ds = make_ds('limit: 1000\n', products)
+    fields = ds._interner.fields
+    assert 'category' in fields
+    assert 'title' not in fields and 'description' not in fields
+
+    phones = [ item['category'] for item in ds._data if item.get('category') == 'smartphones' ]
+    assert all(c is phones[0] for c in phones)
+
+
+def test_keys_shared(make_ds, products):
+    # as if loaded from NDJSON: every record has own key strings
+    data = [ json.loads(json.dumps(item)) for item in products ]
+    assert data[0]['id'] == 1 and list(data[0])[0] is not list(data[1])[0]
+
+    ds = make_ds('limit: 1000\n', data)
+    assert list(ds._data[0])[0] is list(ds._data[1])[0]
+
+
+def test_max_distinct():
+    data = [ {'a': str(n % 10), 'b': str(n % 40)} for n in range(100) ]
+    interner = Interner(fields=None, max_distinct=20)
+    interner.data(data)
+    assert 'a' in interner.fields and 'b' not in interner.fields
+    assert interner.rejected == {'b'}
+
+
+def test_size_report(make_ds):
+    # separate string objects in every record, as after json.load
+    data = [ json.loads(json.dumps({'id': n, 'status': 'waiting for payment confirmation ' * 10})) for n in range(20000) ]
+    plain = make_ds('intern: false\nsize_recount: demand\n', data)
+    shared = make_ds('size_recount: demand\n', data)
+
+    assert shared._interner.fields == ['status']
+    assert shared.size < plain.size * 0.5
+    shared.update_size()
+    assert shared.size < plain.size * 0.5
+
+
+def test_insert_update_interned(make_ds, products):
+    ds = make_ds('limit: 1000\n', products)
+    laptops = next(item['category'] for item in ds._data if item.get('category') == 'laptops')
+
+    ds.insert({'id': 2000, 'category': ''.join(['lap', 'tops'])})
+    ds.update(SearchQuery(expr='id == 1', update={'category': ''.join(['lap', 'tops'])}))
+    assert ds._data[-1]['category'] is laptops
+    assert ds._data[0]['category'] is laptops
+
+
+expressions = [
+    'brand == "Apple"',
+    '"Apple" == brand',
+    'brand != "Apple"',
+    'brand == "No such brand"',
+    'brand in ["Apple", "Samsung", None]',
+    'category not in ["laptops"] and brand',
+    'not brand',
+    'brand is None',
+    'brand > "M"',
+    'title == "iPhone 9"',
+    'brand == category',
+]
+
+
+@pytest.mark.parametrize('expr', expressions)
+def test_encoded_columns(make_ds, products, expr):
+    pytest.importorskip('numpy')
+    rows = make_ds('storage: rows\nlimit: 1000\n', products)
+    cols = make_ds('storage: columnar\nlimit: 1000\nintern: [brand, category, title]\n', products)
+    assert cols._columns.columns['brand'].codes is not None
+
+    sq = SearchQuery(expr=expr, sort='id')
+    assert cols.search(sq) == rows.search(sq)
+
+    for ds in (rows, cols):
+        ds.update(SearchQuery(expr='id < 5', update={'brand': 'Apple'}))
+        ds.update(SearchQuery(expr='id == 10', update={'brand': 'New brand'}))
+        ds.update(SearchQuery(expr='id == 11', update={'brand': None}))
+        ds.delete(SearchQuery(expr='category == "laptops"'))
+    assert cols.search(sq) == rows.search(sq)
@@ -0,0 +1,88 @@
+import json
+import time
+import threading
+
+import pytest
+
+from sashimi.api.params import SearchQuery
+from sashimi.project import Project
+
+from conftest import model
+
+
+@pytest.fixture
+def make_project(tmp_path, products):
+    def make(loading: str = None):
+        pdir = tmp_path / 'project'
+        pdir.mkdir()
+        if loading:
+            (pdir / '__project.yml').write_text(f'loading: {loading}\n')
+        for name in ['one', 'two']:
+            (pdir / f'{name}.json').write_text(json.dumps(products))
+        return Project(pdir, model=model, app_config=None)
+    return make
+
+
+def test_eager(make_project, products):
+    project = make_project()
+    assert project['one'].status == 'OK'
+    assert len(project['one']._data) == len(products)
+
+
+def test_lazy(make_project, products):
+    project = make_project('lazy')
+    ds = project['one']
+    assert ds._data is None
+    assert ds.status == 'not loaded'
+
+    assert ds.search(SearchQuery(expr='True'))['matches'] == len(products)
+    assert ds.status == 'OK'
+    assert project['two']._data is None
+
+
+def test_background(make_project, products):
+    project = make_project('background')
+
+    for _ in range(100):
+        if all(ds.status == 'OK' for ds in project._d.values()):
+            break
+        assert all(ds.status in ('loading', 'OK') for ds in project._d.values())
+        time.sleep(0.05)
+
+    assert len(project['two']) == len(products)
+    assert project['one'].status == 'OK'
+
+
+def test_server_not_blocked(api, products, monkeypatch):
+    from sashimi.dataset import Dataset
+    load_local = Dataset.load_local
+
+    def slow_load(self, path):
+        time.sleep(1.5)
+        return load_local(self, path)
+
+    monkeypatch.setattr(Dataset, 'load_local', slow_load)
+    client = api('loading: background\n', dict(one=products))
+
+    r = dict()
+    search = threading.Thread(target=lambda: r.update(client.post('/ds/p/one', json=dict(expr='True', limit=0)).json()))
+    search.start()
+    time.sleep(0.2)
+
+    # search waits for load, other requests do not
+    start = time.time()
+    assert client.get('/').status_code == 200
+    assert time.time() - start < 0.5
+    assert search.is_alive()
+
+    search.join()
+    assert r['matches'] == len(products)
+
+
+def test_upload_to_lazy(api, products):
+    client = api('loading: lazy\n', dict(one=products))
+    assert client.get('/ds/p/one').json() == 'not loaded'
+    r = client.put('/ds/p?name=one', content=json.dumps(products[:5]))
+    assert r.status_code == 200, r.text
+    assert client.get('/ds/p/one').json() == 'OK'
+    assert client.post('/ds/p/one', json=dict(expr='True')).json()['matches'] == 5
@@ -0,0 +1,115 @@
+import copy
+import json
+import threading
+
+import pytest
+
+from sashimi.api.params import SearchQuery
+
+config = 'limit: 1000\nresult_cache: 0\nindexes:\n  id: hash\n  price: sorted\n'
+
+
+def test_old_version_unchanged(make_ds, products):
+    ds = make_ds(config, products)
+    state = ds._state
+    before = copy.deepcopy(state.data)
+    candidates = state.indexes.candidates(ds.compile('id == 3').node)
+
+    ds.update(SearchQuery(expr='id < 5', update={'price': 1, 'id': 3}))
+    ds.insert({'id': 3, 'price': 2})
+    ds.delete(SearchQuery(expr='id > 50'))
+
+    assert state.data == before
+    assert state.indexes.candidates(ds.compile('id == 3').node) == candidates
+    assert ds._state is not state and ds._state.version > state.version
+    assert ds.search(SearchQuery(expr='id == 3'))['matches'] == 5
+
+
+def test_search_sees_one_version(make_ds, clean_products):
+    products = clean_products
+    ds = make_ds(config, products)
+    sq = SearchQuery(expr='price > 0', fields=['id', 'stock'])
+    lines = ds.search_stream(sq)
+    first = json.loads(next(lines))
+
+    # change everything while search is in progress
+    ds.update(SearchQuery(expr='True', update={'stock': -1}))
+    ds.delete(SearchQuery(expr='id > 50'))
+
+    rest = [ json.loads(line) for line in lines ]
+    records = [first] + rest[:-1]
+    assert len(records) == len(products)
+    assert all(r['stock'] != -1 for r in records)
+    assert rest[-1]['summary']['matches'] == len(products)
+
+
+def test_failed_change_not_published(make_ds, products):
+    ds = make_ds(config, products)
+    state = ds._state
+    with pytest.raises(KeyError):
+        # second record has no key, first one is updated in next version
+        ds._merge('id', [{'id': 1, 'price': 0}, {'price': 0}])
+    assert ds._state is state
+    assert ds.search(SearchQuery(expr='id == 1'))['result'][0]['price'] == products[0]['price']
+
+
+@pytest.mark.parametrize('storage', ['rows', 'columnar'])
+def test_concurrent(make_ds, clean_products, storage):
+    if storage == 'columnar':
+        pytest.importorskip('numpy')
+    ds = make_ds(config + f'storage: {storage}\n', clean_products)
+    ds.update(SearchQuery(expr='True', update={'stock': -1}))
+    done = threading.Event()
+    errors = list()
+
+    def write():
+        for n in range(60):
+            ds.update(SearchQuery(expr='True', update={'stock': n}))
+            if n % 10 == 0:
+                ds.insert({'id': 1000 + n, 'price': 1, 'stock': n})
+                ds.delete(SearchQuery(expr=f'id == {1000 + n}'))
+        done.set()
+
+    def read():
+        sqs = [SearchQuery(expr='price > 0', fields=['stock']),
+               SearchQuery(expr='id < 1000', sort='price', fields=['stock', 'price']),
+               SearchQuery(expr='stock >= -1', fields=['stock'])]
+        while not done.is_set():
+            for sq in sqs:
+                r = ds.search(sq)
+                stocks = { rec['stock'] for rec in r['result'] }
+                # all records are from one version (inserted record is deleted by next change)
+                if len(stocks) > 1 or r['exceptions'] or r['matches'] not in (100, 101):
+                    errors.append((sq.expr, stocks, r['exceptions'], r['matches']))
+
+    threads = [ threading.Thread(target=read) for _ in range(3) ] + [ threading.Thread(target=write) ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def test_index_changes(make_ds, clean_products):
+    ds = make_ds(config, clean_products)
+    plain = make_ds('limit: 1000\nresult_cache: 0\n', clean_products)
+    queries = [dict(expr='id == 7'), dict(expr='id in [1, 2, 3]'), dict(expr='price > 500', sort='price'),
+               dict(expr='price < 1000', sort='price', reverse=True)]
+
+    built = ds._state.indexes
+    for n in range(30):
+        for d in (ds, plain):
+            d.update(SearchQuery(expr=f'id == {n}', update={'price': n * 37 % 1000, 'id': n + 1}))
+            d.insert({'id': 500 + n, 'price': n})
+        # changes are kept aside, built part is shared
+        assert ds._state.indexes.indexes['price'].entries is built.indexes['price'].entries
+        for q in queries:
+            assert ds.search(SearchQuery(**q)) == plain.search(SearchQuery(**q))
+
+    # too many changes, next version gets rebuilt indexes
+    ds.update(SearchQuery(expr='True', update={'price': 1}))
+    for _ in range(10):
+        ds.update(SearchQuery(expr='True', update={'price': 2}))
+    index = ds._state.indexes.indexes['price']
+    assert index.entries is not built.indexes['price'].entries and index.changes < 1000
+    assert ds.search(SearchQuery(expr='price == 2'))['matches'] == len(ds._data)
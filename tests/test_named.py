@@ -0,0 +1,91 @@
+import json
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from sashimi.api.params import SearchQuery
+
+config = '''
+limit: 1000
+search:
+  cheap:
+    expr: price < 100
+    sort: price
+    limit: 5
+'''
+
+
+def wait_fresh(ds, name, timeout=5):
+    ns = ds.named_search[name]
+    deadline = time.time() + timeout
+    while not ns.fresh(ds):
+        assert time.time() < deadline, 'named search is not computed in background'
+        time.sleep(0.05)
+
+
+def test_warmed_in_background(make_ds, products):
+    ds = make_ds(config, products)
+    wait_fresh(ds, 'cheap')
+
+    body, etag = ds.named_result('cheap')
+    r = json.loads(body)
+    expected = ds.search(SearchQuery(expr='price < 100', sort='price', limit=5))
+    assert r['result'] == expected['result'] and r['matches'] == expected['matches']
+    assert 'time' in r
+
+    # nothing is computed on request
+    assert ds.named_result('cheap') == (body, etag)
+
+
+def test_etag(make_ds, products):
+    ds = make_ds(config, products)
+    body, etag = ds.named_result('cheap')
+
+    # result is same, ETag is same
+    ds.insert({'id': 2000, 'price': 5000})
+    body2, etag2 = ds.named_result('cheap')
+    assert etag2 == etag
+
+    ds.insert({'id': 2001, 'price': 1})
+    body3, etag3 = ds.named_result('cheap')
+    assert etag3 != etag
+    assert json.loads(body3)['result'][0]['id'] == 2001
+
+
+def test_stale(make_ds, products):
+    ds = make_ds(config + 'search_stale: true\n', products)
+    body, etag = ds.named_result('cheap')
+
+    ds.insert({'id': 2001, 'price': 1})
+    # old result at once, new one later
+    assert ds.named_result('cheap') == (body, etag)
+    wait_fresh(ds, 'cheap')
+    assert json.loads(ds.named_result('cheap')[0])['result'][0]['id'] == 2001
+
+
+def test_no_such_search(make_ds, products):
+    ds = make_ds(config, products)
+    with pytest.raises(HTTPException) as e:
+        ds.named_result('nothing')
+    assert e.value.status_code == 404
+
+
+def test_api(api, products):
+    client = api('', dict(one=products))
+    # named searches are in dataset config
+    client.post('/ds/p/one/_config', content=config)
+    r = client.get('/ds/p/one/cheap')
+    assert r.status_code == 200
+    etag = r.headers['etag']
+    assert r.json()['matches'] > 0
+
+    r = client.get('/ds/p/one/cheap', headers={'If-None-Match': etag})
+    assert r.status_code == 304 and r.content == b''
+    assert r.headers['etag'] == etag
+
+    client.patch('/ds/p/one', json=dict(op='update', expr='True', update={'price': 1}))
+    r = client.get('/ds/p/one/cheap', headers={'If-None-Match': etag})
+    assert r.status_code == 200 and r.headers['etag'] != etag
+
+    assert client.get('/ds/p/two/cheap').status_code == 404
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from sashimi import parallel
+from sashimi.api.params import SearchQuery
+
+pytestmark = pytest.mark.skipif(not parallel.available(), reason='fork() is not available')
+
+config_serial = 'limit: 1000\n'
+config_parallel = '''
+limit: 1000
+parallel:
+  workers: 2
+  threshold: 0
+  chunk: 70
+'''
+
+
+@pytest.mark.parametrize('q', [
+    dict(expr='True'),
+    dict(expr='price > 100', sort='price', limit=7, offset=3),
+    dict(expr='True', sort='brand', reverse=True, limit=50),
+    dict(expr='price > 50', aggregate=['sum:id', 'max:price', 'distinct:category'], group_by='category', discard=True),
+    dict(expr='rating > 4', fields=['id', 'rating'], sort='rating', limit=5),
+    dict(expr='SomethingWrong'),
+    dict(expr='price > 10', aggregate=['max:title', 'min:price'], sort='id', limit=5),
+])
+def test_same_as_serial(make_ds, clean_products, q):
+    # 5 copies of each product, so there are many equal sort keys
+    data = clean_products * 5
+    serial = make_ds(config_serial, data)
+    par = make_ds(config_parallel, data)
+    try:
+        sq = SearchQuery(**q)
+        assert par._parallel.suitable(sq)
+        assert par.search(sq) == serial.search(sq)
+        assert par._parallel._pool is not None
+    finally:
+        par._parallel.close()
+
+
+def test_new_version(make_ds, clean_products):
+    par = make_ds(config_parallel, clean_products * 5)
+    sq = SearchQuery(expr='brand == "Apple"', discard=True)
+    try:
+        assert par.search(sq)['matches'] == 15
+        par.insert({'brand': 'Apple'})
+        assert par.search(sq)['matches'] == 16
+    finally:
+        par._parallel.close()
+
+
+def test_refork(make_ds, clean_products):
+    par = make_ds(config_parallel + '  refork: 3600\n', clean_products * 5)
+    sq = SearchQuery(expr='brand == "Apple"', discard=True)
+    try:
+        par.search(sq)
+        pool = par._parallel._pool
+        par.insert({'brand': 'Apple'})
+        # serial scan of new version, pool is not forked again
+        assert par.search(sq)['matches'] == 16
+        assert par._parallel._pool is pool
+
+        par._parallel.refork = 0
+        # (other query, not a cached result if result_cache is set)
+        assert par.search(SearchQuery(expr='"Apple" == brand', discard=True))['matches'] == 16
+        assert par._parallel._pool is not pool
+        # old workers exit
+        for _ in range(50):
+            if not any(p.is_alive() for p in pool._pool):
+                break
+            time.sleep(0.1)
+        assert not any(p.is_alive() for p in pool._pool)
+    finally:
+        par._parallel.close()
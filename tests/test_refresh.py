@@ -0,0 +1,113 @@
+import json
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from sashimi import fetch
+
+
+class Upstream():
+    """ local HTTP server with one JSON document and ETag """
+
+    def __init__(self):
+        self.body = b'[]'
+        self.etag = '"1"'
+        self.requests = list()
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                upstream.requests.append(dict(self.headers))
+                if self.headers.get('If-None-Match') == upstream.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', upstream.etag)
+                self.send_header('Content-Length', str(len(upstream.body)))
+                self.end_headers()
+                self.wfile.write(upstream.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/products.json'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def publish(self, data, etag):
+        self.body = json.dumps(data).encode()
+        self.etag = etag
+
+
+@pytest.fixture
+def upstream():
+    u = Upstream()
+    yield u
+    u.server.shutdown()
+
+
+def test_conditional(make_ds, upstream):
+    upstream.publish([{'id': 1}, {'id': 2}], '"v1"')
+    ds = make_ds(f'url: {upstream.url}\nrefresh: 3600\n', [])
+
+    assert ds.refresh_url() is True
+    assert len(ds) == 2
+    version = ds.version
+
+    # not modified: data is not touched
+    assert ds.refresh_url() is False
+    assert upstream.requests[-1]['If-None-Match'] == '"v1"'
+    assert ds.version == version
+
+    upstream.publish([{'id': 3}], '"v2"')
+    assert ds.refresh_url() is True
+    assert ds._data == [{'id': 3}]
+
+
+def test_bad_data_keeps_old(make_ds, upstream):
+    upstream.publish([{'id': 1}], '"v1"')
+    ds = make_ds(f'url: {upstream.url}\nrefresh: 3600\n', [])
+    ds.refresh_url()
+
+    upstream.body = b'[{"id": 2}, {"id": '
+    upstream.etag = '"v2"'
+    with pytest.raises(ValueError):
+        ds.refresh_url()
+    assert ds._data == [{'id': 1}]
+    # will be downloaded again
+    assert ds._validators['etag'] == '"v1"'
+
+
+def test_keypath(make_ds, upstream):
+    upstream.publish({'products': [{'id': 1}], 'total': 1}, '"v1"')
+    ds = make_ds(f'url: {upstream.url}\nrefresh: 3600\nkeypath: products\n', [])
+    assert ds.load_url(upstream.url) == [{'id': 1}]
+
+
+def test_local_copy(load_ds, upstream, tmp_path):
+    path = tmp_path / 'products.json'
+    path.write_text('[{"id": 1}]')
+    upstream.publish([{'id': 1}, {'id': 2}], '"v1"')
+
+    ds = load_ds(path, f'url: {upstream.url}\nrefresh: 3600\n')
+    ds.insert({'id': 100})
+    assert ds.refresh_url() is True
+
+    # local file replaced, mutation log started again
+    assert json.loads(path.read_text()) == [{'id': 1}, {'id': 2}]
+    ds.wal.close()
+    assert len(load_ds(path, f'url: {upstream.url}\n')) == 2
+
+
+def test_shared_session(upstream):
+    upstream.publish([], '"v1"')
+    assert fetch.session() is fetch.session()
+    fh, validators = fetch.download(upstream.url)
+    assert fh.read() == b'[]'
+    assert validators['etag'] == '"v1"'
+    assert fetch.download(upstream.url, validators) == (None, validators)
+
+    with pytest.raises(fetch.FetchError):
+        fetch.download('http://127.0.0.1:1/products.json', timeout=1)
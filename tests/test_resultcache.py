@@ -0,0 +1,84 @@
+import json
+
+from sashimi.api.params import SearchQuery
+from sashimi.resultcache import ResultCache
+from sashimi.dataset import get_deep_size
+
+config = 'limit: 1000\nresult_cache: 16777216\n'
+
+
+def test_hit_and_normalized_key(make_ds, products):
+    ds = make_ds(config, products)
+
+    r1 = ds.search(SearchQuery(expr='price>100', sort='id'))
+    r2 = ds.search(SearchQuery(expr='price > 100', sort='id', token='x'))
+    assert r1 == r2
+    assert ds._result_cache.stats()['hits'] == 1
+
+    ds.search(SearchQuery(expr='price > 100', sort='id', reverse=True))
+    assert ds._result_cache.stats()['misses'] == 2
+
+
+def test_result_copy(make_ds, products):
+    ds = make_ds(config, products)
+    r = ds.search(SearchQuery(expr='True'))
+    r['time'] = 1
+    assert 'time' not in ds.search(SearchQuery(expr='True'))
+
+
+def test_invalidated_on_change(make_ds, products):
+    ds = make_ds(config, products)
+    sq = SearchQuery(expr='brand == "Apple"')
+    n = ds.search(sq)['matches']
+
+    ds.insert({'id': 2000, 'brand': 'Apple'})
+    assert ds.search(sq)['matches'] == n + 1
+
+    ds.update(SearchQuery(expr='id == 2000', update={'brand': 'Samsung'}))
+    assert ds.search(sq)['matches'] == n
+
+    # id 1 is Apple
+    ds.delete(SearchQuery(expr='id == 1'))
+    assert ds.search(sq)['matches'] == n - 1
+
+    ds.set_dataset([{'brand': 'Apple'}])
+    assert ds.search(sq)['matches'] == 1
+
+    assert ds._result_cache.stats()['hits'] == 0
+
+
+def test_disabled(make_ds, products):
+    ds = make_ds('limit: 1000\n', products)
+    assert ds._result_cache is None
+    assert ds.search(SearchQuery(expr='True'))['matches'] == len(products)
+
+
+def test_lru_budget():
+    cache = ResultCache(100)
+    cache.put('a', 1, {'r': 'a'}, 40)
+    cache.put('b', 1, {'r': 'b'}, 40)
+    assert cache.get('a', 1) == {'r': 'a'}
+    cache.put('c', 1, {'r': 'c'}, 40)
+
+    # 'b' is least recently used
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) is not None
+    assert cache.bytes == 80
+    assert cache.evictions == 1
+
+    # too large, not cached
+    cache.put('d', 1, {}, 1000)
+    assert cache.get('d', 1) is None
+
+    # new version
+    assert cache.get('a', 2) is None
+    assert len(cache) == 0
+
+
+def test_size_estimated(make_ds, products):
+    # different objects in each record
+    ds = make_ds('limit: 100000\nresult_cache: 16777216\n', json.loads(json.dumps(products * 30)))
+    r = ds.search(SearchQuery(expr='True'))
+    size = ds._result_cache.stats()['bytes']
+    exact = get_deep_size(r['result'])
+    assert 0.7 * exact < size < 1.3 * exact
@@ -0,0 +1,88 @@
+import json
+import pickle
+
+import pytest
+
+from sashimi.api.params import SearchQuery
+from sashimi.dataset import record_size
+from sashimi.rows import Row, Schema
+
+config = 'compact_rows: true\nlimit: 1000\n'
+
+
+@pytest.fixture
+def schema():
+    return Schema(['id', 'brand', 'price'])
+
+
+def test_row_mapping(schema):
+    row = schema.make({'id': 1, 'brand': None, 'title': 'overflow'})
+    assert isinstance(row, Row)
+    assert row == {'id': 1, 'brand': None, 'title': 'overflow'}
+    assert dict(row) == {'id': 1, 'brand': None, 'title': 'overflow'}
+    assert row['title'] == 'overflow' and row.extra() == {'title': 'overflow'}
+    assert 'brand' in row and 'price' not in row
+    assert row.get('price', 0) == 0
+    with pytest.raises(KeyError):
+        row['price']
+    assert len(row) == 3
+
+    row.update({'price': 10, 'stock': 5})
+    del row['title']
+    assert row == {'id': 1, 'brand': None, 'price': 10, 'stock': 5}
+    with pytest.raises(KeyError):
+        del row['title']
+
+    # no per-record dict, only slots
+    assert not hasattr(row, '__dict__')
+    assert pickle.loads(pickle.dumps(row)) == row
+
+
+def test_eval(schema):
+    row = schema.make({'id': 1, 'price': 10})
+    assert eval('price > 5 and id == 1', None, row)
+    with pytest.raises(NameError):
+        eval('brand', None, row)
+
+
+def test_smaller(make_ds, products):
+    plain = make_ds('limit: 1000\n', products)
+    ds = make_ds(config, products)
+    assert isinstance(ds._data[0], Row)
+    assert record_size(ds._data[0]) < record_size(plain._data[0])
+    assert ds.size < plain.size
+
+
+queries = [
+    dict(expr='price > 100', sort='price'),
+    dict(expr='brand == "Apple" or price is None'),
+    dict(expr='True', fields=['id', 'brand']),
+    dict(expr='id < 1000', discard=True, aggregate=['max:id', 'avg:stock']),
+    dict(expr='id < 1000', group_by='category'),
+]
+
+
+@pytest.mark.parametrize('q', queries)
+def test_same_as_dicts(make_ds, products, q):
+    plain = make_ds('limit: 1000\n', products)
+    ds = make_ds(config, products)
+    sq = SearchQuery(**q)
+    assert ds.search(sq) == plain.search(sq)
+    assert json.loads(ds.dumps_result(ds.search(sq), sq)) == json.loads(plain.dumps_result(plain.search(sq), sq))
+
+    for d in (plain, ds):
+        d.insert({'id': 2000, 'brand': 'New', 'color': 'red'})
+        d.update(SearchQuery(expr='id < 5', update={'price': 1, 'sale': True}))
+        d.delete(SearchQuery(expr='id > 90 and id < 100'))
+    assert ds.search(sq) == plain.search(sq)
+    assert ds._data == plain._data
+
+
+def test_indexes_and_columns(make_ds, products):
+    pytest.importorskip('numpy')
+    conf = 'indexes:\n  id: hash\n  price: sorted\n'
+    plain = make_ds('storage: columnar\nlimit: 1000\n' + conf, products)
+    ds = make_ds(config + 'storage: columnar\n' + conf, products)
+    for q in [dict(expr='id == 3'), dict(expr='price > 500', sort='price'), dict(expr='category == "laptops"')]:
+        sq = SearchQuery(**q)
+        assert ds.search(sq) == plain.search(sq)
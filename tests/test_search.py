@@ -0,0 +1,116 @@
+import pytest
+
+from sashimi.api.params import SearchQuery
+from sashimi.dataset import ScanStats
+
+config = 'limit: 1000\n'
+
+
+@pytest.mark.parametrize('q', [
+    dict(expr='True', sort='price', limit=5),
+    dict(expr='price > 50', sort='price', reverse=True, limit=10, offset=10),
+    dict(expr='True', sort='rating', limit=3, fields=['rating', 'id']),
+    dict(expr='True', sort='stock', limit=2000),
+])
+def test_topk_same_as_sorted(make_ds, clean_products, q):
+    products = clean_products
+    ds = make_ds(config, products)
+    r = ds.search(SearchQuery(**q))
+
+    outlist = [ p for p in products if eval(q['expr'], None, p) ]
+    outlist = sorted(outlist, key=lambda x: x[q['sort']], reverse=q.get('reverse', False))
+    outlist = outlist[q.get('offset', 0):][:q['limit']]
+    if 'fields' in q:
+        outlist = [ {k: p[k] for k in q['fields']} for p in outlist ]
+
+    assert r['result'] == outlist
+
+
+def test_count(make_ds, products):
+    ds = make_ds(config, products)
+
+    exact = ds.search(SearchQuery(expr='id > 10', limit=5))
+    assert exact['matches'] == 91
+    assert 'count' not in exact
+
+    r = ds.search(SearchQuery(expr='id > 10', limit=5, count='none'))
+    assert r['matches'] is None
+    assert r['count'] == 'none'
+    assert r['truncated']
+    assert r['result'] == exact['result']
+
+    r = ds.search(SearchQuery(expr='id > 10', limit=5, count='estimate'))
+    assert r['count'] == 'estimate'
+    assert 0 < r['matches'] <= len(ds)
+    assert r['result'] == exact['result']
+
+    # all matches found before limit
+    r = ds.search(SearchQuery(expr='id < 4', limit=5, count='none'))
+    assert r['matches'] == 3
+    assert r['count'] == 'exact'
+    assert not r['truncated']
+
+
+def test_aggregate(make_ds, clean_products):
+    ds = make_ds(config, clean_products)
+    smartphones = [ p for p in clean_products if p['category'] == 'smartphones' ]
+
+    r = ds.search(SearchQuery(expr='category == "smartphones"',
+                              aggregate=['min:price', 'max:price', 'sum:price', 'avg:price', 'distinct:brand', 'count:brand'],
+                              discard=True))
+    assert 'result' not in r
+    assert r['aggregation'] == {
+        'min:price': 280,
+        'max:price': 1249,
+        'sum:price': sum(p['price'] for p in smartphones),
+        'avg:price': sum(p['price'] for p in smartphones) / len(smartphones),
+        'distinct:brand': sorted({p['brand'] for p in smartphones}),
+        'count:brand': len(smartphones)
+    }
+
+    # aggregation over all matches, even if result is limited
+    r2 = ds.search(SearchQuery(expr='category == "smartphones"', aggregate=['sum:price'], sort='price', limit=1))
+    assert r2['aggregation']['sum:price'] == r['aggregation']['sum:price']
+    assert r2['result'][0]['price'] == 280
+    assert r2['truncated']
+
+    r = ds.search(SearchQuery(expr='id < 0', aggregate=['min:price', 'count:id']))
+    assert r['aggregation'] == {'min:price': None, 'count:id': 0}
+
+
+@pytest.mark.parametrize('agg', ['price', 'xxx:price', 'sum:nosuchfield', 'sum:title'])
+def test_aggregate_errors(make_ds, clean_products, agg):
+    from fastapi import HTTPException
+
+    ds = make_ds(config, clean_products)
+    with pytest.raises(HTTPException) as e:
+        ds.search(SearchQuery(expr='True', aggregate=[agg]))
+    assert e.value.status_code == 400
+
+
+def test_group_by(make_ds, clean_products):
+    ds = make_ds(config, clean_products)
+
+    r = ds.search(SearchQuery(expr='price < 1000', group_by='category', aggregate=['max:price', 'distinct:brand'], discard=True))
+    groups = { g['group']: g for g in r['groups'] }
+    assert len(groups) == len({ p['category'] for p in clean_products if p['price'] < 1000 })
+    assert sum(g['count'] for g in groups.values()) == r['matches']
+
+    smartphones = [ p for p in clean_products if p['category'] == 'smartphones' and p['price'] < 1000 ]
+    assert groups['smartphones']['count'] == len(smartphones)
+    assert groups['smartphones']['aggregation'] == {
+        'max:price': max(p['price'] for p in smartphones),
+        'distinct:brand': sorted({p['brand'] for p in smartphones})
+    }
+
+
+def test_sorted_fallback_stats(make_ds, products):
+    ds = make_ds(config + 'indexes:\n  price: sorted\n', products)
+    sq = SearchQuery(expr='True', sort='price', limit=5, count='estimate')
+    expr = ds.compile(sq.expr)
+
+    # product without price: sorted index can not be used, records are scanned as usual
+    stats = ScanStats()
+    assert ds._scan_sorted(expr, sq, stats, ds._state) is None
+    list(ds._scan(expr, stats, ds._state))
+    assert stats.planned == stats.scanned == len(products)
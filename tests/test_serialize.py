@@ -0,0 +1,92 @@
+import json
+import decimal
+import datetime
+
+from sashimi.api.params import SearchQuery
+from sashimi import serialize
+
+config = 'limit: 20\nrow_cache: 33554432\n'
+
+
+def test_dumps_result_same_as_json(make_ds, products):
+    ds = make_ds(config, products)
+    for q in [dict(expr='price > 100'), dict(expr='True', fields=['id', 'brand']),
+              dict(expr='False'), dict(expr='True', discard=True, aggregate=['max:id'])]:
+        sq = SearchQuery(**q)
+        r = ds.search(sq)
+        assert json.loads(ds.dumps_result(r, sq)) == json.loads(json.dumps(r))
+        # second time from row cache
+        assert json.loads(ds.dumps_result(r, sq)) == json.loads(json.dumps(r))
+
+
+def test_dumps_result_only_result():
+    assert json.loads(serialize.dumps_result({'result': [{'a': 1}]}, serialize.dumps)) == {'result': [{'a': 1}]}
+
+
+def test_db_types():
+    r = json.loads(serialize.dumps({
+        'dt': datetime.datetime(2024, 1, 2, 3, 4, 5),
+        'price': decimal.Decimal('1.50'),
+        'qty': decimal.Decimal('3')}))
+    assert r == {'dt': '2024-01-02T03:04:05', 'price': 1.5, 'qty': 3}
+
+
+def test_row_cache_invalidated(make_ds, products):
+    ds = make_ds(config, products)
+    sq = SearchQuery(expr='id == 1')
+
+    ds.dumps_result(ds.search(sq), sq)
+    assert len(ds._row_cache) == 1
+
+    ds.update(SearchQuery(expr='id == 1', update={'price': 12345}))
+    assert len(ds._row_cache) == 0
+    assert json.loads(ds.dumps_result(ds.search(sq), sq))['result'][0]['price'] == 12345
+
+    ds.delete(SearchQuery(expr='id == 1'))
+    assert len(ds._row_cache) == 0
+
+    sq = SearchQuery(expr='True')
+    ds.dumps_result(ds.search(sq), sq)
+    assert len(ds._row_cache) == 20
+    ds.set_dataset([{'id': 1}])
+    assert len(ds._row_cache) == 0
+
+
+def test_projected_not_cached(make_ds, products):
+    ds = make_ds(config, products)
+    sq = SearchQuery(expr='True', fields=['id'])
+    ds.dumps_result(ds.search(sq), sq)
+    assert len(ds._row_cache) == 0
+
+
+def test_row_cache_budget():
+    cache = serialize.RowCache(max_bytes=20)
+    rows = [{'n': n} for n in range(5)]
+    for row in rows:
+        assert json.loads(cache.encode(row)) == row
+    assert cache.bytes <= 20
+    assert len(cache) == 2
+
+
+def test_api(api, products):
+    client = api(config, dict(one=products))
+    q = dict(expr='price > 100', sort='id')
+    fast = client.post('/ds/p/one', json=q)
+    pretty = client.post('/ds/p/one?pretty=1', json=q)
+    assert fast.headers['content-type'] == pretty.headers['content-type'] == 'application/json'
+    assert '\n    "result": [' in pretty.text
+
+    a, b = fast.json(), pretty.json()
+    a.pop('time'), b.pop('time')
+    assert a == b
+
+
+def test_big_int(make_ds, products):
+    products[0]['big'] = 10**20
+    ds = make_ds(config, products)
+    sq = SearchQuery(expr='big == 100000000000000000000')
+    r = ds.search(sq)
+    assert json.loads(ds.dumps_result(r, sq))['result'][0]['big'] == 10**20
+    assert json.loads(serialize.dumps({'x': -10**30})) == {'x': -10**30}
+    lines = b''.join(ds.search_stream(sq)).splitlines()
+    assert json.loads(lines[0])['big'] == 10**20
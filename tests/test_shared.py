@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from sashimi.api.params import SearchQuery
+from sashimi.config import Config
+from sashimi.project import Projects
+from sashimi import shared
+
+from conftest import model
+
+config = 'limit: 1000\n'
+
+# two datasets on same file are like two server processes (each has own lock file descriptor)
+
+
+@pytest.fixture
+def shared_mode(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared, 'enabled', False)
+    monkeypatch.setattr(shared, '_leader_path', None)
+    monkeypatch.setattr(shared, '_leader_fh', None)
+    shared.configure(str(tmp_path))
+    yield
+    if shared._leader_fh is not None:
+        shared._leader_fh.close()
+
+
+@pytest.fixture
+def dsfile(tmp_path, products):
+    path = tmp_path / 'products.json'
+    path.write_text(json.dumps(products))
+    return path
+
+
+def test_loaded_once(shared_mode, load_ds, dsfile):
+    ds1 = load_ds(dsfile, config)
+    ds2 = load_ds(dsfile, config)
+    assert not ds1.load_stats.get('snapshot')
+    assert ds2.load_stats['snapshot']
+
+
+def test_broadcast(shared_mode, load_ds, dsfile):
+    ds1 = load_ds(dsfile, config)
+    ds2 = load_ds(dsfile, config)
+    version = ds2.version
+
+    ds1.insert({'id': 2000, 'brand': 'New'})
+    ds1.update(SearchQuery(expr='id < 5', update={'brand': 'Updated'}))
+    sq = SearchQuery(expr='brand == "Updated" or id == 2000')
+    assert ds2.search(sq)['result'] == ds1.search(sq)['result']
+    assert ds2.version > version
+
+    # mutation in other process is applied after ones it has not seen yet
+    ds1.delete(SearchQuery(expr='id > 90 and id < 100'))
+    ds2.update(SearchQuery(expr='id > 80', update={'brand': 'Late'}))
+    sq = SearchQuery(expr='brand == "Late"')
+    assert ds1.search(sq)['matches'] == ds2.search(sq)['matches'] > 0
+    assert ds1._data == ds2._data
+    assert ds1.wal.records == ds2.wal.records == 4
+
+    # restart: log has all of it
+    assert load_ds(dsfile, config)._data == ds1._data
+
+
+def test_compacted_by_other(shared_mode, load_ds, dsfile):
+    ds1 = load_ds(dsfile, config)
+    ds2 = load_ds(dsfile, config)
+    ds1.insert({'id': 2000})
+    ds1.compact()
+    ds1.insert({'id': 2001})
+
+    loaded = ds2.load_stats
+    assert len(ds2) == len(ds1)
+    # not loaded again, continues with new log
+    assert ds2.load_stats is loaded
+    assert ds2.wal.records == 1
+    assert ds2._data == ds1._data
+
+
+def test_replaced_by_other(shared_mode, load_ds, dsfile, products):
+    ds1 = load_ds(dsfile, config)
+    ds2 = load_ds(dsfile, config)
+    ds2.insert({'id': 2000})
+
+    # upload in first process
+    ds1.upload(products[:10])
+    ds1.insert({'id': 3000})
+
+    assert len(ds2) == 11
+    assert ds2._data == ds1._data
+
+
+def test_leader(shared_mode, tmp_path, monkeypatch, load_ds, dsfile):
+    assert shared.is_leader()
+    # lock is held, other process is not leader
+    code = 'import fcntl, sys; fh = open(sys.argv[1], "a"); fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)'
+    r = subprocess.run([sys.executable, '-c', code, os.path.join(tmp_path, '.sashimi.lock')], capture_output=True)
+    assert r.returncode != 0 and b'BlockingIOError' in r.stderr
+
+    # jobs which change data do nothing in other processes
+    monkeypatch.setattr(shared, 'is_leader', lambda: False)
+    ds = load_ds(dsfile, config)
+    assert ds.sync_db() is None
+
+
+@pytest.fixture
+def other(tmp_path):
+    """ projects of other process """
+    def make():
+        projects = Projects()
+        projects.app_config = Config(role='master')
+        projects.read(str(tmp_path / 'projects'), model=model)
+        return projects
+    return make
+
+
+def test_new_dataset(shared_mode, api, other, products):
+    client = api('', dict(one=products))
+    projects = other()
+    r = client.put('/ds/p?name=two', content=json.dumps(products[:10]))
+    assert r.status_code == 200, r.text
+
+    assert len(projects['p']['two']) == 10
+
+
+def test_config_changed(shared_mode, api, other, products):
+    client = api('', dict(one=products))
+    projects = other()
+    assert projects['p']['one'].config['limit'] != 5
+    r = client.post('/ds/p/one/_config', content='limit: 5\n')
+    assert r.status_code == 200, r.text
+
+    assert projects['p']['one'].config['limit'] == 5
+
+
+def test_removed(shared_mode, api, other, products):
+    client = api('loading: lazy\n', dict(one=products, two=products))
+    projects = other()
+    # other process has not loaded it yet
+    assert projects['p']['one']._data is None
+    r = client.request('DELETE', '/ds/p', json=dict(name='one'))
+    assert r.status_code == 200, r.text
+
+    assert 'one' not in projects['p']
+    assert len(projects['p']['two']) == len(products)
+
+
+def test_removed_files(shared_mode, api, tmp_path, products):
+    client = api('', dict(one=products))
+    pdir = tmp_path / 'projects' / 'p'
+    assert (pdir / 'one.lock').exists()
+    r = client.request('DELETE', '/ds/p', json=dict(name='one'))
+    assert r.status_code == 200, r.text
+
+    assert not [ f.name for f in pdir.iterdir() if f.name.startswith('one.') ]
@@ -0,0 +1,38 @@
+import json
+
+from sashimi.api.params import SearchQuery
+from sashimi.dataset import get_deep_size, estimate_size
+import sashimi.dataset
+
+config = 'limit: 1000\n'
+
+
+def test_incremental(make_ds, clean_products):
+    ds = make_ds(config, clean_products)
+    assert ds.size_exact
+    assert ds.size == get_deep_size(ds._data)
+
+    ds.insert({'id': 2000, 'title': 'x' * 1000})
+    ds.update(SearchQuery(expr='id == 3', update={'description': 'y' * 1000}))
+    assert not ds.size_exact
+    # per-record sizes count shared objects (small ints, interned strings) again
+    assert abs(ds.size - get_deep_size(ds._data)) < ds.size * 0.05
+
+    ds.delete(SearchQuery(expr='id > 50'))
+    assert abs(ds.size - get_deep_size(ds._data)) < ds.size * 0.05
+
+    ds.update_size()
+    assert ds.size_exact
+    assert ds.size == get_deep_size(ds._data)
+
+
+def test_estimate(make_ds, clean_products, monkeypatch):
+    data = json.loads(json.dumps(clean_products * 30))
+    exact = get_deep_size(data)
+    assert abs(estimate_size(data) - exact) < exact * 0.2
+
+    monkeypatch.setattr(sashimi.dataset, 'SIZE_EXACT_MAX', 100)
+    ds = make_ds(config + 'size_recount: demand\n', data)
+    assert not ds.size_exact
+    ds.update_size()
+    assert ds.size_exact
@@ -0,0 +1,68 @@
+import os
+import json
+
+import pytest
+
+from sashimi import snapshot
+
+
+@pytest.fixture
+def dsfile(tmp_path, products):
+    path = tmp_path / 'products.json'
+    path.write_text(json.dumps(products))
+    return path
+
+
+def test_snapshot(load_ds, dsfile, products):
+    ds = load_ds(dsfile)
+    assert 'snapshot' not in ds.load_stats
+    assert os.path.exists(snapshot.snapshot_path(str(dsfile)))
+
+    ds = load_ds(dsfile)
+    assert ds.load_stats['snapshot']
+    assert ds._data == products
+
+
+def test_stale(load_ds, dsfile, products):
+    load_ds(dsfile)
+    products = products[:10]
+    dsfile.write_text(json.dumps(products))
+
+    ds = load_ds(dsfile)
+    assert 'snapshot' not in ds.load_stats
+    assert ds._data == products
+
+    # snapshot is updated
+    assert load_ds(dsfile).load_stats['snapshot']
+
+
+def test_other_python(load_ds, dsfile, products, monkeypatch):
+    load_ds(dsfile)
+    # snapshot made by other Python version
+    monkeypatch.setattr(snapshot, 'PYTHON', (snapshot.PYTHON[0], 3, 0))
+    assert snapshot.read(str(dsfile)) is None
+
+    ds = load_ds(dsfile)
+    assert 'snapshot' not in ds.load_stats
+    assert ds._data == products
+    # new snapshot for this version
+    assert load_ds(dsfile).load_stats['snapshot']
+
+
+def test_corrupted(load_ds, dsfile, products):
+    load_ds(dsfile)
+    spath = snapshot.snapshot_path(str(dsfile))
+    with open(spath, 'r+b') as fh:
+        fh.seek(-10, os.SEEK_END)
+        fh.write(b'xxxxxxxxxx')
+
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.read(str(dsfile))
+
+    ds = load_ds(dsfile)
+    assert ds._data == products
+
+
+def test_disabled(load_ds, dsfile):
+    load_ds(dsfile, 'snapshot: false\n')
+    assert not os.path.exists(snapshot.snapshot_path(str(dsfile)))
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from sashimi.api.params import SearchQuery
+
+config = 'limit: 50\nindexes:\n  price: sorted\n'
+
+
+@pytest.mark.parametrize('q', [
+    dict(expr='True'),
+    dict(expr='price > 100', fields=['id', 'price'], offset=5),
+    dict(expr='price > 100', sort='price', limit=10),
+    dict(expr='True', sort='id', reverse=True, limit=10, offset=3),
+    dict(expr='True', limit=5, count='estimate'),
+    dict(expr='brand == "Apple"', aggregate=['sum:id'], group_by='category'),
+    dict(expr='True', discard=True, aggregate=['count:id']),
+    dict(expr='price > "x"'),
+])
+def test_same_as_search(make_ds, products, q):
+    ds = make_ds(config, products)
+    r = ds.search(SearchQuery(**q))
+
+    lines = [ json.loads(line) for line in b''.join(ds.search_stream(SearchQuery(**q))).splitlines() ]
+    summary = lines.pop()['summary']
+
+    assert lines == r.pop('result', [])
+    assert summary == r
+
+
+def test_error_trailer(make_ds, products):
+    ds = make_ds(config, products)
+    lines = list(ds.search_stream(SearchQuery(expr='True', limit=1, aggregate=['min:price'])))
+    assert json.loads(lines[-1])['summary']['status'] == 'ERROR'
+
+
+def test_api(api, products):
+    client = api(config, dict(one=products))
+    q = dict(expr='price > 100', sort='price', limit=10)
+    r = client.post('/ds/p/one', json=q, headers={'Accept': 'application/x-ndjson'})
+    assert r.headers['content-type'] == 'application/x-ndjson'
+    lines = [ json.loads(line) for line in r.text.splitlines() ]
+    summary = lines.pop()['summary']
+
+    full = client.post('/ds/p/one', json=q).json()
+    assert lines == full['result']
+    assert summary['matches'] == full['matches']
+
+    # same with "stream" in query
+    assert client.post('/ds/p/one', json=dict(q, stream=True)).text == r.text
@@ -0,0 +1,126 @@
+import time
+import sqlite3
+
+import pytest
+
+from sashimi.api.params import SearchQuery
+
+
+@pytest.fixture
+def shop(tmp_path):
+    path = tmp_path / 'shop.sqlite'
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('CREATE TABLE products (id INTEGER PRIMARY KEY, title TEXT, price REAL, updated_at TEXT, is_deleted INTEGER DEFAULT 0)')
+    conn.executemany('INSERT INTO products (id, title, price, updated_at) VALUES (?, ?, ?, ?)',
+                     [ (n, f'product {n}', n * 1.5, f'2024-01-01 00:00:{n:02}') for n in range(1, 51) ])
+    yield f'sqlite:///{path}', conn
+    conn.close()
+
+
+def config(dburl, deleted=True):
+    sync = 'sync:\n  key: id\n  watermark: updated_at\n  interval: 3600\n'
+    if deleted:
+        sync += '  deleted: is_deleted\n'
+    return f'db: {dburl}\nsql: SELECT * FROM products\ndb_batch: 7\n' + sync
+
+
+def titles(ds):
+    return { item['id']: item['title'] for item in ds._data }
+
+
+def test_full_then_delta(make_ds, shop):
+    dburl, conn = shop
+    ds = make_ds(config(dburl), [])
+
+    stats = ds.sync_db()
+    assert stats['fetched'] == stats['inserted'] == 50
+    assert len(ds) == 50
+    assert ds._watermark == '2024-01-01 00:00:50'
+
+    conn.execute("UPDATE products SET title = 'new 3', updated_at = '2024-01-02 00:00:00' WHERE id = 3")
+    conn.execute("UPDATE products SET is_deleted = 1, updated_at = '2024-01-02 00:00:00' WHERE id = 4")
+    conn.execute("INSERT INTO products (id, title, price, updated_at) VALUES (100, 'new', 1, '2024-01-02 00:00:01')")
+
+    stats = ds.sync_db()
+    # only changed rows (and row with last watermark) are fetched
+    assert stats['fetched'] == 4
+    # row with last watermark is not changed, not update
+    assert (stats['inserted'], stats['updated'], stats['deleted']) == (1, 1, 1)
+
+    t = titles(ds)
+    assert len(t) == 50
+    assert t[3] == 'new 3' and t[100] == 'new' and 4 not in t
+
+    r = ds.search(SearchQuery(expr='id == 3'))
+    assert r['result'][0]['title'] == 'new 3'
+    assert ds.search(SearchQuery(expr='id == 4'))['matches'] == 0
+
+
+def test_continue_from_data(make_ds, shop):
+    dburl, conn = shop
+    data = [ dict(id=n, title=f'product {n}', updated_at=f'2024-01-01 00:00:{n:02}') for n in range(1, 11) ]
+    ds = make_ds(config(dburl, deleted=False), data)
+
+    stats = ds.sync_db()
+    # from row 10 (watermark of data)
+    assert stats['fetched'] == 41
+    assert stats['inserted'] == 40
+    assert len(ds) == 50
+
+
+def test_replay(load_ds, shop, tmp_path):
+    dburl, conn = shop
+    path = tmp_path / 'products.json'
+    path.write_text('[]')
+
+    ds = load_ds(path, config(dburl) + 'wal_fsync: always\n')
+    ds.sync_db()
+    conn.execute("UPDATE products SET title = 'new 7', is_deleted = 0, updated_at = '2024-01-03' WHERE id = 7")
+    conn.execute("UPDATE products SET is_deleted = 1, updated_at = '2024-01-03' WHERE id = 8")
+    ds.sync_db()
+    expected = titles(ds)
+    ds.wal.close()
+
+    ds2 = load_ds(path, config(dburl))
+    assert titles(ds2) == expected
+    assert ds2.sync_db()['fetched'] == 2
+
+
+def test_idle_sync(load_ds, shop, tmp_path):
+    dburl, conn = shop
+    path = tmp_path / 'products.json'
+    path.write_text('[]')
+
+    ds = load_ds(path, config(dburl))
+    ds.sync_db()
+    version, records = ds.version, ds.wal.records
+
+    # nothing changed in database: row with last watermark is fetched again, but it's same
+    stats = ds.sync_db()
+    assert stats['fetched'] == 1
+    assert (stats['inserted'], stats['updated'], stats['deleted']) == (0, 0, 0)
+    assert ds.version == version
+    assert ds.wal.records == records
+
+
+def test_bad_config(make_ds):
+    ds = make_ds('sync:\n  key: id\n', [])
+    assert ds.status.startswith('sync error')
+    assert ds._sync is None
+
+    ds = make_ds('db: sqlite://\nsql: SELECT 1\nsync:\n  key: id\n', [])
+    assert 'watermark' in ds.status
+
+    ds = make_ds('db: sqlite://\nsql: SELECT 1\nindexes:\n  id: sorted\nsync:\n  key: id\n  watermark: ts\n', [])
+    assert 'hash index' in ds.status
+
+
+def test_background(make_ds, shop):
+    dburl, conn = shop
+    ds = make_ds(config(dburl), [])
+    # first sync on next scheduler tick
+    for _ in range(50):
+        if ds.sync_stats:
+            break
+        time.sleep(0.1)
+    assert len(ds) == 50
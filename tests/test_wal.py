@@ -0,0 +1,124 @@
+import os
+import json
+
+import pytest
+
+from sashimi.api.params import SearchQuery
+from sashimi import wal
+
+config = 'limit: 1000\n'
+
+
+@pytest.fixture
+def dsfile(tmp_path, products):
+    path = tmp_path / 'products.json'
+    path.write_text(json.dumps(products))
+    return path
+
+
+def mutate(ds):
+    ds.insert({'id': 2000, 'brand': 'New'})
+    ds.update(SearchQuery(expr='id < 5', update={'brand': 'Updated'}))
+    ds.delete(SearchQuery(expr='id > 90 and id < 100'))
+    # changes nothing, not logged
+    ds.update(SearchQuery(expr='id == 5000', update={'brand': 'x'}))
+
+
+def test_replay(load_ds, dsfile):
+    ds = load_ds(dsfile, config)
+    mutate(ds)
+    assert ds.wal.records == 3
+
+    ds2 = load_ds(dsfile, config)
+    assert ds2._data == ds._data
+    assert ds2.wal.records == 3
+
+    # continue log after replay
+    ds2.insert({'id': 3000})
+    assert load_ds(dsfile, config)._data == ds2._data
+
+
+def test_compact(load_ds, dsfile):
+    ds = load_ds(dsfile, config)
+    mutate(ds)
+    ds.compact()
+    assert ds.wal.records == 0
+    assert json.loads(dsfile.read_text()) == ds._data
+
+    ds.insert({'id': 3000})
+    ds2 = load_ds(dsfile, config)
+    assert ds2.load_stats['snapshot']
+    assert ds2.wal.records == 1
+    assert ds2._data == ds._data
+
+
+def test_truncated(load_ds, dsfile):
+    ds = load_ds(dsfile, config)
+    mutate(ds)
+    with open(wal.wal_path(str(dsfile)), 'ab') as fh:
+        fh.write(b'{"op": "insert", "rec')
+
+    ds2 = load_ds(dsfile, config)
+    assert ds2._data == ds._data
+    ds2.insert({'id': 3000})
+    assert load_ds(dsfile, config)._data == ds2._data
+
+
+def test_stale(load_ds, dsfile, products):
+    ds = load_ds(dsfile, config)
+    mutate(ds)
+    # new dataset uploaded
+    dsfile.write_text(json.dumps(products[:10]))
+    assert load_ds(dsfile, config)._data == products[:10]
+
+
+def test_disabled(load_ds, dsfile):
+    ds = load_ds(dsfile, config + 'wal: false\n')
+    mutate(ds)
+    assert ds.wal is None
+    assert not os.path.exists(wal.wal_path(str(dsfile)))
+
+
+def test_bad_fsync(load_ds, dsfile):
+    ds = load_ds(dsfile, config + 'wal_fsync: sometimes\n')
+    assert ds.wal is None
+    assert ds.status.startswith('wal error')
+
+
+def test_tick(load_ds, dsfile):
+    ds = load_ds(dsfile, config + 'wal_compact_interval: 0\n')
+    ds.wal_tick()
+    assert ds.wal.records == 0
+
+    mutate(ds)
+    ds.wal_tick()
+    assert ds.wal.records == 0
+    assert json.loads(dsfile.read_text()) == ds._data
+
+
+def test_rm(api, products, tmp_path):
+    client = api('', dict(one=products))
+    client.patch('/ds/p/one', json=dict(op='update', expr='id < 5', update={'brand': 'x'}))
+    pdir = tmp_path / 'projects' / 'p'
+    assert sorted(os.listdir(pdir)) == ['__project.yml', 'one.json', 'one.snap', 'one.wal']
+
+    r = client.request('DELETE', '/ds/p', json=dict(name='one'))
+    assert r.status_code == 200, r.text
+    # dataset, its snapshot and mutation log are removed
+    assert os.listdir(pdir) == ['__project.yml']
+    assert client.post('/ds/p/one', json=dict(expr='True')).status_code == 404
+
+
+def test_read_only(load_ds, dsfile, products, monkeypatch):
+    def reset(self, compacted=False):
+        # as in read-only project directory (root could write there anyway)
+        raise PermissionError(13, 'Permission denied', self.path + '.tmp')
+    monkeypatch.setattr(wal.MutationLog, 'reset', reset)
+
+    ds = load_ds(dsfile, config)
+    assert ds.wal is None
+    assert ds.status.startswith('wal error')
+    assert ds.search(SearchQuery(expr='True'))['matches'] == len(products)
+    # changes are in memory only
+    ds.insert({'id': 2000})
+    assert len(ds) == len(products) + 1
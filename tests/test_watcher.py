@@ -0,0 +1,123 @@
+import os
+import json
+import time
+
+import pytest
+from evalidate import base_eval_model
+
+from sashimi.project import Project
+from sashimi.api.params import SearchQuery
+from sashimi import watcher
+
+
+def write(path, data):
+    """ write file as deploy tool does (temporary file, rename) """
+    tmp = path.with_name('.' + path.name + '.tmp')
+    tmp.write_text(data if isinstance(data, str) else json.dumps(data))
+    os.replace(tmp, path)
+
+
+@pytest.fixture
+def project(tmp_path):
+    pdir = tmp_path / 'shop'
+    pdir.mkdir()
+    write(pdir / 'products.json', [{'id': n, 'price': n} for n in range(10)])
+    write(pdir / 'users.json', [{'id': 1}])
+    write(pdir / '_products.yaml', 'indexes:\n  id: hash\n')
+    return Project(pdir, model=base_eval_model, app_config=None)
+
+
+@pytest.fixture
+def w():
+    return watcher.Watcher(projects=[], mode='poll')
+
+
+def test_nothing_changed(project, w):
+    products = project['products']
+    indexes, version = products._indexes, products.version
+    w.check(project)
+    assert project['products'] is products
+    assert products._indexes is indexes and products.version == version
+
+
+def test_data_changed(project, w, tmp_path):
+    users = project['users']
+    users_version = users.version
+    products = project['products']
+
+    write(tmp_path / 'shop' / 'products.json', [{'id': 100, 'price': 1}])
+    w.check(project)
+
+    assert products._data == [{'id': 100, 'price': 1}]
+    assert products.search(SearchQuery(expr='id == 100'))['matches'] == 1
+    # untouched
+    assert users.version == users_version
+
+
+def test_broken_data_keeps_old(project, w, tmp_path):
+    products = project['products']
+    write(tmp_path / 'shop' / 'products.json', '[{"id": 1}, ')
+    w.check(project)
+    assert len(products) == 10
+    # not reloaded again until changed
+    products.version += 1000
+    version = products.version
+    w.check(project)
+    assert products.version == version
+
+
+def test_own_writes_ignored(project, w):
+    products = project['products']
+    products.insert({'id': 200})
+    products.compact()
+    version = products.version
+    w.check(project)
+    assert products.version == version
+    assert len(products) == 11
+
+
+def test_config_changed(project, w, tmp_path):
+    products, users = project['products'], project['users']
+    users_indexes = users._indexes
+
+    write(tmp_path / 'shop' / '_products.yaml', 'indexes:\n  price: sorted\n')
+    w.check(project)
+    assert 'price' in products._indexes and 'id' not in products._indexes
+    assert users._indexes is users_indexes
+
+    # datasets inherit tokens of project
+    write(tmp_path / 'shop' / '__project.yml', 'tokens: [secret]\n')
+    w.check(project)
+    assert project.config['tokens'] == ['secret']
+    assert users.config['tokens'] == ['secret']
+
+
+def test_new_and_removed(project, w, tmp_path):
+    write(tmp_path / 'shop' / 'orders.json', [{'id': 1}, {'id': 2}])
+    (tmp_path / 'shop' / 'users.json').unlink()
+    w.check(project)
+    assert len(project['orders']) == 2
+    assert 'users' not in project
+
+
+def test_settle(project, w, tmp_path):
+    path = tmp_path / 'shop' / 'products.json'
+    path.write_text('[]')
+    w.check(project, settle=60)
+    assert len(project['products']) == 10
+
+
+def test_inotify(project, tmp_path):
+    try:
+        w = watcher.Watcher(projects=[project], mode='inotify', interval=0.1)
+    except OSError:
+        pytest.skip('no inotify')
+    w.start()
+    time.sleep(0.3)
+
+    write(tmp_path / 'shop' / 'users.json', [{'id': 1}, {'id': 2}])
+    for _ in range(50):
+        if len(project['users']) == 2:
+            break
+        time.sleep(0.1)
+    assert len(project['users']) == 2